@@ -1,15 +1,30 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app, abort, Response
 from flask_login import login_required
 from functools import wraps
+from datetime import date, datetime, timedelta
 from app import db
-from models import User, Product, Order, ContactMessage
+from db_routing import use_read_replica, pool_metrics, REPLICA_BIND
+from models import User, Product, Order, ArchivedOrder, DailySales, InventoryAlert
 from forms import ProductForm
-from werkzeug.security import check_password_hash
+from passwords import verify_password, PasswordHasherBusy
+from ratelimit import rate_limit, form_field
 from models import Customization  # make sure you have this model defined
-from models import PaymentMethod
-from forms import PaymentMethodForm
+from models import PaymentMethod, Promotion
+from forms import PaymentMethodForm, PromotionForm
 from werkzeug.utils import secure_filename
 from models import News
+from news_feed import get_news_page
+import reports as sales_reports
+from archive import get_order_or_404
+from inventory import open_alerts_query, low_stock_products, unread_alert_count
+from profiling import blueprint_summaries, collapsed_profile
+from notifications import notify_order_status
+import user_search
+from order_lifecycle import (transition, InvalidTransition, STATUS_TRANSITIONS, allowed_next,
+                             status_counts, order_events)
+import inbox
+from promotions import reprice
+from cache import memoize, get_cache
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in {'png','jpg','jpeg','gif'}
@@ -36,6 +51,8 @@ def admin_required(f):
 
 
 @admin_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('admin_login:ip', '10/minute')
+@rate_limit('admin_login:account', '5/minute', key=form_field('email'))
 def login():
     if request.method == 'POST':
         email = request.form.get('email')
@@ -48,8 +65,13 @@ def login():
 
         if user:
             print(f"User found - Is Admin: {user.is_admin}")  # Debug log
-            if user.is_admin and check_password_hash(user.password_hash,
-                                                     password):
+            try:
+                authenticated = user.is_admin and verify_password(user, password)
+            except PasswordHasherBusy:
+                flash('Server busy, please try again in a moment.', 'error')
+                return render_template('admin/login.html'), 503
+            if authenticated:
+                db.session.commit()  # persists a rehashed password, if any
                 session['admin_user_id'] = user.id
                 flash('Login successful!', 'success')
                 return redirect(url_for('admin.dashboard'))
@@ -63,39 +85,81 @@ def login():
     return render_template('admin/login.html')
 
 
+# Orders and users are not cache tags (they change on every checkout and
+# login), so the totals are simply allowed to lag by up to a minute
+@memoize('dashboard_totals', ttl=60, tags=('products',))
+def _dashboard_totals():
+    return {
+        'total_users': User.query.count(),
+        'total_products': Product.query.count(),
+        'total_orders': Order.query.count() + ArchivedOrder.query.count(),
+        # Revenue from the daily rollups, which also cover archived orders
+        'total_revenue': db.session.query(db.func.sum(DailySales.revenue)).scalar() or 0,
+    }
+
+
 @admin_bp.route('/')
 @admin_bp.route('/dashboard')
 @login_required
 @admin_required
 def dashboard():
     # Dashboard statistics
-    total_users = User.query.count()
-    total_products = Product.query.count()
-    total_orders = Order.query.count()
-    pending_orders = Order.query.filter_by(status='pending').count()
-    unread_messages = ContactMessage.query.filter_by(is_read=False).count()
+    order_counts = status_counts()
+    unread_messages = inbox.unread_count()
+    inventory_alerts = unread_alert_count()
 
     # Recent orders
     recent_orders = Order.query.order_by(
         Order.created_at.desc()).limit(5).all()
 
-    # Revenue calculation (simplified)
-    total_revenue = db.session.query(db.func.sum(
-        Order.total_amount)).filter_by(payment_status='paid').scalar() or 0
-
     stats = {
-        'total_users': total_users,
-        'total_products': total_products,
-        'total_orders': total_orders,
-        'pending_orders': pending_orders,
+        **_dashboard_totals(),
+        'pending_orders': order_counts.get('pending', 0),
+        'pending_verification': order_counts.get('pending_verification', 0),
         'unread_messages': unread_messages,
-        'total_revenue': total_revenue,
+        'inventory_alerts': inventory_alerts,
         'recent_orders': recent_orders
     }
 
     return render_template('admin/dashboard.html', stats=stats)
 
 
+@admin_bp.route('/reports')
+@login_required
+@admin_required
+def reports():
+    today = datetime.utcnow().date()
+    try:
+        end = date.fromisoformat(request.args.get('end', ''))
+    except ValueError:
+        end = today
+    try:
+        start = date.fromisoformat(request.args.get('start', ''))
+    except ValueError:
+        start = end - timedelta(days=29)
+    if start > end:
+        start, end = end, start
+    granularity = request.args.get('granularity', 'day')
+    if granularity not in sales_reports.GRANULARITIES:
+        granularity = 'day'
+    top_by = 'units' if request.args.get('top_by') == 'units' else 'revenue'
+
+    report = {
+        'summary': sales_reports.sales_summary(start, end),
+        'periods': sales_reports.revenue_by_period(start, end, granularity),
+        'top_products': sales_reports.top_products(start, end, by=top_by),
+        'categories': sales_reports.category_mix(start, end),
+        'payment_methods': sales_reports.payment_method_split(start, end)
+    }
+
+    return render_template('admin/reports.html',
+                           report=report,
+                           start=start,
+                           end=end,
+                           granularity=granularity,
+                           top_by=top_by)
+
+
 @admin_bp.route('/products')
 @login_required
 @admin_required
@@ -139,6 +203,7 @@ def add_product():
                           image_url=form.image_url.data,
                           category=form.category.data,
                           stock_quantity=form.stock_quantity.data,
+                          reorder_threshold=form.reorder_threshold.data or 0,
                           is_active=form.is_active.data)
         db.session.add(product)
         db.session.commit()
@@ -165,6 +230,7 @@ def edit_product(product_id):
         product.image_url = form.image_url.data
         product.category = form.category.data
         product.stock_quantity = form.stock_quantity.data
+        product.reorder_threshold = form.reorder_threshold.data or 0
         product.is_active = form.is_active.data
         db.session.commit()
         flash('Product updated successfully!', 'success')
@@ -190,6 +256,7 @@ def delete_product(product_id):
 @admin_bp.route('/orders')
 @login_required
 @admin_required
+@use_read_replica
 def orders():
     page = request.args.get('page', 1, type=int)
     status_filter = request.args.get('status', '')
@@ -199,34 +266,47 @@ def orders():
     if status_filter:
         query = query.filter_by(status=status_filter)
 
+    # The total comes from the status counts rather than a COUNT(*)
     orders = query.order_by(Order.created_at.desc()).paginate(page=page,
                                                               per_page=20,
-                                                              error_out=False)
+                                                              error_out=False,
+                                                              count=False)
+    counts = status_counts()
+    orders.total = counts.get(status_filter, 0) if status_filter else sum(counts.values())
 
     return render_template('admin/orders.html',
                            orders=orders,
-                           current_status=status_filter)
+                           current_status=status_filter,
+                           status_counts=counts)
 
 
 @admin_bp.route('/orders/<int:order_id>')
 @login_required
 @admin_required
 def order_detail(order_id):
-    order = Order.query.get_or_404(order_id)
-    return render_template('admin/order_detail.html', order=order)
+    order = get_order_or_404(order_id)
+    return render_template('admin/order_detail.html', order=order,
+                           events=order_events(order.id),
+                           next_statuses=allowed_next('status', order.status))
 
 
 @admin_bp.route('/orders/update_status/<int:order_id>', methods=['POST'])
 @login_required
 @admin_required
 def update_order_status(order_id):
-    order = Order.query.get_or_404(order_id)
+    # Locked so the archiver and concurrent updates see one change at a time
+    order = Order.query.filter_by(id=order_id).with_for_update().first_or_404()
     new_status = request.form.get('status')
 
-    if new_status in [
-            'pending', 'confirmed', 'shipped', 'delivered', 'cancelled'
-    ]:
-        order.status = new_status
+    if new_status in STATUS_TRANSITIONS:
+        try:
+            changed = transition(order, status=new_status, actor_id=session['admin_user_id'])
+        except InvalidTransition as e:
+            db.session.rollback()
+            flash(str(e), 'error')
+            return redirect(url_for('admin.order_detail', order_id=order_id))
+        if changed:
+            notify_order_status(order)
         db.session.commit()
         flash(f'Order status updated to {new_status}.', 'success')
     else:
@@ -238,6 +318,7 @@ def update_order_status(order_id):
 @admin_bp.route('/users')
 @login_required
 @admin_required
+@use_read_replica
 def users():
     page = request.args.get('page', 1, type=int)
     search = request.args.get('search', '')
@@ -245,10 +326,9 @@ def users():
     query = User.query
 
     if search:
-        query = query.filter((User.username.contains(search))
-                             | (User.email.contains(search))
-                             | (User.first_name.contains(search))
-                             | (User.last_name.contains(search)))
+        _, clause = user_search.search_clause(search)
+        if clause is not None:
+            query = query.filter(clause)
 
     users = query.order_by(User.created_at.desc()).paginate(page=page,
                                                             per_page=20,
@@ -257,26 +337,129 @@ def users():
     return render_template('admin/users.html', users=users, search=search)
 
 
+@admin_bp.route('/users/search')
+@login_required
+@admin_required
+@use_read_replica
+def users_typeahead():
+    kind, rows = user_search.typeahead(request.args.get('q', ''))
+    return jsonify({
+        'match': kind,
+        'items': [{'id': user_id, 'username': username,
+                   'name': ' '.join(part for part in (first_name, last_name) if part),
+                   'email': email, 'phone': phone}
+                  for user_id, username, first_name, last_name, email, phone in rows],
+    })
+
+
 @admin_bp.route('/messages')
 @login_required
 @admin_required
+@use_read_replica
 def messages():
+    folder = request.args.get('folder', 'inbox')
+    if folder not in inbox.FOLDERS:
+        folder = 'inbox'
+    unread_only = request.args.get('unread') == '1'
+    cursor = request.args.get('cursor')
+    messages, next_cursor = inbox.message_page(folder, unread_only, cursor)
+    return render_template('admin/messages.html', messages=messages, next_cursor=next_cursor,
+                           folder=folder, unread_only=unread_only, is_first_page=not cursor,
+                           counts=inbox.message_counts())
+
+
+@admin_bp.route('/messages/bulk', methods=['POST'])
+@login_required
+@admin_required
+def messages_bulk():
+    action = request.form.get('action')
+    ids = [int(value) for value in request.form.getlist('ids') if value.isdigit()]
+    if action not in inbox.ACTIONS or not ids:
+        flash('Select messages and an action.', 'error')
+    else:
+        changed = inbox.apply_action(action, ids)
+        flash(f'{changed} message{"s" if changed != 1 else ""} updated.', 'success')
+    return redirect(url_for('admin.messages', folder=request.form.get('folder', 'inbox'),
+                            unread=request.form.get('unread') or None))
+
+
+@admin_bp.route('/db-pool')
+@login_required
+@admin_required
+def db_pool():
+    engines = db.engines
+    metrics = {'primary': pool_metrics(engines[None])}
+    if REPLICA_BIND in engines:
+        metrics[REPLICA_BIND] = pool_metrics(engines[REPLICA_BIND])
+    return jsonify(metrics)
+
+
+@admin_bp.route('/fragment-cache')
+@login_required
+@admin_required
+def fragment_cache_stats():
+    return jsonify(current_app.extensions['fragment_cache'].stats())
+
+
+@admin_bp.route('/cache')
+@login_required
+@admin_required
+def cache_stats():
+    return jsonify(get_cache().stats())
+
+
+@admin_bp.route('/profiling')
+@login_required
+@admin_required
+def profiling():
+    output_dir = current_app.config['PROFILER_DIR']
+    return render_template('admin/profiling.html',
+                           summaries=blueprint_summaries(output_dir),
+                           sample_rate=current_app.config['PROFILER_SAMPLE_RATE'])
+
+
+@admin_bp.route('/profiling/<name>.collapsed')
+@login_required
+@admin_required
+def profiling_download(name):
+    collapsed = collapsed_profile(current_app.config['PROFILER_DIR'], name)
+    if collapsed is None:
+        abort(404)
+    return Response(collapsed, mimetype='text/plain',
+                    headers={'Content-Disposition': f'attachment; filename={name}.collapsed'})
+
+
+@admin_bp.route('/inventory')
+@login_required
+@admin_required
+def inventory_alerts():
     page = request.args.get('page', 1, type=int)
-    messages = ContactMessage.query.order_by(
-        ContactMessage.created_at.desc()).paginate(page=page,
-                                                   per_page=20,
-                                                   error_out=False)
-    return render_template('admin/messages.html', messages=messages)
+    alerts = open_alerts_query().paginate(page=page, per_page=20, error_out=False)
+    low_stock = low_stock_products().limit(50).all()
+    return render_template('admin/inventory.html',
+                           alerts=alerts,
+                           low_stock=low_stock)
+
+
+@admin_bp.route('/inventory/mark_read/<int:alert_id>')
+@login_required
+@admin_required
+def mark_alert_read(alert_id):
+    alert = InventoryAlert.query.get_or_404(alert_id)
+    alert.is_read = True
+    db.session.commit()
+    return redirect(url_for('admin.inventory_alerts'))
 
 
-@admin_bp.route('/messages/mark_read/<int:message_id>')
+@admin_bp.route('/inventory/mark_all_read', methods=['POST'])
 @login_required
 @admin_required
-def mark_message_read(message_id):
-    message = ContactMessage.query.get_or_404(message_id)
-    message.is_read = True
+def mark_all_alerts_read():
+    InventoryAlert.query.filter(InventoryAlert.resolved_at.is_(None),
+                                InventoryAlert.is_read.is_(False)).update(
+                                    {'is_read': True}, synchronize_session=False)
     db.session.commit()
-    return redirect(url_for('admin.messages'))
+    return redirect(url_for('admin.inventory_alerts'))
 
 
 # ---- Site Customization List ----
@@ -419,9 +602,81 @@ def delete_payment_method(method_id):
 
 
 # --- Manage News ---
+# ---- Promotions ----
+@admin_bp.route('/promotions')
+@login_required
+@admin_required
+def promotions():
+    promotions = Promotion.query.order_by(Promotion.starts_at.desc()).all()
+    return render_template('admin/promotions.html', promotions=promotions,
+                           now=datetime.utcnow())
+
+
+def _promotion_form(promotion=None):
+    form = PromotionForm(obj=promotion)
+    form.product_id.choices = [(0, 'Choose a product')] + [
+        (product_id, name) for product_id, name in
+        db.session.query(Product.id, Product.name).order_by(Product.name)]
+    return form
+
+
+def _save_promotion(promotion, form):
+    form.populate_obj(promotion)
+    if promotion.scope == 'product':
+        promotion.category = None
+    else:
+        promotion.product_id = None
+    db.session.commit()
+    # Promotions already live (or just switched off) apply now; later
+    # start and end times are picked up by the scheduler
+    return reprice()
+
+
+@admin_bp.route('/promotions/add', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def add_promotion():
+    form = _promotion_form()
+    if request.method == 'GET':
+        form.starts_at.data = datetime.utcnow().replace(second=0, microsecond=0)
+    if form.validate_on_submit():
+        promotion = Promotion()
+        db.session.add(promotion)
+        repriced = _save_promotion(promotion, form)
+        flash(f'Promotion added; {repriced} product prices updated.', 'success')
+        return redirect(url_for('admin.promotions'))
+    return render_template('admin/promotion_form.html', form=form, title='Add Promotion')
+
+
+@admin_bp.route('/promotions/edit/<int:promotion_id>', methods=['GET', 'POST'])
+@login_required
+@admin_required
+def edit_promotion(promotion_id):
+    promotion = Promotion.query.get_or_404(promotion_id)
+    form = _promotion_form(promotion)
+    if form.validate_on_submit():
+        repriced = _save_promotion(promotion, form)
+        flash(f'Promotion updated; {repriced} product prices updated.', 'success')
+        return redirect(url_for('admin.promotions'))
+    return render_template('admin/promotion_form.html', form=form, title='Edit Promotion',
+                           promotion=promotion)
+
+
+@admin_bp.route('/promotions/delete/<int:promotion_id>', methods=['POST'])
+@login_required
+@admin_required
+def delete_promotion(promotion_id):
+    promotion = Promotion.query.get_or_404(promotion_id)
+    db.session.delete(promotion)
+    db.session.commit()
+    repriced = reprice()
+    flash(f'Promotion deleted; {repriced} product prices updated.', 'success')
+    return redirect(url_for('admin.promotions'))
+
+
 @admin_bp.route('/news', methods=['GET'])
 @login_required
 @admin_required
 def news_list():
-    news = News.query.order_by(News.created_at.desc()).all()
-    return render_template('admin/news_list.html', news=news)
+    news, next_cursor = get_news_page(request.args.get('cursor'), limit=20)
+    return render_template('admin/news_list.html', news=news, next_cursor=next_cursor)
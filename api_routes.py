@@ -0,0 +1,272 @@
+"""JSON API for the mobile app and resellers, mounted at /api/v1.
+
+    GET /products?category=&q=&fields=&limit=&cursor=   catalogue, newest first
+    GET /products/<id>?fields=
+    GET /categories
+    GET /cart                                            (logged in)
+    GET /orders?fields=&limit=&cursor=                   (logged in)
+    GET /orders/<id>?fields=                             (logged in)
+
+`fields` is a comma-separated subset of a resource's fields (sparse
+fieldsets); only those columns are selected. Lists are keyset-paginated
+on (created_at, id): pass the `next` value from a response as `cursor` to
+get the following page. Catalogue responses carry an ETag and answer
+If-None-Match with 304. Bodies are serialized with orjson when it is
+installed (the `api` extra), the standard library otherwise.
+"""
+import json
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import Blueprint, Response, abort, request
+from flask_login import current_user
+from werkzeug.exceptions import HTTPException
+
+from app import db
+from db_routing import use_read_replica
+from listing import DISCOUNT_PERCENT, category_counts
+from models import (ArchivedOrder, ArchivedOrderItem, CartItem, Order, OrderItem,
+                    Product)
+from news_feed import decode_cursor, encode_cursor
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+api_bp = Blueprint('api', __name__)
+
+DEFAULT_LIMIT = 24
+MAX_LIMIT = 100
+
+PRODUCT_FIELDS = {
+    'id': Product.id,
+    'name': Product.name,
+    'description': Product.description,
+    'category': Product.category,
+    'price': Product.effective_price,
+    # Only when a promotion or markdown brings the price below it
+    'original_price': sa.case((Product.compare_at_price > Product.effective_price,
+                               Product.compare_at_price)),
+    'discount_percent': DISCOUNT_PERCENT,
+    'image_url': Product.image_url,
+    'stock_quantity': Product.stock_quantity,
+    'created_at': Product.created_at,
+}
+PRODUCT_LIST_DEFAULT = ('id', 'name', 'category', 'price', 'original_price',
+                        'discount_percent', 'image_url', 'stock_quantity')
+
+ORDER_FIELDS = ('id', 'status', 'payment_status', 'total_amount', 'shipping_address',
+                'phone', 'created_at', 'archived', 'items')
+ORDER_LIST_DEFAULT = ('id', 'status', 'payment_status', 'total_amount', 'created_at',
+                      'archived')
+
+
+def _json_default(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+def dumps(payload):
+    if orjson is not None:
+        return orjson.dumps(payload)
+    return json.dumps(payload, separators=(',', ':'), default=_json_default).encode()
+
+
+def api_response(payload, status=200, cache=None):
+    """JSON response; with cache='public' it gets an ETag and may become a 304"""
+    response = Response(dumps(payload), status=status, mimetype='application/json')
+    if cache == 'public':
+        response.add_etag()
+        response.headers['Cache-Control'] = 'public, max-age=60'
+        return response.make_conditional(request)
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
+
+
+@api_bp.errorhandler(HTTPException)
+def api_error(error):
+    return api_response({'error': error.description}, status=error.code)
+
+
+def api_login_required(f):
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        if not current_user.is_authenticated:
+            abort(401, 'Log in to use this endpoint.')
+        return f(*args, **kwargs)
+    return decorated_function
+
+
+def requested_fields(allowed, default):
+    raw = request.args.get('fields')
+    if not raw:
+        return list(default)
+    fields = [name.strip() for name in raw.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in allowed]
+    if unknown:
+        abort(400, f"Unknown fields: {', '.join(unknown)}. "
+                   f"Available: {', '.join(allowed)}.")
+    return fields
+
+
+def page_limit():
+    return max(1, min(request.args.get('limit', DEFAULT_LIMIT, type=int), MAX_LIMIT))
+
+
+def page_position():
+    cursor = request.args.get('cursor')
+    if not cursor:
+        return None
+    position = decode_cursor(cursor)
+    if position is None:
+        abort(400, 'Malformed cursor.')
+    return position
+
+
+def after_position(created_at_column, id_column, position):
+    created_at, item_id = position
+    return sa.or_(created_at_column < created_at,
+                  sa.and_(created_at_column == created_at, id_column < item_id))
+
+
+def _keyset_page(stmt, created_at_column, id_column, limit):
+    """(rows, next cursor) for a statement ordered newest first"""
+    position = page_position()
+    if position is not None:
+        stmt = stmt.where(after_position(created_at_column, id_column, position))
+    rows = db.session.execute(stmt.order_by(created_at_column.desc(), id_column.desc())
+                              .limit(limit + 1)).all()
+    next_cursor = encode_cursor(rows[limit - 1]) if len(rows) > limit else None
+    return rows[:limit], next_cursor
+
+
+# --- Catalogue ---
+
+def _product_dict(row, fields):
+    item = {name: getattr(row, name) for name in fields}
+    if 'discount_percent' in item:
+        item['discount_percent'] = int(item['discount_percent'] or 0)
+    return item
+
+
+@api_bp.route('/products')
+@use_read_replica
+def products():
+    fields = requested_fields(PRODUCT_FIELDS, PRODUCT_LIST_DEFAULT)
+    # The cursor needs created_at and id whether or not they were asked for
+    columns = [PRODUCT_FIELDS[name].label(name) for name in fields
+               if name not in ('id', 'created_at')]
+    stmt = (sa.select(Product.id.label('id'), Product.created_at.label('created_at'), *columns)
+            .where(Product.is_active.is_(True)))
+    if request.args.get('category'):
+        stmt = stmt.where(Product.category == request.args['category'])
+    if request.args.get('q'):
+        stmt = stmt.where(Product.name.contains(request.args['q']))
+
+    rows, next_cursor = _keyset_page(stmt, Product.created_at, Product.id, page_limit())
+    return api_response({'items': [_product_dict(row, fields) for row in rows],
+                         'next': next_cursor}, cache='public')
+
+
+@api_bp.route('/products/<int:product_id>')
+@use_read_replica
+def product_detail(product_id):
+    fields = requested_fields(PRODUCT_FIELDS, PRODUCT_FIELDS)
+    row = db.session.execute(
+        sa.select(*[PRODUCT_FIELDS[name].label(name) for name in fields])
+        .where(Product.id == product_id, Product.is_active.is_(True))).first()
+    if row is None:
+        abort(404, 'No such product.')
+    return api_response(_product_dict(row, fields), cache='public')
+
+
+@api_bp.route('/categories')
+@use_read_replica
+def categories():
+    return api_response({'items': [{'name': name, 'product_count': count}
+                                   for name, count in category_counts()]}, cache='public')
+
+
+# --- Cart and orders ---
+
+@api_bp.route('/cart')
+@api_login_required
+def cart():
+    rows = db.session.execute(
+        sa.select(CartItem.id, CartItem.quantity, Product.id, Product.name, Product.effective_price,
+                  Product.image_url)
+        .join(Product, CartItem.product_id == Product.id)
+        .where(CartItem.user_id == current_user.id)
+        .order_by(CartItem.created_at)).all()
+    items = [{'id': item_id, 'product_id': product_id, 'name': name, 'price': price,
+              'image_url': image_url, 'quantity': quantity, 'line_total': price * quantity}
+             for item_id, quantity, product_id, name, price, image_url in rows]
+    return api_response({'items': items,
+                         'total': sum(item['line_total'] for item in items)})
+
+
+def _order_items(keys):
+    """{(order id, archived): [item dicts]} for the given keys"""
+    found = {}
+    for order_model, item_model, archived in ((Order, OrderItem, False),
+                                              (ArchivedOrder, ArchivedOrderItem, True)):
+        ids = [order_id for order_id, is_archived in keys if is_archived == archived]
+        if not ids:
+            continue
+        rows = db.session.execute(
+            sa.select(item_model.order_id, item_model.product_id, Product.name,
+                      item_model.quantity, item_model.unit_price, item_model.total_price)
+            .join(Product, item_model.product_id == Product.id, isouter=True)
+            .where(item_model.order_id.in_(ids))
+            .order_by(item_model.id)).all()
+        for order_id, product_id, name, quantity, unit_price, total_price in rows:
+            found.setdefault((order_id, archived), []).append(
+                {'product_id': product_id, 'name': name, 'quantity': quantity,
+                 'unit_price': unit_price, 'total_price': total_price})
+    return found
+
+
+def _order_dicts(rows, fields):
+    items = _order_items([(row.id, bool(row.archived)) for row in rows]) \
+        if 'items' in fields else {}
+    result = []
+    for row in rows:
+        order = {name: getattr(row, name) for name in fields if name != 'items'}
+        if 'archived' in order:
+            order['archived'] = bool(order['archived'])
+        if 'items' in fields:
+            order['items'] = items.get((row.id, bool(row.archived)), [])
+        result.append(order)
+    return result
+
+
+def _order_select(model, archived, user_id):
+    return (sa.select(model.id, model.status, model.payment_status, model.total_amount,
+                      model.shipping_address, model.phone, model.created_at,
+                      sa.literal(archived).label('archived'))
+            .where(model.user_id == user_id))
+
+
+@api_bp.route('/orders')
+@api_login_required
+def orders():
+    fields = requested_fields(ORDER_FIELDS, ORDER_LIST_DEFAULT)
+    both = sa.union_all(_order_select(Order, False, current_user.id),
+                        _order_select(ArchivedOrder, True, current_user.id)).subquery()
+    rows, next_cursor = _keyset_page(sa.select(both), both.c.created_at, both.c.id,
+                                     page_limit())
+    return api_response({'items': _order_dicts(rows, fields), 'next': next_cursor})
+
+
+@api_bp.route('/orders/<int:order_id>')
+@api_login_required
+def order_detail(order_id):
+    fields = requested_fields(ORDER_FIELDS, ORDER_FIELDS)
+    for model, archived in ((Order, False), (ArchivedOrder, True)):
+        row = db.session.execute(_order_select(model, archived, current_user.id)
+                                 .where(model.id == order_id)).first()
+        if row is not None:
+            return api_response(_order_dicts([row], fields)[0])
+    abort(404, 'No such order.')
@@ -16,6 +16,7 @@ from flask_login import LoginManager
 from sqlalchemy.orm import DeclarativeBase
 from werkzeug.middleware.proxy_fix import ProxyFix
 from dotenv import load_dotenv
+from db_routing import RoutingSession, REPLICA_BIND, engine_options_from_env
 
 load_dotenv()
 
@@ -27,38 +28,126 @@ class Base(DeclarativeBase):
     pass
 
 # --- Initialize extensions (without app yet) ---
-db = SQLAlchemy(model_class=Base)
+db = SQLAlchemy(model_class=Base, session_options={"class_": RoutingSession})
 login_manager = LoginManager()
 
 # --- Create the app ---
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+# Proxies in front of the app whose X-Forwarded-For entries are trusted, so
+# request.remote_addr is the client's address (rate limits key on it)
+app.config["TRUSTED_PROXY_COUNT"] = int(os.environ.get("TRUSTED_PROXY_COUNT", 1))
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config["TRUSTED_PROXY_COUNT"],
+                        x_proto=1, x_host=1)
 
 # --- Database config ---
 app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get(
     "DATABASE_URL", "sqlite:///doctless_paint.db"
 )
-app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-    "pool_recycle": 300,
-    "pool_pre_ping": True,
-}
+# Pool size/overflow/timeout come from DB_POOL_* (gunicorn.conf.py sets
+# per-worker defaults from the worker class)
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = engine_options_from_env(
+    app.config["SQLALCHEMY_DATABASE_URI"])
+
+# Optional read replica for read-only pages (see db_routing.use_read_replica)
+if os.environ.get("DATABASE_REPLICA_URL"):
+    app.config["SQLALCHEMY_BINDS"] = {
+        REPLICA_BIND: {
+            "url": os.environ["DATABASE_REPLICA_URL"],
+            **engine_options_from_env(os.environ["DATABASE_REPLICA_URL"]),
+        }
+    }
 
 # --- Upload folder ---
 UPLOAD_FOLDER = os.path.join(basedir, "static", "uploads")
 if not os.path.exists(UPLOAD_FOLDER):
     os.makedirs(UPLOAD_FOLDER)
 app.config["UPLOAD_FOLDER"] = UPLOAD_FOLDER
+# Hand uploaded-file bodies to the front-end server (see media.py)
+app.config["MEDIA_ACCEL_REDIRECT_PREFIX"] = os.environ.get("MEDIA_ACCEL_REDIRECT_PREFIX")
+app.config["MEDIA_USE_X_SENDFILE"] = os.environ.get("MEDIA_USE_X_SENDFILE", "").lower() in ("1", "true", "yes")
 
 # --- Paystack config ---
 app.config["PAYSTACK_PUBLIC_KEY"] = os.environ.get("PAYSTACK_PUBLIC_KEY", "pk_test_default")
 app.config["PAYSTACK_SECRET_KEY"] = os.environ.get("PAYSTACK_SECRET_KEY", "sk_test_default")
+app.config["PAYSTACK_API_BASE"] = os.environ.get("PAYSTACK_API_BASE", "https://api.paystack.co")
+
+# --- Password hashing (see passwords.py) ---
+app.config["PASSWORD_HASH_METHOD"] = os.environ.get("PASSWORD_HASH_METHOD", "scrypt:32768:8:1")
+app.config["PASSWORD_HASH_WORKERS"] = int(os.environ.get("PASSWORD_HASH_WORKERS", 2))
+app.config["PASSWORD_HASH_MAX_QUEUE"] = int(os.environ.get("PASSWORD_HASH_MAX_QUEUE", 32))
+app.config["PASSWORD_HASH_QUEUE_TIMEOUT"] = float(os.environ.get("PASSWORD_HASH_QUEUE_TIMEOUT", 5))
+
+# --- Rate limiting (see ratelimit.py) ---
+app.config["RATELIMIT_ENABLED"] = os.environ.get("RATELIMIT_ENABLED", "true").lower() in ("1", "true", "yes")
+app.config["RATELIMIT_STORAGE_URL"] = os.environ.get("RATELIMIT_STORAGE_URL", "memory://")
+
+# --- Order archival (see archive.py) ---
+app.config["ORDER_ARCHIVE_AFTER_DAYS"] = int(os.environ.get("ORDER_ARCHIVE_AFTER_DAYS", 180))
+app.config["ORDER_ARCHIVE_BATCH_SIZE"] = int(os.environ.get("ORDER_ARCHIVE_BATCH_SIZE", 500))
+
+# --- Inventory monitoring (see inventory.py) ---
+app.config["INVENTORY_VELOCITY_DAYS"] = int(os.environ.get("INVENTORY_VELOCITY_DAYS", 28))
+app.config["INVENTORY_COVER_DAYS"] = float(os.environ.get("INVENTORY_COVER_DAYS", 14))
+
+# --- Template fragment cache (see fragment_cache.py) ---
+app.config["FRAGMENT_CACHE_URL"] = os.environ.get("FRAGMENT_CACHE_URL", "memory://")
+app.config["FRAGMENT_CACHE_DEFAULT_TTL"] = int(os.environ.get("FRAGMENT_CACHE_DEFAULT_TTL", 300))
+
+# --- Shared cache (see cache.py): memory://, redis://... or null:// ---
+app.config["CACHE_URL"] = os.environ.get("CACHE_URL", "memory://")
+app.config["CACHE_DEFAULT_TTL"] = int(os.environ.get("CACHE_DEFAULT_TTL", 300))
+app.config["CACHE_LOCAL_MAX_ENTRIES"] = int(os.environ.get("CACHE_LOCAL_MAX_ENTRIES", 2000))
+# Without Redis, how often each worker re-reads cache versions (cache_versions.py)
+app.config["CACHE_VERSION_REFRESH_INTERVAL"] = float(os.environ.get("CACHE_VERSION_REFRESH_INTERVAL", 5))
+
+# --- Sampling profiler (see profiling.py); 0 disables it ---
+app.config["PROFILER_SAMPLE_RATE"] = float(os.environ.get("PROFILER_SAMPLE_RATE", 0))
+app.config["PROFILER_INTERVAL_MS"] = float(os.environ.get("PROFILER_INTERVAL_MS", 5))
+app.config["PROFILER_DIR"] = os.environ.get("PROFILER_DIR", os.path.join(app.root_path, "profiles"))
+
+# --- Sessions (see sessions.py): cookie://, sql://, file:///dir or redis://... ---
+app.config["SESSION_STORE_URL"] = os.environ.get("SESSION_STORE_URL", "cookie://")
+app.config["SESSION_SWEEP_INTERVAL"] = int(os.environ.get("SESSION_SWEEP_INTERVAL", 900))
+
+# --- Email notifications (see notifications.py) ---
+app.config["MAIL_SERVER"] = os.environ.get("MAIL_SERVER", "localhost")
+app.config["MAIL_PORT"] = int(os.environ.get("MAIL_PORT", 25))
+app.config["MAIL_USERNAME"] = os.environ.get("MAIL_USERNAME")
+app.config["MAIL_PASSWORD"] = os.environ.get("MAIL_PASSWORD")
+app.config["MAIL_USE_TLS"] = os.environ.get("MAIL_USE_TLS", "").lower() in ("1", "true", "yes")
+app.config["MAIL_DEFAULT_SENDER"] = os.environ.get("MAIL_DEFAULT_SENDER", "Doctless Paint <no-reply@doctlesspaint.com>")
+app.config["ADMIN_NOTIFICATION_EMAILS"] = os.environ.get("ADMIN_NOTIFICATION_EMAILS")  # default: all admins
+app.config["NOTIFY_DIGEST_WINDOW"] = int(os.environ.get("NOTIFY_DIGEST_WINDOW", 600))
+
+# --- Checkout idempotency keys (see idempotency.py) ---
+app.config["IDEMPOTENCY_KEY_TTL"] = int(os.environ.get("IDEMPOTENCY_KEY_TTL", 86400))
+
+# --- Contact inbox (see inbox.py); CONTACT_FLUSH_INTERVAL=0 writes each message in the request ---
+app.config["CONTACT_FLUSH_INTERVAL"] = float(os.environ.get("CONTACT_FLUSH_INTERVAL", 2))
+app.config["CONTACT_BATCH_SIZE"] = int(os.environ.get("CONTACT_BATCH_SIZE", 100))
+app.config["CONTACT_MAX_PENDING"] = int(os.environ.get("CONTACT_MAX_PENDING", 10000))
+app.config["CONTACT_DEDUPE_WINDOW"] = int(os.environ.get("CONTACT_DEDUPE_WINDOW", 86400))
+
+# --- Promotions (see promotions.py); 0 turns the per-worker scheduler off ---
+app.config["PROMOTION_CHECK_INTERVAL"] = int(os.environ.get("PROMOTION_CHECK_INTERVAL", 60))
+
+# --- Outbound HTTP ---
+# Every call to Paystack/Google holds a worker (or greenlet) until it returns
+app.config["HTTP_TIMEOUT"] = float(os.environ.get("HTTP_TIMEOUT", 10))
 
 # --- Initialize extensions with app ---
 db.init_app(app)
 login_manager.init_app(app)
 migrate = Migrate(app, db)   # ✅ now app & db exist
 
+from passwords import init_passwords
+from ratelimit import init_rate_limiting
+from sessions import init_sessions
+init_passwords(app)
+init_rate_limiting(app)
+init_sessions(app, db)
+
 login_manager.login_view = "auth.login"
 login_manager.login_message = "Please log in to access this page."
 login_manager.login_message_category = "info"
@@ -78,30 +167,41 @@ from routes import main_bp
 from auth_routes import auth_bp
 from admin_routes import admin_bp
 from google_auth import google_auth_bp
+from api_routes import api_bp
 
 app.register_blueprint(main_bp)
 app.register_blueprint(auth_bp, url_prefix="/auth")
 app.register_blueprint(admin_bp, url_prefix="/admin")
 app.register_blueprint(google_auth_bp, url_prefix="/google_auth")
+app.register_blueprint(api_bp, url_prefix="/api/v1")
+
+from notifications import init_notifications
+from cache import init_cache
+init_notifications(app)
+init_cache(app)
+
+from idempotency import init_idempotency
+from inbox import init_inbox
+from promotions import init_promotions
+init_idempotency(app)
+init_inbox(app)
+init_promotions(app)
 
 from utils import get_site_styles, register_template_filters
 app.jinja_env.globals["get_site_styles"] = get_site_styles
 register_template_filters(app)
 
-# --- Create DB & default admin ---
-with app.app_context():
-    db.create_all()
-    from models import User
-    from werkzeug.security import generate_password_hash
-
-    admin_user = User.query.filter_by(email="admin@doctlesspaint.com").first()
-    if not admin_user:
-        admin_user = User(
-            username="admin",
-            email="admin@doctlesspaint.com",
-            password_hash=generate_password_hash("admin123"),
-            is_admin=True,
-        )
-        db.session.add(admin_user)
-        db.session.commit()
-        print("Default admin user created: admin@doctlesspaint.com / admin123")
+from fragment_cache import init_fragment_cache
+init_fragment_cache(app)
+
+from assets import init_assets
+from media import init_media
+init_assets(app)
+init_media(app)
+
+from profiling import init_profiling
+init_profiling(app)
+
+# --- Schema ---
+# The schema is managed by migrations only: `flask --app app db upgrade`,
+# then `python seed.py` for the default admin and payment methods.
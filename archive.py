@@ -0,0 +1,109 @@
+"""Archival of finished orders.
+
+Delivered and cancelled orders older than ORDER_ARCHIVE_AFTER_DAYS are
+moved with their items from order/order_item into archived_order /
+archived_order_item, ORDER_ARCHIVE_BATCH_SIZE orders per transaction.
+The hot tables then hold only recent and still-open orders, which is all
+the admin lists and dashboard counts need to look at.
+
+A single order is read from either table through get_user_order(); the
+order history page reads order_summary (see order_history.py), where
+moved orders are flagged as archived. Run periodically (cron or a
+scheduled deployment):
+    python archive.py [--days N] [--batch-size N]
+"""
+import argparse
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import abort, current_app
+
+from app import db
+from models import Order, OrderItem, ArchivedOrder, ArchivedOrderItem
+from order_lifecycle import remove_from_counts
+from order_history import mark_archived
+
+ARCHIVABLE_STATUSES = ('delivered', 'cancelled')
+
+
+def _copy(source, target, where, extra=None):
+    """INSERT INTO target SELECT <source columns> FROM source WHERE ..."""
+    names = [c.name for c in source.columns]
+    columns = [source.c[name] for name in names]
+    for name, value in (extra or {}).items():
+        names.append(name)
+        columns.append(sa.literal(value, target.c[name].type))
+    return sa.insert(target).from_select(names, sa.select(*columns).where(where))
+
+
+def archive_batch(cutoff, batch_size):
+    """Move one batch of archivable orders; returns how many were moved"""
+    orders, items = Order.__table__, OrderItem.__table__
+    # Rows locked by an in-flight status change are left for the next run
+    ids = db.session.scalars(
+        sa.select(orders.c.id)
+        .where(orders.c.status.in_(ARCHIVABLE_STATUSES), orders.c.created_at < cutoff)
+        .order_by(orders.c.id)
+        .limit(batch_size)
+        .with_for_update(skip_locked=True)).all()
+    if not ids:
+        return 0
+
+    # Core statements on purpose: ORM deletes would look like refunds to
+    # the sales rollup listener in reports.py. The live status counts
+    # are adjusted here instead.
+    remove_from_counts(db.session.connection(), ids)
+    mark_archived(db.session.connection(), ids)
+    db.session.execute(_copy(orders, ArchivedOrder.__table__, orders.c.id.in_(ids),
+                             extra={'archived_at': datetime.utcnow()}))
+    db.session.execute(_copy(items, ArchivedOrderItem.__table__, items.c.order_id.in_(ids)))
+    db.session.execute(sa.delete(items).where(items.c.order_id.in_(ids)))
+    db.session.execute(sa.delete(orders).where(orders.c.id.in_(ids)))
+    db.session.commit()
+    return len(ids)
+
+
+def archive_orders(older_than_days=None, batch_size=None):
+    if older_than_days is None:
+        older_than_days = current_app.config['ORDER_ARCHIVE_AFTER_DAYS']
+    if batch_size is None:
+        batch_size = current_app.config['ORDER_ARCHIVE_BATCH_SIZE']
+    cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+
+    moved = 0
+    while True:
+        count = archive_batch(cutoff, batch_size)
+        if not count:
+            return moved
+        moved += count
+
+
+# --- Reading one order from either table ---
+
+def get_order_or_404(order_id, user_id=None):
+    for model in (Order, ArchivedOrder):
+        query = model.query.filter_by(id=order_id)
+        if user_id is not None:
+            query = query.filter_by(user_id=user_id)
+        order = query.first()
+        if order is not None:
+            return order
+    abort(404)
+
+
+def get_user_order(user_id, order_id):
+    return get_order_or_404(order_id, user_id=user_id)
+
+
+if __name__ == '__main__':
+    from app import app
+
+    parser = argparse.ArgumentParser(description='Move finished orders to the archive tables')
+    parser.add_argument('--days', type=int, default=None,
+                        help='archive orders placed more than this many days ago')
+    parser.add_argument('--batch-size', type=int, default=None)
+    args = parser.parse_args()
+
+    with app.app_context():
+        moved = archive_orders(args.days, args.batch_size)
+        print(f'Archived {moved} orders')
@@ -0,0 +1,7 @@
+from asgiref.wsgi import WsgiToAsgi
+
+from app import app
+
+# ASGI entry point for uvicorn workers (GUNICORN_WORKER_CLASS=asgi):
+#   gunicorn -c gunicorn.conf.py asgi:application
+application = WsgiToAsgi(app)
@@ -0,0 +1,208 @@
+"""Static asset pipeline.
+
+`python assets.py` bundles and minifies the files listed in BUNDLES, writes
+content-hashed copies (plus .gz/.br variants) to static/dist and records
+them in static/dist/manifest.json. Templates reference bundles through
+`asset_urls()`, which falls back to the unbundled source files when no
+manifest has been built (local development).
+"""
+import os
+import re
+import json
+import gzip
+import shutil
+import hashlib
+import mimetypes
+import posixpath
+
+from flask import current_app, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+try:
+    import brotli
+except ImportError:  # optional, gzip is always produced
+    brotli = None
+
+try:
+    import rcssmin
+except ImportError:
+    rcssmin = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+STATIC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static')
+DIST_DIR = 'dist'
+MANIFEST_FILE = 'manifest.json'
+IMMUTABLE_MAX_AGE = 31536000  # one year
+
+# Logical bundle name -> source files, relative to static/
+BUNDLES = {
+    'css/vendor.css': ['vendor/bootstrap/bootstrap.min.css',
+                       'vendor/fontawesome/css/all.min.css'],
+    'css/main.css': ['css/main.css'],
+    'css/admin.css': ['css/admin.css'],
+    'js/vendor.js': ['vendor/bootstrap/popper.min.js',
+                     'vendor/bootstrap/bootstrap.min.js'],
+    'js/main.js': ['js/main.js'],
+    'js/admin.js': ['js/admin.js'],
+    'js/cart.js': ['js/cart.js'],
+}
+
+# Encodings we precompress for, in order of preference
+PRECOMPRESSED = [('br', '.br'), ('gzip', '.gz')]
+
+CSS_URL_RE = re.compile(r'url\(\s*([\'"]?)([^\'")]+)\1\s*\)')
+CSS_COMMENT_RE = re.compile(r'/\*(?!!).*?\*/', re.S)
+
+
+def minify_css(source):
+    if rcssmin:
+        return rcssmin.cssmin(source, keep_bang_comments=True)
+    source = CSS_COMMENT_RE.sub('', source)
+    source = re.sub(r'\s+', ' ', source)
+    return re.sub(r'\s*([{};:,>])\s*', r'\1', source).strip()
+
+
+def minify_js(source):
+    # Without rjsmin the source is left as-is; a regex minifier can't
+    # safely tell comments from strings, regex and template literals
+    if rjsmin:
+        return rjsmin.jsmin(source, keep_bang_comments=True)
+    return source
+
+
+def rewrite_css_urls(source, src_path, out_path):
+    """Keep relative url() references valid after moving a stylesheet"""
+    src_dir = posixpath.dirname(src_path)
+    out_dir = posixpath.dirname(out_path)
+
+    def replace(match):
+        url = match.group(2)
+        if url.startswith(('data:', 'http:', 'https:', '//', '/', '#')):
+            return match.group(0)
+        path, suffix = url, ''
+        query = re.search(r'[?#]', url)
+        if query:
+            path, suffix = url[:query.start()], url[query.start():]
+        target = posixpath.normpath(posixpath.join(src_dir, path))
+        return f'url({posixpath.relpath(target, out_dir)}{suffix})'
+
+    return CSS_URL_RE.sub(replace, source)
+
+
+def build_bundle(name, sources, static_dir=STATIC_DIR):
+    """Bundle, minify and fingerprint one asset; return its path under static/"""
+    stem, ext = posixpath.splitext(name)
+    parts = []
+    for src in sources:
+        with open(os.path.join(static_dir, src), encoding='utf-8') as f:
+            parts.append(f.read())
+
+    if ext == '.css':
+        # The hash isn't known yet, but it doesn't change the directory
+        out_name = posixpath.join(DIST_DIR, name)
+        parts = [rewrite_css_urls(part, src, out_name) for part, src in zip(parts, sources)]
+        content = minify_css('\n'.join(parts))
+    else:
+        content = minify_js(';\n'.join(parts))
+
+    data = content.encode('utf-8')
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    out_path = posixpath.join(DIST_DIR, f'{stem}.{digest}{ext}')
+    full_path = os.path.join(static_dir, out_path)
+    os.makedirs(os.path.dirname(full_path), exist_ok=True)
+
+    with open(full_path, 'wb') as f:
+        f.write(data)
+    with open(full_path + '.gz', 'wb') as f:
+        f.write(gzip.compress(data, compresslevel=9, mtime=0))
+    if brotli:
+        with open(full_path + '.br', 'wb') as f:
+            f.write(brotli.compress(data, quality=11))
+
+    return out_path
+
+
+def build_assets(static_dir=STATIC_DIR):
+    """Rebuild static/dist and its manifest from BUNDLES"""
+    dist_dir = os.path.join(static_dir, DIST_DIR)
+    shutil.rmtree(dist_dir, ignore_errors=True)
+    os.makedirs(dist_dir)
+
+    manifest = {}
+    for name, sources in BUNDLES.items():
+        manifest[name] = build_bundle(name, sources, static_dir)
+
+    with open(os.path.join(dist_dir, MANIFEST_FILE), 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    return manifest
+
+
+def load_manifest(static_dir=STATIC_DIR):
+    try:
+        with open(os.path.join(static_dir, DIST_DIR, MANIFEST_FILE)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_urls(name):
+    """URLs to include for a bundle: the fingerprinted file when built,
+    otherwise the individual source files"""
+    manifest = current_app.extensions['assets']
+    if current_app.debug:
+        manifest = load_manifest(current_app.static_folder)
+    if name in manifest:
+        return [url_for('static', filename=manifest[name])]
+    return [url_for('static', filename=src) for src in BUNDLES[name]]
+
+
+def precompressed_variant(directory, filename):
+    """Pick the best precompressed sibling of a file the client accepts.
+
+    Returns (filename, content_encoding), or (filename, None) when the
+    original should be sent.
+    """
+    for encoding, suffix in PRECOMPRESSED:
+        if request.accept_encodings.quality(encoding) <= 0:
+            continue
+        candidate = safe_join(directory, filename + suffix)
+        if candidate and os.path.isfile(candidate):
+            return filename + suffix, encoding
+    return filename, None
+
+
+def serve_static(filename):
+    """Static view: fingerprinted files get far-future immutable caching
+    and are served from their precompressed variants when possible"""
+    static_folder = current_app.static_folder
+    if not filename.startswith(DIST_DIR + '/'):
+        return send_from_directory(static_folder, filename)
+
+    send_name, encoding = precompressed_variant(static_folder, filename)
+    mimetype = mimetypes.guess_type(filename)[0]
+    response = send_from_directory(static_folder, send_name,
+                                   mimetype=mimetype,
+                                   max_age=IMMUTABLE_MAX_AGE)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def init_assets(app):
+    app.extensions['assets'] = load_manifest(app.static_folder)
+    app.view_functions['static'] = serve_static
+    app.jinja_env.globals['asset_urls'] = asset_urls
+
+
+if __name__ == '__main__':
+    built = build_assets()
+    for name, path in sorted(built.items()):
+        size = os.path.getsize(os.path.join(STATIC_DIR, path))
+        print(f'{name:<16} -> {path} ({size:,} bytes)')
@@ -1,6 +1,7 @@
 from flask import Blueprint, render_template, request, redirect, url_for, flash, session
 from flask_login import login_user, logout_user, login_required, current_user
-from werkzeug.security import check_password_hash, generate_password_hash
+from passwords import hash_password, verify_password, PasswordHasherBusy
+from ratelimit import rate_limit, form_field
 from app import db
 from models import User
 from forms import LoginForm, RegisterForm, ProfileForm
@@ -9,6 +10,8 @@ auth_bp = Blueprint('auth', __name__)
 
 
 @auth_bp.route('/login', methods=['GET', 'POST'])
+@rate_limit('login:ip', '20/minute')
+@rate_limit('login:account', '5/minute', key=form_field('email'))
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
@@ -16,7 +19,13 @@ def login():
     form = LoginForm()
     if form.validate_on_submit():
         user = User.query.filter_by(email=form.email.data).first()
-        if user and user.password_hash and check_password_hash(user.password_hash, form.password.data):
+        try:
+            authenticated = user is not None and verify_password(user, form.password.data)
+        except PasswordHasherBusy:
+            flash('We are experiencing high traffic. Please try again in a moment.', 'error')
+            return render_template('login.html', form=form), 503
+        if authenticated:
+            db.session.commit()  # persists a rehashed password, if any
             login_user(user, remember=True)
             flash(f'Welcome back, {user.first_name or user.username}!', 'success')
             next_page = request.args.get('next')
@@ -52,7 +61,7 @@ def register():
                 first_name=form.first_name.data,
                 last_name=form.last_name.data,
                 phone=form.phone.data,
-                password_hash=generate_password_hash(form.password.data)
+                password_hash=hash_password(form.password.data)
             )
             db.session.add(user)
             db.session.commit()
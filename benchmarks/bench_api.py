@@ -0,0 +1,74 @@
+"""Throughput of the JSON API against the equivalent HTML pages.
+
+Fills a throwaway SQLite catalogue, then serves the catalogue page and a
+product page both as HTML and through /api/v1 (full body and 304
+revalidation), reporting requests per second and response size.
+
+Run from the repository root:
+    python -m benchmarks.bench_api [--products 2000] [--requests 1000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DESCRIPTION = ('Premium washable emulsion with a smooth matte finish, low odour '
+               'and excellent coverage for interior walls and ceilings. ') * 10
+
+
+def throughput(client, path, requests, headers=None):
+    response = client.get(path, headers=headers)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path, headers=headers)
+    return requests / (time.perf_counter() - started), response.status_code, len(response.data)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=2000)
+    parser.add_argument('--requests', type=int, default=1000)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-api-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from app import app, db
+    from models import Product
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        db.session.execute(db.insert(Product), [
+            {'name': f'Emulsion {i}', 'price': 5000 + i, 'original_price': 6500 + i if i % 3 else None,
+             'description': DESCRIPTION, 'category': 'paints', 'stock_quantity': i % 40,
+             'image_url': f'/static/uploads/products/{i}.jpg'}
+            for i in range(args.products)])
+        db.session.commit()
+
+    client = app.test_client()
+
+    def etag(path):
+        return {'If-None-Match': client.get(path).headers['ETag']}
+
+    cases = [
+        ('catalogue HTML', '/products', None),
+        ('catalogue API', '/api/v1/products?limit=12', None),
+        ('catalogue API, 3 fields', '/api/v1/products?limit=12&fields=id,name,price', None),
+        ('catalogue API, 304', '/api/v1/products?limit=12', etag('/api/v1/products?limit=12')),
+        ('product HTML', '/product/10', None),
+        ('product API', '/api/v1/products/10', None),
+        ('product API, 304', '/api/v1/products/10', etag('/api/v1/products/10')),
+    ]
+    print(f"{'case':<26}{'req/s':>9}{'status':>8}{'bytes':>9}")
+    for label, path, headers in cases:
+        rate, status, size = throughput(client, path, args.requests, headers)
+        print(f'{label:<26}{rate:>9.0f}{status:>8}{size:>9}')
+
+
+if __name__ == '__main__':
+    main()
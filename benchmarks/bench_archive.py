@@ -0,0 +1,117 @@
+"""Hot-table query latency before and after archiving old orders.
+
+Builds a throwaway SQLite database holding several years of orders (most
+of them long delivered or cancelled), times the queries behind the admin
+order list, the dashboard counts and a customer's order history, then
+runs archive.archive_orders() and times them again.
+
+Run from the repository root:
+    python -m benchmarks.bench_archive [--orders 200000] [--years 3]
+"""
+import argparse
+import logging
+import os
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def populate(db, models, orders, years, users=2000, products=200):
+    rng = random.Random(42)
+    now = datetime.utcnow()
+    db.session.execute(db.insert(models.User), [
+        {'username': f'bench{i}', 'email': f'bench{i}@example.com'} for i in range(users)])
+    db.session.execute(db.insert(models.Product), [
+        {'name': f'Paint {i}', 'price': 1000 + i} for i in range(products)])
+    user_ids = db.session.scalars(db.select(models.User.id)).all()
+    product_ids = db.session.scalars(db.select(models.Product.id)).all()
+
+    batch, items, order_id = [], [], 0
+    for _ in range(orders):
+        order_id += 1
+        created = now - timedelta(seconds=rng.randint(0, years * 365 * 86400))
+        if (now - created).days > 30:
+            status = rng.choice(['delivered'] * 9 + ['cancelled'])
+        else:
+            status = rng.choice(['pending', 'confirmed', 'shipped', 'delivered'])
+        batch.append({'id': order_id, 'user_id': rng.choice(user_ids), 'total_amount': 5000,
+                      'status': status, 'payment_status': 'paid', 'created_at': created,
+                      'updated_at': created})
+        for product_id in rng.sample(product_ids, 2):
+            items.append({'order_id': order_id, 'product_id': product_id, 'quantity': 1,
+                          'unit_price': 2500, 'total_price': 2500})
+        if len(batch) == 5000:
+            db.session.execute(db.insert(models.Order), batch)
+            db.session.execute(db.insert(models.OrderItem), items)
+            batch, items = [], []
+    if batch:
+        db.session.execute(db.insert(models.Order), batch)
+        db.session.execute(db.insert(models.OrderItem), items)
+    db.session.commit()
+    return user_ids
+
+
+def timed_ms(fn, repeat, session):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+        # Drop the identity map so every run loads rows like a fresh request
+        session.remove()
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=200000)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--days', type=int, default=90, help='archive orders older than this')
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-archive-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from app import app, db
+    import models
+    from archive import archive_orders, user_orders
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        print(f'Populating {args.orders} orders over {args.years} years ...')
+        user_ids = populate(db, models, args.orders, args.years)
+        customer = user_ids[len(user_ids) // 2]
+        Order = models.Order
+
+        queries = {
+            'admin orders, page 1': lambda: Order.query.order_by(Order.created_at.desc())
+                .paginate(page=1, per_page=20, error_out=False),
+            'admin orders, pending': lambda: Order.query.filter_by(status='pending')
+                .order_by(Order.created_at.desc()).paginate(page=1, per_page=20, error_out=False),
+            'dashboard counts': lambda: (Order.query.count(),
+                                         Order.query.filter_by(status='pending').count()),
+            'customer history, page 1': lambda: user_orders(customer, page=1, per_page=10).items,
+        }
+
+        before = {name: timed_ms(fn, args.repeat, db.session) for name, fn in queries.items()}
+        started = time.perf_counter()
+        moved = archive_orders(older_than_days=args.days, batch_size=1000)
+        elapsed = time.perf_counter() - started
+        after = {name: timed_ms(fn, args.repeat, db.session) for name, fn in queries.items()}
+
+    print(f'Archived {moved} of {args.orders} orders older than {args.days} days '
+          f'in {elapsed:.1f}s ({moved / elapsed:.0f} orders/s)')
+    print(f"{'query':<28}{'before ms':>12}{'after ms':>12}")
+    for name in queries:
+        print(f'{name:<28}{before[name]:>12.2f}{after[name]:>12.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Hot pages with and without the shared cache.
+
+Fills a throwaway SQLite catalogue with products, users and orders, then
+times the home page, the catalogue, the categories API and the admin
+dashboard with caching off (null://) and with the in-process tier
+(memory://), and shows how many times a slow value is computed when many
+threads miss it at once.
+
+Run from the repository root:
+    python -m benchmarks.bench_cache [--products 20000] [--requests 200]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import threading
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+PAGES = ('/', '/products', '/api/v1/categories', '/admin/dashboard')
+
+
+def median_ms(client, path, requests):
+    samples = []
+    for _ in range(requests):
+        started = time.perf_counter()
+        response = client.get(path)
+        samples.append((time.perf_counter() - started) * 1000)
+        assert response.status_code == 200, (path, response.status_code)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=20000)
+    parser.add_argument('--users', type=int, default=5000)
+    parser.add_argument('--requests', type=int, default=200)
+    parser.add_argument('--threads', type=int, default=16)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-cache-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    from app import app, db
+    from cache import create_cache, memoize
+    from models import Product, User
+    from seed import seed_defaults
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        seed_defaults()
+        db.session.execute(db.insert(Product), [
+            {'name': f'Emulsion {i}', 'price': 5000 + i, 'description': 'Matte emulsion',
+             'category': f'range-{i % 25}', 'stock_quantity': i % 40, 'is_active': True}
+            for i in range(args.products)])
+        db.session.execute(db.insert(User), [
+            {'username': f'customer{i}', 'email': f'customer{i}@example.com'}
+            for i in range(args.users)])
+        db.session.commit()
+        admin_id = User.query.filter_by(is_admin=True).first().id
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(admin_id)
+        session['_fresh'] = True
+        session['admin_user_id'] = admin_id
+
+    print(f"{'page':<22}{'null:// ms':>12}{'memory:// ms':>14}")
+    results = {}
+    for url in ('null://', 'memory://'):
+        app.extensions['cache'] = create_cache(url)
+        for path in PAGES:
+            results[path, url] = median_ms(client, path, args.requests)
+    for path in PAGES:
+        print(f"{path:<22}{results[path, 'null://']:>12.2f}{results[path, 'memory://']:>14.2f}")
+
+    computed = []
+
+    @memoize('bench_slow')
+    def slow_value():
+        computed.append(1)
+        time.sleep(0.2)
+        return 42
+
+    def reader():
+        with app.app_context():
+            slow_value()
+
+    threads = [threading.Thread(target=reader) for _ in range(args.threads)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    print(f'{args.threads} concurrent misses on one key: computed {len(computed)} time(s)')
+    print(app.extensions['cache'].stats()['namespaces'])
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,96 @@
+"""Contact inbox: batched ingest, bulk triage and counts against the old paths.
+
+Fills a throwaway SQLite message table, then compares:
+  - writing submissions one commit each against inbox.ingest() batches
+  - marking a page of messages read one request each against one bulk action
+  - COUNT(*) of unread messages against the maintained count
+
+Run from the repository root:
+    python -m benchmarks.bench_inbox [--messages 300000] [--submissions 2000]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def timed(fn):
+    started = time.perf_counter()
+    fn()
+    return (time.perf_counter() - started) * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=300000)
+    parser.add_argument('--submissions', type=int, default=2000)
+    parser.add_argument('--batch-size', type=int, default=100)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-inbox-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['CONTACT_FLUSH_INTERVAL'] = '0'
+    from app import app, db
+    from models import ContactMessage
+    import inbox
+    logging.disable(logging.INFO)
+
+    old_day = datetime.utcnow() - timedelta(days=30)
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        db.session.execute(db.insert(ContactMessage), [
+            {'name': f'Customer {i}', 'email': f'customer{i}@example.com',
+             'message': f'Do you deliver to Lekki? Enquiry {i}', 'is_read': i % 4 == 0,
+             'created_at': old_day + timedelta(seconds=i), 'folder': 'inbox'}
+            for i in range(args.messages)])
+        db.session.commit()
+        inbox.recount()
+
+    def submission(i, tag):
+        return {'name': f'Visitor {i}', 'email': f'visitor{i}@example.com',
+                'message': f'{tag}: price list for 4 litre tins, request {i}',
+                'created_at': datetime.utcnow(),
+                'inbox_url': 'https://doctlesspaint.example/admin/messages'}
+
+    with app.test_request_context():
+        def one_by_one():
+            for i in range(args.submissions):
+                db.session.add(ContactMessage(name=f'Visitor {i}', email=f'visitor{i}@example.com',
+                                              message=f'single: price list, request {i}'))
+                db.session.commit()
+
+        def batched():
+            for start in range(0, args.submissions, args.batch_size):
+                inbox.ingest([submission(i, 'batched')
+                              for i in range(start, min(start + args.batch_size, args.submissions))])
+
+        print(f'{args.submissions} submissions, {args.messages} messages already stored')
+        print(f'  one commit each        {timed(one_by_one):>9.1f} ms')
+        print(f'  batches of {args.batch_size:<4}        {timed(batched):>9.1f} ms  (with dedupe and notifications)')
+
+        page = [message.id for message in inbox.message_page('inbox', unread_only=True,
+                                                              limit=inbox.PAGE_SIZE * 5)[0]]
+        half = len(page) // 2
+
+        def per_message():
+            for message_id in page[:half]:
+                db.session.get(ContactMessage, message_id).is_read = True
+                db.session.commit()
+
+        print(f'mark {half} messages read')
+        print(f'  one commit each        {timed(per_message):>9.1f} ms')
+        print(f"  one bulk action        {timed(lambda: inbox.apply_action('read', page[half:])):>9.1f} ms")
+
+        print('unread count')
+        print(f'  COUNT(*)               {timed(lambda: ContactMessage.query.filter_by(is_read=False).count()):>9.1f} ms')
+        print(f'  maintained count       {timed(inbox.unread_count):>9.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
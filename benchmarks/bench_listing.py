@@ -0,0 +1,90 @@
+"""Memory and time per page of product cards, entities vs. card rows.
+
+Fills a throwaway SQLite catalogue with products carrying realistic
+(several KB) descriptions, then for pages of 12/48/96 products compares
+loading full Product entities with loading listing.ProductCard rows
+(time and peak allocated memory), and times rendering products.html from
+the cards.
+
+Run from the repository root:
+    python -m benchmarks.bench_listing [--products 5000] [--sizes 12,48,96]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+DESCRIPTION = ('Premium washable emulsion with a smooth matte finish, low odour '
+               'and excellent coverage for interior walls and ceilings. ') * 40
+
+
+def measure(fn, repeat, reset):
+    """Median wall time (ms) over `repeat` runs, then peak allocation (KiB)
+    of one traced run; tracing is kept out of the timed runs"""
+    samples = []
+    for _ in range(repeat):
+        reset()
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    reset()
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return statistics.median(samples), peak / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=5000)
+    parser.add_argument('--sizes', default='12,48,96')
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-listing-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from flask import render_template
+    from app import app, db
+    from models import Product
+    from listing import card_select, catalogue_cards, load_cards
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        db.session.execute(db.insert(Product), [
+            {'name': f'Emulsion {i}', 'price': 5000 + i, 'original_price': 6500 + i if i % 3 else None,
+             'description': DESCRIPTION, 'category': 'paints', 'stock_quantity': i % 40,
+             'image_url': f'/static/uploads/products/{i}.jpg'}
+            for i in range(args.products)])
+        db.session.commit()
+
+    print(f"{'per page':>8}{'entities ms':>13}{'entities KiB':>14}"
+          f"{'cards ms':>10}{'cards KiB':>11}{'render ms':>11}")
+    for size in [int(s) for s in args.sizes.split(',')]:
+        with app.test_request_context('/products'):
+            entities = measure(
+                lambda: Product.query.filter_by(is_active=True)
+                .order_by(Product.created_at.desc()).limit(size).all(),
+                args.repeat, db.session.remove)
+            cards = measure(lambda: load_cards(card_select().order_by(Product.created_at.desc())
+                                               .limit(size)),
+                            args.repeat, db.session.remove)
+            page = catalogue_cards(page=1, per_page=size)
+            render_ms = measure(lambda: render_template('products.html', products=page,
+                                                        categories=['paints'],
+                                                        current_category=None, search=None),
+                                args.repeat, lambda: None)[0]
+        print(f'{size:>8}{entities[0]:>13.2f}{entities[1]:>14.0f}'
+              f'{cards[0]:>10.2f}{cards[1]:>11.0f}{render_ms:>11.2f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,69 @@
+"""Cost of admin order status counts: COUNT(*) against order_status_count.
+
+Fills a throwaway SQLite order table, builds the status counts with
+order_lifecycle.recount(), then times the per-status COUNT(*) queries the
+dashboard and order filter used to run against one read of the counts.
+
+Run from the repository root:
+    python -m benchmarks.bench_order_counts [--orders 500000] [--repeat 20]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+STATUSES = ('pending', 'pending_verification', 'confirmed', 'shipped', 'delivered', 'cancelled')
+
+
+def timed(fn, repeat):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=500000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-order-counts-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from app import app, db
+    from models import Order, User
+    import order_lifecycle
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        user = User(username='buyer', email='buyer@example.com')
+        db.session.add(user)
+        db.session.commit()
+        # Core insert: the bulk load bypasses the flush listeners on purpose
+        db.session.execute(db.insert(Order.__table__), [
+            {'user_id': user.id, 'total_amount': 5000, 'status': STATUSES[i % 7 % 6],
+             'payment_status': 'paid' if i % 3 else 'pending'}
+            for i in range(args.orders)])
+        db.session.commit()
+        order_lifecycle.recount()
+
+        def count_star():
+            return {status: Order.query.filter_by(status=status).count() for status in STATUSES}
+
+        scan_ms, scanned = timed(count_star, args.repeat)
+        counter_ms, counted = timed(order_lifecycle.status_counts, args.repeat)
+        assert scanned == {status: counted.get(status, 0) for status in STATUSES}
+        print(f'{args.orders} orders, counts per status for {len(STATUSES)} statuses')
+        print(f'COUNT(*) per status      {scan_ms:>9.2f} ms')
+        print(f'order_status_count read  {counter_ms:>9.2f} ms')
+
+
+if __name__ == '__main__':
+    main()
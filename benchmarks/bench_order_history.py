@@ -0,0 +1,124 @@
+"""Customer order history page: order entities vs. the order_summary read model.
+
+Fills a throwaway SQLite database with one loyal customer's orders (plus
+other customers' orders around them), then for the first and a deep page
+compares the old read path (a page of Order rows, then each order's items
+and each item's product for the three-item preview) against the page
+query on order_summary and its count, counting SQL statements, and times
+the full /orders request.
+
+Run from the repository root:
+    python -m benchmarks.bench_order_history [--orders 500] [--other-orders 50000]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--orders', type=int, default=500)
+    parser.add_argument('--other-orders', type=int, default=50000)
+    parser.add_argument('--items', type=int, default=6)
+    parser.add_argument('--per-page', type=int, default=10)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-order-history-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    os.environ['PROMOTION_CHECK_INTERVAL'] = '0'
+    import sqlalchemy as sa
+    from app import app, db
+    from models import Order, OrderItem, Product, User
+    from order_history import rebuild_all, user_order_page
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        db.session.execute(db.insert(Product), [
+            {'name': f'Emulsion {i}', 'price': 5000 + i, 'category': 'paints',
+             'image_url': f'/static/uploads/products/{i}.jpg', 'stock_quantity': 100}
+            for i in range(200)])
+        db.session.execute(db.insert(User), [
+            {'username': f'customer{i}', 'email': f'customer{i}@example.com'} for i in range(100)])
+        loyal_id = db.session.scalar(sa.select(User.id).order_by(User.id))
+        product_ids = db.session.scalars(sa.select(Product.id)).all()
+        start = datetime.utcnow() - timedelta(days=720)
+        total = args.orders + args.other_orders
+        # The loyal customer's orders are spread evenly among the others
+        every = max(total // args.orders, 1)
+        db.session.execute(db.insert(Order), [
+            {'id': i + 1, 'user_id': loyal_id if i % every == 0 else loyal_id + 1 + i % 99,
+             'total_amount': 25000, 'status': 'delivered', 'payment_status': 'paid',
+             'created_at': start + timedelta(minutes=i * 10)}
+            for i in range(total)])
+        db.session.execute(db.insert(OrderItem), [
+            {'order_id': i + 1, 'product_id': product_ids[(i + j) % len(product_ids)],
+             'quantity': 1 + j % 3, 'unit_price': 5000, 'total_price': 5000}
+            for i in range(total) for j in range(args.items)])
+        db.session.commit()
+        print(f'Built {rebuild_all()} order summaries')
+        pages = user_order_page(loyal_id, per_page=args.per_page).pages
+        engine = db.engine
+
+    statements = []
+
+    @sa.event.listens_for(engine, 'before_cursor_execute')
+    def count(conn, cursor, statement, parameters, context, executemany):
+        statements.append(statement)
+
+    def entities(page):
+        orders = (Order.query.filter_by(user_id=loyal_id).order_by(Order.created_at.desc())
+                  .paginate(page=page, per_page=args.per_page, error_out=False))
+        for order in orders.items:
+            for item in order.order_items[:3]:
+                item.product.name, item.product.image_url
+            len(order.order_items)
+
+    def summaries(page):
+        for summary in user_order_page(loyal_id, page=page, per_page=args.per_page).items:
+            summary.preview_items
+
+    print(f'{args.orders} orders for one customer among {args.other_orders} others, '
+          f'{args.items} items each')
+    print(f"{'page':>6}{'entities ms':>13}{'queries':>9}{'summary ms':>12}{'queries':>9}")
+    for page in (1, pages):
+        results = []
+        for fn in (entities, summaries):
+            with app.test_request_context():
+                statements.clear()
+                fn(page)
+                db.session.remove()
+                queries = len(statements)
+                results.append((median_ms(lambda: (fn(page), db.session.remove()), args.repeat),
+                                queries))
+        print(f'{page:>6}{results[0][0]:>13.2f}{results[0][1]:>9}'
+              f'{results[1][0]:>12.2f}{results[1][1]:>9}')
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session['_user_id'] = str(loyal_id)
+        session['_fresh'] = True
+    print(f"GET /orders          {median_ms(lambda: client.get('/orders'), args.repeat):>9.2f} ms")
+
+
+if __name__ == '__main__':
+    main()
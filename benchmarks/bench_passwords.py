@@ -0,0 +1,81 @@
+"""Login throughput for each password hashing policy.
+
+For every method this reports the cost of a single verification and the
+logins/sec a PasswordHasher sustains when many request threads log in at
+once, for a few pool sizes.
+
+Run from the repository root:
+    python -m benchmarks.bench_passwords [--seconds 3] [--clients 16]
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from passwords import PasswordHasher  # noqa: E402
+
+METHODS = [
+    'pbkdf2:sha256:600000',
+    'pbkdf2:sha256:1000000',
+    'scrypt:16384:8:1',
+    'scrypt:32768:8:1',
+]
+
+
+def single_verify_ms(hasher, stored, rounds=5):
+    started = time.perf_counter()
+    for _ in range(rounds):
+        hasher.verify(stored, 'correct horse battery staple')
+    return (time.perf_counter() - started) / rounds * 1000
+
+
+def throughput(hasher, stored, clients, seconds):
+    stop_at = time.perf_counter() + seconds
+    count = 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal count
+        while time.perf_counter() < stop_at:
+            hasher.verify(stored, 'correct horse battery staple')
+            with lock:
+                count += 1
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    return count / (time.perf_counter() - started)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=3)
+    parser.add_argument('--clients', type=int, default=16)
+    parser.add_argument('--workers', default='1,2,4')
+    parser.add_argument('--methods', default=','.join(METHODS))
+    args = parser.parse_args()
+    pool_sizes = [int(w) for w in args.workers.split(',')]
+
+    header = f"{'method':<24}{'verify ms':>10}" + ''.join(
+        f"{f'{w} worker(s)':>14}" for w in pool_sizes)
+    print(f"{args.clients} concurrent logins, {os.cpu_count()} CPUs; columns are logins/sec")
+    print(header)
+    for method in args.methods.split(','):
+        row = None
+        for workers in pool_sizes:
+            hasher = PasswordHasher(method, workers=workers,
+                                    max_queue=args.clients, queue_timeout=60)
+            stored = hasher.hash('correct horse battery staple')
+            if row is None:
+                row = f"{method:<24}{single_verify_ms(hasher, stored):>10.1f}"
+            row += f"{throughput(hasher, stored, args.clients, args.seconds):>14.1f}"
+        print(row)
+
+
+if __name__ == '__main__':
+    main()
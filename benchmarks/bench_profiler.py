@@ -0,0 +1,63 @@
+"""Per-request overhead of the sampling profiler.
+
+Serves the product catalogue through the Flask test client with the
+profiler off, at 1% sampling and with every request sampled, and reports
+the mean time per request for each.
+
+Run from the repository root:
+    python -m benchmarks.bench_profiler [--requests 2000] [--interval-ms 5]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def per_request_ms(client, path, requests):
+    client.get(path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - started) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--interval-ms', type=float, default=5)
+    parser.add_argument('--path', default='/products')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-profiler-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from app import app, db
+    from models import Product
+    from profiling import ProfilerMiddleware
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        db.session.execute(db.insert(Product), [
+            {'name': f'Emulsion {i}', 'price': 5000 + i, 'description': 'Matte emulsion',
+             'category': 'paints', 'stock_quantity': 10} for i in range(200)])
+        db.session.commit()
+
+    plain = app.wsgi_app
+    baseline = None
+    for label, rate in (('off', 0), ('1% sampled', 0.01), ('all sampled', 1.0)):
+        app.wsgi_app = plain if rate == 0 else ProfilerMiddleware(
+            plain, app, rate, interval_ms=args.interval_ms,
+            output_dir=os.path.join(workdir, 'profiles'))
+        ms = per_request_ms(app.test_client(), args.path, args.requests)
+        baseline = baseline or ms
+        print(f'{label:<14}{ms:8.3f} ms/request ({(ms / baseline - 1) * 100:+.1f}%)')
+    app.wsgi_app = plain
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""Catalogue pages with promotions evaluated per request vs. precomputed.
+
+Fills a throwaway SQLite catalogue and a set of category and product
+promotions, then compares a page of product cards where each request
+loads the live promotions and applies them to every card against reading
+the precomputed Product.effective_price, and times promotions.reprice()
+when every promotion starts and when they all end.
+
+Run from the repository root:
+    python -m benchmarks.bench_promotions [--products 50000] [--promotions 200]
+"""
+import argparse
+import logging
+import os
+import statistics
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+CATEGORIES = ('paints', 'brushes', 'accessories', 'tools')
+
+
+def median_ms(fn, repeat):
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - started) * 1000)
+    return statistics.median(samples)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--products', type=int, default=50000)
+    parser.add_argument('--promotions', type=int, default=200)
+    parser.add_argument('--per-page', type=int, default=48)
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-promotions-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    os.environ['PROMOTION_CHECK_INTERVAL'] = '0'
+    import sqlalchemy as sa
+    from app import app, db
+    from listing import CARD_COLUMNS, load_cards, card_select
+    from models import Product, Promotion
+    from promotions import best_price, live_rules, reprice
+    logging.disable(logging.INFO)
+
+    start = datetime.utcnow() + timedelta(days=1)
+    end = start + timedelta(days=2)
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        db.session.execute(db.insert(Product), [
+            {'name': f'Emulsion {i}', 'price': 5000 + i, 'category': CATEGORIES[i % 4],
+             'stock_quantity': 20, 'is_active': True}
+            for i in range(args.products)])
+        db.session.execute(db.insert(Promotion), [
+            {'name': 'Weekend paints', 'scope': 'category', 'category': 'paints',
+             'kind': 'percent', 'amount': 15, 'starts_at': start, 'ends_at': end,
+             'is_active': True}] + [
+            {'name': f'Deal {i}', 'scope': 'product', 'product_id': i * 7 + 1,
+             'kind': 'fixed', 'amount': 750, 'starts_at': start, 'ends_at': end,
+             'is_active': True}
+            for i in range(args.promotions - 1)])
+        db.session.commit()
+
+        page = (sa.select(*CARD_COLUMNS, Product.price.label('list_price'))
+                .where(Product.is_active.is_(True))
+                .order_by(Product.created_at.desc(), Product.id.desc()).limit(args.per_page))
+
+        def per_request():
+            rules = live_rules(start + timedelta(hours=1))
+            return [best_price(row.list_price, rules.for_product(row.id, row.category))[0]
+                    for row in db.session.execute(page)]
+
+        precomputed_page = card_select().order_by(Product.created_at.desc(),
+                                                  Product.id.desc()).limit(args.per_page)
+
+        with app.test_request_context():
+            print(f'page of {args.per_page} cards, {args.promotions} promotions, '
+                  f'{args.products} products')
+            print(f'  rules per request   {median_ms(per_request, args.repeat):>9.2f} ms')
+            print(f'  effective_price     '
+                  f'{median_ms(lambda: load_cards(precomputed_page), args.repeat):>9.2f} ms')
+
+            for label, moment in (('promotions start', start + timedelta(minutes=1)),
+                                  ('promotions end', end + timedelta(minutes=1)),
+                                  ('nothing changed', end + timedelta(minutes=2))):
+                started = time.perf_counter()
+                changed = reprice(moment)
+                print(f'reprice, {label:<17}{(time.perf_counter() - started) * 1000:>9.1f} ms  '
+                      f'({changed} products)')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""Per-request overhead of the rate limiter.
+
+Reports the cost of one bucket update for each store and of a view
+guarded by the per-IP + per-account limits used on the login forms,
+compared with the same view unguarded. Targets: well under 1 ms.
+
+Run from the repository root:
+    python -m benchmarks.bench_ratelimit [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from flask import Flask  # noqa: E402
+
+from ratelimit import (MemoryStore, RedisStore, form_field,  # noqa: E402
+                       init_rate_limiting, rate_limit)
+
+
+def per_call_us(fn, iterations):
+    started = time.perf_counter()
+    for i in range(iterations):
+        fn(i)
+    return (time.perf_counter() - started) / iterations * 1e6
+
+
+def bench_store(label, store, iterations):
+    # Spread hits over many keys so buckets never run dry
+    us = per_call_us(lambda i: store.consume(f'bench:{i % 5000}', 1000000, 1000), iterations)
+    print(f'{label:<28}{us:10.1f} us/check')
+
+
+def bench_view(iterations):
+    app = Flask(__name__)
+    init_rate_limiting(app)
+    app.config['RATELIMITS'] = {'bench:ip': '1000000/second',
+                                'bench:account': '1000000/second'}
+
+    def view():
+        return 'ok'
+
+    guarded = rate_limit('bench:ip', '20/minute')(
+        rate_limit('bench:account', '5/minute', key=form_field('email'))(view))
+
+    with app.test_request_context('/login', method='POST',
+                                  data={'email': 'someone@example.com'}):
+        bare = per_call_us(lambda i: view(), iterations)
+        limited = per_call_us(lambda i: guarded(), iterations)
+    print(f"{'login view, unguarded':<28}{bare:10.1f} us/request")
+    print(f"{'login view, ip + account':<28}{limited:10.1f} us/request "
+          f"(+{limited - bare:.1f} us)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--iterations', type=int, default=50000)
+    parser.add_argument('--redis-url', default=os.environ.get('RATELIMIT_STORAGE_URL'))
+    args = parser.parse_args()
+
+    bench_store('memory store', MemoryStore(), args.iterations)
+    if args.redis_url and args.redis_url.startswith('redis'):
+        try:
+            bench_store('redis store', RedisStore(args.redis_url), args.iterations // 10)
+        except Exception as e:
+            print(f"{'redis store':<28}skipped ({e.__class__.__name__}: {e})")
+    bench_view(args.iterations)
+
+
+if __name__ == '__main__':
+    main()
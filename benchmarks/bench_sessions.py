@@ -0,0 +1,111 @@
+"""Per-request session overhead, signed cookie vs. server-side stores.
+
+For each session mode, a logged-in test client fetches a page that only
+reads the session, then one that writes to it on every request. Reports
+the mean time per request, the size of the Cookie header the browser
+would send, and how many store writes were made.
+
+Run from the repository root:
+    python -m benchmarks.bench_sessions [--requests 2000] [--redis-url redis://localhost:6379/15]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+class CountingStore:
+    """Wraps a store and counts calls that write"""
+
+    def __init__(self, store):
+        self.store = store
+        self.writes = 0
+
+    def load(self, sid):
+        return self.store.load(sid)
+
+    def save(self, sid, data, expires):
+        self.writes += 1
+        self.store.save(sid, data, expires)
+
+    def touch(self, sid, expires):
+        self.writes += 1
+        self.store.touch(sid, expires)
+
+    def delete(self, sid):
+        self.writes += 1
+        self.store.delete(sid)
+
+
+def per_request_ms(client, path, requests):
+    client.get(path)
+    started = time.perf_counter()
+    for _ in range(requests):
+        client.get(path)
+    return (time.perf_counter() - started) / requests * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--redis-url', help='also measure the Redis store')
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-sessions-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from flask import session
+    from flask.sessions import SecureCookieSessionInterface
+    from app import app, db
+    from seed import seed_defaults
+    from models import User
+    from sessions import ServerSideSessionInterface, create_store
+    logging.disable(logging.INFO)
+
+    @app.route('/_bench/session-write')
+    def bench_session_write():
+        session['recently_viewed'] = [session.get('recently_viewed', [0])[0] + 1, 7, 12]
+        return 'ok'
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        seed_defaults()
+        admin_id = User.query.filter_by(is_admin=True).first().id
+
+    modes = [('cookie', None), ('sql', 'sql://'),
+             ('file', f"file://{os.path.join(workdir, 'sessions')}")]
+    if args.redis_url:
+        modes.append(('redis', args.redis_url))
+
+    print(f"{'mode':<8}{'read ms':>9}{'write ms':>10}{'cookie B':>10}{'writes':>8}")
+    for label, url in modes:
+        counter = None
+        if url is None:
+            app.session_interface = SecureCookieSessionInterface()
+        else:
+            counter = CountingStore(create_store(url, db))
+            app.session_interface = ServerSideSessionInterface(counter)
+
+        client = app.test_client()
+        with client.session_transaction() as sess:
+            sess['_user_id'] = str(admin_id)
+            sess['_fresh'] = True
+            sess['admin_user_id'] = admin_id
+        client.get('/products')
+        cookie = client.get_cookie(app.config['SESSION_COOKIE_NAME'])
+        cookie_bytes = len(cookie.key) + 1 + len(cookie.value)
+
+        if counter is not None:
+            counter.writes = 0
+        read_ms = per_request_ms(client, '/products', args.requests)
+        write_ms = per_request_ms(client, '/_bench/session-write', args.requests)
+        writes = '-' if counter is None else counter.writes
+        print(f'{label:<8}{read_ms:>9.3f}{write_ms:>10.3f}{cookie_bytes:>10}{writes:>8}')
+
+
+if __name__ == '__main__':
+    main()
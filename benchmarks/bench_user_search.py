@@ -0,0 +1,85 @@
+"""Latency of admin user search: four OR-ed LIKEs against user_search.
+
+Fills a throwaway SQLite user table, then times the old filter (username,
+email, first and last name each matched with contains()) against the
+typeahead for an exact email, a phone prefix and a name. SQLite has no
+trigram index, so the name case still scans one column here; on
+PostgreSQL it is served by the pg_trgm index from the migration.
+
+Run from the repository root:
+    python -m benchmarks.bench_user_search [--users 200000] [--repeat 20]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+FIRST_NAMES = ('Ada', 'Tunde', 'Chioma', 'Emeka', 'Ngozi', 'Bola', 'Ifeanyi', 'Zainab')
+LAST_NAMES = ('Obi', 'Bakare', 'Okafor', 'Adeyemi', 'Balogun', 'Eze', 'Musa', 'Nwosu')
+
+
+def timed(fn, repeat):
+    fn()
+    started = time.perf_counter()
+    for _ in range(repeat):
+        result = fn()
+    return (time.perf_counter() - started) * 1000 / repeat, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--users', type=int, default=200000)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='bench-user-search-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'bench.db')}"
+    from app import app, db
+    from models import User
+    import user_search
+    logging.disable(logging.INFO)
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        rows = []
+        for i in range(args.users):
+            first, last = FIRST_NAMES[i % 8], LAST_NAMES[i // 8 % 8]
+            email = f'{first}.{last}{i}@example.com'
+            phone = f'080{i:08d}'
+            rows.append({'username': f'{first.lower()}{i}', 'email': email, 'first_name': first,
+                         'last_name': last, 'phone': phone,
+                         'search_text': user_search.normalize_text(f'{first}{i} {first} {last} {email}'),
+                         'phone_digits': user_search.normalize_phone(phone)})
+        db.session.execute(db.insert(User), rows)
+        db.session.commit()
+
+        target = args.users // 2
+        email, phone = rows[target]['email'], rows[target]['phone'][:9]
+        name = f"{rows[target]['first_name']} {rows[target]['username']}"
+
+        def old(search):
+            return lambda: User.query.filter(
+                (User.username.contains(search)) | (User.email.contains(search))
+                | (User.first_name.contains(search)) | (User.last_name.contains(search))
+            ).order_by(User.id.desc()).limit(user_search.TYPEAHEAD_LIMIT).all()
+
+        def new(search):
+            return lambda: user_search.typeahead(search)[1]
+
+        print(f"{'query':<34}{'old ms':>10}{'new ms':>10}{'rows':>6}")
+        for label, search in (('exact email', email.upper()), ('phone prefix', phone),
+                              ('name (single word)', rows[target]['username'])):
+            old_ms, _ = timed(old(search), args.repeat)
+            new_ms, found = timed(new(search), args.repeat)
+            print(f'{label:<34}{old_ms:>10.2f}{new_ms:>10.2f}{len(found):>6}')
+        new_ms, found = timed(new(name), args.repeat)
+        print(f"{'name (two words, new only)':<34}{'':>10}{new_ms:>10.2f}{len(found):>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,171 @@
+"""Requests/sec of /verify_payment under sync vs async gunicorn workers.
+
+The Paystack API is replaced by a local stub that sleeps before answering,
+so the numbers show how many requests a fixed number of worker processes
+can keep in flight while they wait on the gateway.
+
+Run from the repository root:
+    python -m benchmarks.bench_workers [--delay 0.2] [--clients 50] [--duration 10]
+"""
+import argparse
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SECRET = "bench-secret"
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_gateway(delay):
+    class SlowPaystack(BaseHTTPRequestHandler):
+        def do_GET(self):
+            time.sleep(delay)
+            body = json.dumps({"status": False, "data": {"status": "abandoned"}}).encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "application/json")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", free_port()), SlowPaystack)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(env):
+    """Create a user with one order and return (order_id, session_cookie)."""
+    os.environ.update(env)
+    sys.path.insert(0, ROOT)
+    from app import app, db
+    from models import User, Order
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        user = User(username="bench", email="bench@example.com")
+        db.session.add(user)
+        db.session.flush()
+        order = Order(user_id=user.id, total_amount=1000)
+        db.session.add(order)
+        db.session.commit()
+        serializer = app.session_interface.get_signing_serializer(app)
+        cookie = serializer.dumps({"_user_id": str(user.id), "_fresh": True})
+        return order.id, cookie
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        try:
+            with socket.create_connection(("127.0.0.1", port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_load(url, cookie, clients, duration):
+    stop_at = time.time() + duration
+    latencies = []
+    errors = 0
+    lock = threading.Lock()
+
+    def client():
+        nonlocal errors
+        session = requests.Session()
+        session.cookies.set("session", cookie)
+        while time.time() < stop_at:
+            started = time.perf_counter()
+            try:
+                response = session.get(url, allow_redirects=False, timeout=60)
+                ok = response.status_code == 302
+            except requests.RequestException:
+                ok = False
+            with lock:
+                if ok:
+                    latencies.append(time.perf_counter() - started)
+                else:
+                    errors += 1
+
+    with ThreadPoolExecutor(max_workers=clients) as pool:
+        for _ in range(clients):
+            pool.submit(client)
+    latencies.sort()
+    return latencies, errors
+
+
+def bench_worker_class(worker_class, env, order_id, cookie, args):
+    port = free_port()
+    worker_env = dict(os.environ, **env,
+                      GUNICORN_WORKER_CLASS=worker_class,
+                      GUNICORN_BIND=f"127.0.0.1:{port}",
+                      GUNICORN_ACCESS_LOG="",
+                      WEB_CONCURRENCY=str(args.workers))
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "gunicorn", "-c", "gunicorn.conf.py", "app:app"],
+        cwd=ROOT, env=worker_env,
+        stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        if not wait_for_port(port):
+            print(f"{worker_class:>8}: gunicorn did not start (is the worker class installed?)")
+            return
+        url = f"http://127.0.0.1:{port}/verify_payment/{order_id}?reference=bench"
+        run_load(url, cookie, min(args.clients, 4), 1)  # warm up
+        latencies, errors = run_load(url, cookie, args.clients, args.duration)
+        if not latencies:
+            print(f"{worker_class:>8}: no successful requests ({errors} errors)")
+            return
+        p50 = latencies[len(latencies) // 2] * 1000
+        p95 = latencies[int(len(latencies) * 0.95)] * 1000
+        print(f"{worker_class:>8}: {len(latencies) / args.duration:8.1f} req/s  "
+              f"p50 {p50:7.1f} ms  p95 {p95:7.1f} ms  errors {errors}")
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--delay", type=float, default=0.2, help="gateway latency in seconds")
+    parser.add_argument("--clients", type=int, default=50)
+    parser.add_argument("--duration", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--classes", default="sync,gthread,gevent")
+    args = parser.parse_args()
+
+    gateway = start_gateway(args.delay)
+    tmpdir = tempfile.mkdtemp()
+    env = {
+        "DATABASE_URL": f"sqlite:///{os.path.join(tmpdir, 'bench.db')}",
+        "SESSION_SECRET": SECRET,
+        "PAYSTACK_API_BASE": f"http://127.0.0.1:{gateway.server_port}",
+    }
+    order_id, cookie = seed(env)
+
+    print(f"gateway delay {args.delay * 1000:.0f} ms, {args.workers} workers, "
+          f"{args.clients} concurrent clients, {args.duration:.0f}s per run")
+    for worker_class in args.classes.split(","):
+        bench_worker_class(worker_class.strip(), env, order_id, cookie, args)
+    gateway.shutdown()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""Fire duplicate checkout submissions in parallel and count the orders.
+
+Fills a cart, then sends the same checkout form from several threads at
+once (a double-click or browser retry), first with one shared
+idempotency key and then with none, and reports how many orders were
+created and how much stock was taken each time. With the key, exactly
+one order must exist and every response must point at it.
+
+Run from the repository root:
+    python -m benchmarks.race_checkout [--submissions 8] [--rounds 20]
+"""
+import argparse
+import logging
+import os
+import sys
+import tempfile
+import threading
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--submissions', type=int, default=8)
+    parser.add_argument('--rounds', type=int, default=20)
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix='race-checkout-')
+    os.environ['DATABASE_URL'] = f"sqlite:///{os.path.join(workdir, 'race.db')}"
+    os.environ['RATELIMIT_ENABLED'] = 'false'
+    from app import app, db
+    from idempotency import new_key
+    from models import CartItem, Order, PaymentMethod, Product, User
+    logging.disable(logging.WARNING)
+    app.config['WTF_CSRF_ENABLED'] = False
+
+    with app.app_context():
+        db.create_all()  # throwaway database, no need to migrate
+        user = User(username='racer', email='racer@example.com')
+        product = Product(name='Emulsion', price=5000, category='paints', stock_quantity=10 ** 6)
+        method = PaymentMethod(name='Card', method_type='gateway', configuration='{}', is_active=True)
+        db.session.add_all([user, product, method])
+        db.session.commit()
+        user_id, product_id, method_id = user.id, product.id, method.id
+
+    def stock():
+        with app.app_context():
+            return db.session.get(Product, product_id).stock_quantity
+
+    def orders():
+        with app.app_context():
+            return Order.query.filter_by(user_id=user_id).count()
+
+    def one_round(key):
+        with app.app_context():
+            db.session.add(CartItem(user_id=user_id, product_id=product_id, quantity=2))
+            db.session.commit()
+        data = {'shipping_address': '12 Allen Avenue, Ikeja, Lagos', 'phone': '08012345678',
+                'payment_method': str(method_id)}
+        if key:
+            data['idempotency_key'] = key
+        barrier = threading.Barrier(args.submissions)
+        locations = []
+
+        def submit():
+            client = app.test_client()
+            with client.session_transaction() as session:
+                session['_user_id'] = str(user_id)
+                session['_fresh'] = True
+            barrier.wait()
+            response = client.post('/checkout', data=data)
+            locations.append(response.location or f'status {response.status_code}')
+
+        threads = [threading.Thread(target=submit) for _ in range(args.submissions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return locations
+
+    for label, keyed in (('same idempotency key', True), ('no idempotency key', False)):
+        orders_before, stock_before = orders(), stock()
+        consistent = 0
+        for _ in range(args.rounds):
+            locations = one_round(new_key() if keyed else None)
+            payment_pages = {location for location in locations if '/payment/' in location}
+            consistent += len(payment_pages) == 1
+        created = orders() - orders_before
+        print(f'{label:<22} {args.rounds} rounds x {args.submissions} submissions: '
+              f'{created} orders, {stock_before - stock()} units taken, '
+              f'{consistent}/{args.rounds} rounds answered with a single order')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,353 @@
+"""Two-level cache for hot, rarely changing reads.
+
+    @memoize('categories', tags=('products',))
+    def active_categories():
+        ...
+
+Values are looked up in a per-process LRU first, then in the shared tier
+(CACHE_URL=redis://..., pickled), and only then computed. Each key
+carries the current version of its tags, so invalidating a tag just bumps
+its version: old entries are never read again and age out on their own.
+Versions live in the shared tier when there is one, so a change made in
+one worker is seen by all of them; they are read once per request.
+Without one they live in the cache_version table (cache_versions.py),
+and each worker re-reads them every CACHE_VERSION_REFRESH_INTERVAL
+seconds instead, so a lookup normally needs no query at all.
+
+Tags are bumped after a commit that inserted, changed or deleted one of
+the models in MODEL_TAGS. Orders and users change on every checkout and
+login, so they are not tagged; values derived from them use a short TTL. Writes that bypass the ORM (Core UPDATEs) call
+invalidate_on_commit(session, *tags) instead. Values are shared between
+callers, so treat them as read-only.
+
+Concurrent misses on one key are computed once: other threads in the
+process wait for the first, and with a shared tier a short lock keeps
+other workers from recomputing it at the same time (single-flight).
+CACHE_URL=memory:// (the default) keeps values in process,
+null:// turns caching off. Per-namespace hit rates are at /admin/cache.
+"""
+import time
+import uuid
+import pickle
+import logging
+import threading
+from collections import OrderedDict
+from functools import wraps
+
+from flask import current_app, g, has_app_context, has_request_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache_versions import DatabaseVersions, get_versions
+from models import Customization, PaymentMethod, Product, SiteCustomization
+
+logger = logging.getLogger(__name__)
+
+MISSING = object()
+
+# Tags bumped when rows of these models are committed
+MODEL_TAGS = {
+    Product: ('products',),
+    PaymentMethod: ('payment_methods',),
+    SiteCustomization: ('customizations',),
+    Customization: ('customizations',),
+}
+
+
+class LocalTier:
+    """LRU dict with per-entry expiry; one copy per process"""
+
+    def __init__(self, max_entries=2000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return MISSING
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return MISSING
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisTier:
+    """Shared values, tag versions and single-flight locks"""
+
+    def __init__(self, url, prefix='cache:'):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2,
+                                            socket_connect_timeout=0.2)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return pickle.loads(value) if value is not None else MISSING
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, pickle.dumps(value), ex=ttl)
+
+    def get_many(self, tags):
+        values = self._client.mget([f'{self._prefix}tag:{tag}' for tag in tags])
+        return [int(value) if value is not None else 0 for value in values]
+
+    def incr(self, tag):
+        self._client.incr(f'{self._prefix}tag:{tag}')
+
+    def acquire(self, key, timeout):
+        token = uuid.uuid4().hex
+        if self._client.set(f'{self._prefix}lock:{key}', token, nx=True, px=int(timeout * 1000)):
+            return token
+        return None
+
+    def release(self, key, token):
+        lock_key = f'{self._prefix}lock:{key}'
+        if self._client.get(lock_key) == token.encode():
+            self._client.delete(lock_key)
+
+
+class _Flight:
+
+    def __init__(self):
+        self.done = threading.Event()
+        self.value = MISSING
+
+
+class Cache:
+
+    def __init__(self, local, shared=None, default_ttl=300, lock_timeout=5.0, versions=None):
+        self.local = local
+        self.shared = shared
+        if shared is not None:
+            versions = shared
+        self.versions = versions if versions is not None else DatabaseVersions()
+        self.default_ttl = default_ttl
+        self.lock_timeout = lock_timeout
+        self._flights = {}
+        self._flights_lock = threading.Lock()
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, namespace, outcome):
+        with self._stats_lock:
+            counts = self._stats.setdefault(namespace, dict.fromkeys(
+                ('local_hits', 'shared_hits', 'misses', 'coalesced', 'errors'), 0))
+            counts[outcome] += 1
+
+    def tag_versions(self, tags):
+        # Read once per request, like the fragment cache version
+        memo = g.setdefault('_cache_tag_versions', {}) if has_request_context() else {}
+        unknown = [tag for tag in tags if tag not in memo]
+        if unknown:
+            memo.update(zip(unknown, self.versions.get_many(unknown)))
+        return [memo[tag] for tag in tags]
+
+    def invalidate(self, *tags):
+        for tag in tags:
+            self.versions.incr(tag)
+        if has_request_context():
+            g.pop('_cache_tag_versions', None)
+
+    def _from_shared(self, key, ttl):
+        value = self.shared.get(key)
+        if value is not MISSING:
+            self.local.set(key, value, ttl)
+        return value
+
+    def get_or_set(self, namespace, key, compute, ttl=None, tags=()):
+        ttl = ttl or self.default_ttl
+        try:
+            versions = self.tag_versions(tags)
+            key = ':'.join([namespace, key] + [f'{tag}.{version}'
+                                                for tag, version in zip(tags, versions)])
+            value = self.local.get(key)
+            if value is not MISSING:
+                self._count(namespace, 'local_hits')
+                return value
+            if self.shared is not None:
+                value = self._from_shared(key, ttl)
+                if value is not MISSING:
+                    self._count(namespace, 'shared_hits')
+                    return value
+        except Exception:
+            # A broken shared tier must not take pages down with it
+            logger.exception('Cache unavailable; computing %s directly', namespace)
+            self._count(namespace, 'errors')
+            return compute()
+
+        with self._flights_lock:
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+        if not leader:
+            flight.done.wait(self.lock_timeout)
+            if flight.value is not MISSING:
+                self._count(namespace, 'coalesced')
+                return flight.value
+            self._count(namespace, 'misses')
+            return compute()
+
+        try:
+            value = self._compute_once(namespace, key, compute, ttl)
+            flight.value = value
+            return value
+        finally:
+            with self._flights_lock:
+                self._flights.pop(key, None)
+            flight.done.set()
+
+    def _compute_once(self, namespace, key, compute, ttl):
+        token = None
+        if self.shared is not None:
+            try:
+                token = self.shared.acquire(key, self.lock_timeout)
+                if token is None:
+                    # Another worker is computing it; give it a moment
+                    deadline = time.monotonic() + self.lock_timeout
+                    while time.monotonic() < deadline:
+                        time.sleep(0.05)
+                        value = self._from_shared(key, ttl)
+                        if value is not MISSING:
+                            self._count(namespace, 'coalesced')
+                            return value
+            except Exception:
+                logger.exception('Cache lock unavailable for %s', namespace)
+
+        self._count(namespace, 'misses')
+        try:
+            value = compute()
+            self.local.set(key, value, ttl)
+            if self.shared is not None:
+                try:
+                    self.shared.set(key, value, ttl)
+                except Exception:
+                    logger.exception('Could not store %s in the shared cache', namespace)
+                    self._count(namespace, 'errors')
+            return value
+        finally:
+            if token is not None:
+                try:
+                    self.shared.release(key, token)
+                except Exception:
+                    logger.exception('Could not release cache lock for %s', namespace)
+
+    def stats(self):
+        with self._stats_lock:
+            namespaces = {name: dict(counts) for name, counts in self._stats.items()}
+        for counts in namespaces.values():
+            hits = counts['local_hits'] + counts['shared_hits'] + counts['coalesced']
+            total = hits + counts['misses']
+            counts['hit_rate'] = round(hits / total, 3) if total else None
+        return {'shared': type(self.shared).__name__ if self.shared is not None else None,
+                'namespaces': namespaces}
+
+
+class NullCache:
+
+    def get_or_set(self, namespace, key, compute, ttl=None, tags=()):
+        return compute()
+
+    def tag_versions(self, tags):
+        return None  # nothing is invalidated, so nothing tagged can be cached
+
+    def invalidate(self, *tags):
+        pass
+
+    def stats(self):
+        return {'shared': None, 'namespaces': {}}
+
+
+def create_cache(url, local_max_entries=2000, default_ttl=300, lock_timeout=5.0,
+                 versions=None):
+    if url and url.startswith('null://'):
+        return NullCache()
+    shared = None
+    if url and not url.startswith('memory://'):
+        shared = RedisTier(url)
+    return Cache(LocalTier(local_max_entries), shared, default_ttl=default_ttl,
+                 lock_timeout=lock_timeout, versions=versions)
+
+
+def get_cache():
+    if not has_app_context():
+        return None
+    return current_app.extensions.get('cache')
+
+
+def memoize(namespace, ttl=None, tags=()):
+    """Cache fn's result per argument list under `namespace` for `ttl`
+    seconds (CACHE_DEFAULT_TTL if not given), until one of `tags` is
+    invalidated"""
+    tags = tuple(tags)
+
+    def decorator(fn):
+        @wraps(fn)
+        def wrapper(*args, **kwargs):
+            cache = get_cache()
+            if cache is None:
+                return fn(*args, **kwargs)
+            key = repr(args + tuple(sorted(kwargs.items())))
+            return cache.get_or_set(namespace, key, lambda: fn(*args, **kwargs),
+                                    ttl=ttl, tags=tags)
+        wrapper.uncached = fn
+        return wrapper
+    return decorator
+
+
+def invalidate(*tags):
+    """Bump `tags` now; prefer invalidate_on_commit() inside a transaction"""
+    cache = get_cache()
+    if cache is not None:
+        cache.invalidate(*tags)
+
+
+def invalidate_on_commit(session, *tags):
+    session.info.setdefault('cache_tags', set()).update(tags)
+
+
+@event.listens_for(Session, 'after_flush')
+def _collect_tags(session, flush_context):
+    tags = set()
+    for obj in session.new | session.dirty | session.deleted:
+        tags.update(MODEL_TAGS.get(type(obj), ()))
+    if tags:
+        invalidate_on_commit(session, *tags)
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    tags = session.info.pop('cache_tags', None)
+    if tags:
+        try:
+            invalidate(*sorted(tags))
+        except Exception:
+            logger.exception('Could not invalidate cache tags %s', sorted(tags))
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_tags(session):
+    session.info.pop('cache_tags', None)
+
+
+def init_cache(app):
+    app.config.setdefault('CACHE_URL', 'memory://')
+    app.config.setdefault('CACHE_DEFAULT_TTL', 300)
+    app.config.setdefault('CACHE_LOCAL_MAX_ENTRIES', 2000)
+    app.config.setdefault('CACHE_LOCK_TIMEOUT', 5.0)
+    app.extensions['cache'] = create_cache(app.config['CACHE_URL'],
+                                           local_max_entries=app.config['CACHE_LOCAL_MAX_ENTRIES'],
+                                           default_ttl=app.config['CACHE_DEFAULT_TTL'],
+                                           lock_timeout=app.config['CACHE_LOCK_TIMEOUT'],
+                                           versions=get_versions(app))
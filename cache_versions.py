@@ -0,0 +1,71 @@
+"""Cache version counters kept in the database.
+
+The fragment cache and the data cache in cache.py put a version in every
+key and invalidate by bumping it. With a Redis backend the counters live
+in Redis. With the default in-process backends each gunicorn worker
+would otherwise keep its own count, so a change bumped in one worker
+would go unseen by the others until their copies expired. These counters
+live in the cache_version table instead: a bump is one upsert after the
+commit that caused it.
+
+Readers do not query the table per request. Each process keeps a
+snapshot of every counter and reloads it (one small SELECT) at most every
+CACHE_VERSION_REFRESH_INTERVAL seconds, so other workers see a bump
+within that interval; the worker that made the bump reloads at once.
+"""
+import time
+import threading
+
+import sqlalchemy as sa
+
+from app import db
+from db_utils import add_to_rollup
+from models import CacheVersion
+
+REFRESH_INTERVAL = 5
+
+
+class DatabaseVersions:
+
+    def __init__(self, refresh_interval=REFRESH_INTERVAL):
+        self.refresh_interval = refresh_interval
+        self._versions = {}
+        self._loaded_at = None
+        self._lock = threading.Lock()
+
+    def _stale(self):
+        return (self._loaded_at is None
+                or time.monotonic() - self._loaded_at >= self.refresh_interval)
+
+    def _refresh(self):
+        with self._lock:
+            if not self._stale():
+                return
+            # The primary, not the session: it may be routed to a replica
+            with db.engine.connect() as connection:
+                self._versions = dict(connection.execute(
+                    sa.select(CacheVersion.name, CacheVersion.version)).all())
+            self._loaded_at = time.monotonic()
+
+    def get_many(self, names):
+        if self._stale():
+            self._refresh()
+        versions = self._versions
+        return [versions.get(name, 0) for name in names]
+
+    def get(self, name):
+        return self.get_many([name])[0]
+
+    def incr(self, name):
+        # Called after commit, when the session can no longer run SQL
+        with db.engine.begin() as connection:
+            add_to_rollup(connection, CacheVersion, {'name': name}, {'version': 1})
+        self._loaded_at = None
+
+
+def get_versions(app):
+    """The process's DatabaseVersions, shared by the caches of `app`"""
+    if 'cache_versions' not in app.extensions:
+        app.extensions['cache_versions'] = DatabaseVersions(
+            app.config.get('CACHE_VERSION_REFRESH_INTERVAL', REFRESH_INTERVAL))
+    return app.extensions['cache_versions']
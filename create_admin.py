@@ -1,6 +1,6 @@
 from app import app, db
 from models import User
-from werkzeug.security import generate_password_hash
+from passwords import hash_password
 import sys
 
 def create_admin_user():
@@ -12,7 +12,7 @@ def create_admin_user():
         if existing_admin:
             print(f"Admin user already exists: {admin_email}")
             # Update password and ensure admin status
-            existing_admin.password_hash = generate_password_hash("admin123")
+            existing_admin.password_hash = hash_password("admin123")
             existing_admin.is_admin = True
             db.session.commit()
             print("Admin password updated to 'admin123' and admin status confirmed.")
@@ -22,7 +22,7 @@ def create_admin_user():
                 email=admin_email,
                 full_name="System Administrator",
                 phone="08119563832",
-                password_hash=generate_password_hash("admin123"),
+                password_hash=hash_password("admin123"),
                 is_admin=True
             )
             
@@ -0,0 +1,139 @@
+import os
+import time
+import threading
+from contextlib import contextmanager
+from functools import wraps
+
+import sqlalchemy as sa
+from flask import g, has_app_context
+from flask_sqlalchemy.session import Session
+from sqlalchemy.pool import QueuePool
+
+REPLICA_BIND = "replica"
+
+
+def _env_flag(name, default):
+    value = os.environ.get(name)
+    if value is None:
+        return default
+    return value.lower() in ("1", "true", "yes", "on")
+
+
+def engine_options_from_env(database_uri):
+    """Build SQLALCHEMY_ENGINE_OPTIONS from DB_POOL_* environment variables"""
+    options = {
+        "pool_recycle": int(os.environ.get("DB_POOL_RECYCLE", 300)),
+        "pool_pre_ping": _env_flag("DB_POOL_PRE_PING", True),
+    }
+
+    # SQLite uses its own pool classes that don't take QueuePool arguments
+    if database_uri.startswith("sqlite"):
+        return options
+
+    options["poolclass"] = InstrumentedQueuePool
+    if os.environ.get("DB_POOL_SIZE"):
+        options["pool_size"] = int(os.environ["DB_POOL_SIZE"])
+    if os.environ.get("DB_MAX_OVERFLOW"):
+        options["max_overflow"] = int(os.environ["DB_MAX_OVERFLOW"])
+    if os.environ.get("DB_POOL_TIMEOUT"):
+        options["pool_timeout"] = float(os.environ["DB_POOL_TIMEOUT"])
+    return options
+
+
+class InstrumentedQueuePool(QueuePool):
+    """QueuePool that records how long callers wait for a connection"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._stats_lock = threading.Lock()
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        except sa.exc.TimeoutError:
+            with self._stats_lock:
+                self.timeouts += 1
+            raise
+        finally:
+            waited = time.perf_counter() - started
+            with self._stats_lock:
+                self.checkouts += 1
+                self.wait_total += waited
+                self.wait_max = max(self.wait_max, waited)
+
+
+def pool_metrics(engine):
+    """Return a snapshot of connection pool usage for an engine"""
+    pool = engine.pool
+    metrics = {"pool_class": type(pool).__name__}
+
+    if isinstance(pool, QueuePool):
+        metrics.update({
+            "size": pool.size(),
+            "checked_in": pool.checkedin(),
+            "checked_out": pool.checkedout(),
+            "overflow": max(pool.overflow(), 0),
+            "max_overflow": pool._max_overflow,
+        })
+
+    if isinstance(pool, InstrumentedQueuePool):
+        with pool._stats_lock:
+            checkouts = pool.checkouts
+            metrics.update({
+                "checkouts": checkouts,
+                "timeouts": pool.timeouts,
+                "wait_avg_ms": round(pool.wait_total / checkouts * 1000, 3) if checkouts else 0.0,
+                "wait_max_ms": round(pool.wait_max * 1000, 3),
+            })
+
+    return metrics
+
+
+class RoutingSession(Session):
+    """Session that sends reads to the replica bind inside a read-only scope.
+
+    Writes (flushes and INSERT/UPDATE/DELETE statements) always go to the
+    primary, and without a configured replica every query stays on the
+    primary as before.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self._reading_from_replica(clause):
+            replica = self._db.engines.get(REPLICA_BIND)
+            if replica is not None:
+                return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+    def _reading_from_replica(self, clause):
+        if self._flushing or not has_app_context():
+            return False
+        if not g.get("_db_read_replica"):
+            return False
+        return clause is None or isinstance(clause, sa.Select)
+
+
+@contextmanager
+def read_replica():
+    """Route SELECTs issued inside the block to the read replica"""
+    previous = g.get("_db_read_replica", False)
+    g._db_read_replica = True
+    try:
+        yield
+    finally:
+        g._db_read_replica = previous
+
+
+def use_read_replica(f):
+    """View decorator for read-only pages that may serve slightly stale data"""
+
+    @wraps(f)
+    def decorated_function(*args, **kwargs):
+        with read_replica():
+            return f(*args, **kwargs)
+
+    return decorated_function
@@ -0,0 +1,24 @@
+"""Small SQL helpers shared by the modules that keep counters in tables
+(sales rollups, order status counts, inbox counts, cache versions)."""
+
+
+def upsert(connection, model):
+    """INSERT for `model` that supports ON CONFLICT (PostgreSQL and SQLite)"""
+    dialect = connection.dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        raise NotImplementedError(f'Counter tables need INSERT .. ON CONFLICT, not available on {dialect}')
+    return insert(model.__table__)
+
+
+def add_to_rollup(connection, model, keys, deltas):
+    """Upsert a counter row, adding `deltas` to its counters"""
+    table = model.__table__
+    stmt = upsert(connection, model).values(**keys, **deltas)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: table.c[name] + stmt.excluded[name] for name in deltas})
+    connection.execute(stmt)
@@ -1,7 +1,7 @@
 from flask_wtf import FlaskForm
 from flask_wtf.file import FileField, FileAllowed
-from wtforms import StringField, TextAreaField, FloatField, IntegerField, BooleanField, SelectField, PasswordField, SubmitField, HiddenField
-from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, EqualTo
+from wtforms import StringField, TextAreaField, FloatField, IntegerField, BooleanField, SelectField, PasswordField, SubmitField, HiddenField, DateTimeLocalField
+from wtforms.validators import DataRequired, Email, Length, NumberRange, Optional, EqualTo, ValidationError
 from wtforms.widgets import TextArea
 
 
@@ -29,6 +29,14 @@ class ProfileForm(FlaskForm):
     address = TextAreaField('Address', validators=[Length(max=200)])
 
 
+PRODUCT_CATEGORIES = [
+    ('paints', 'Paints'),
+    ('brushes', 'Brushes'),
+    ('accessories', 'Accessories'),
+    ('tools', 'Tools')
+]
+
+
 class ProductForm(FlaskForm):
     name = StringField('Product Name', validators=[DataRequired(), Length(max=100)])
     description = TextAreaField('Description', widget=TextArea())
@@ -36,19 +44,15 @@ class ProductForm(FlaskForm):
     original_price = FloatField('Original Price (NGN)', validators=[NumberRange(min=0)])
     image_url = StringField('Image URL', validators=[Length(max=200)])
     image_file = FileField('Upload Image', validators=[FileAllowed(['jpg', 'png', 'jpeg', 'gif', 'webp'], 'Images only!')])
-    category = SelectField('Category', choices=[
-        ('paints', 'Paints'),
-        ('brushes', 'Brushes'),
-        ('accessories', 'Accessories'),
-        ('tools', 'Tools')
-    ])
+    category = SelectField('Category', choices=PRODUCT_CATEGORIES)
     stock_quantity = IntegerField('Stock Quantity', validators=[DataRequired(), NumberRange(min=0)])
+    reorder_threshold = IntegerField('Reorder Threshold', default=5, validators=[Optional(), NumberRange(min=0)])
     is_active = BooleanField('Active')
 
 
 class ContactForm(FlaskForm):
     name = StringField('Name', validators=[DataRequired(), Length(max=100)])
-    email = StringField('Email', validators=[DataRequired(), Email()])
+    email = StringField('Email', validators=[DataRequired(), Email(), Length(max=120)])
     message = TextAreaField('Message', validators=[DataRequired(), Length(max=1000)])
 
 
@@ -56,6 +60,8 @@ class CheckoutForm(FlaskForm):
     shipping_address = TextAreaField('Shipping Address', validators=[DataRequired(), Length(min=10, max=500)])
     phone = StringField('Phone Number', validators=[DataRequired(), Length(min=10, max=20)])
     payment_method = SelectField('Payment Method', validators=[DataRequired()])
+    # Lets a double-submitted form resolve to the same order (see idempotency.py)
+    idempotency_key = HiddenField()
     submit = SubmitField('Place Order')
 
 
@@ -91,4 +97,42 @@ class PaymentMethodForm(FlaskForm):
     configuration = TextAreaField('Configuration (JSON)')
     instructions = TextAreaField('Payment Instructions')
     is_active = BooleanField('Active', default=True)
-    submit = SubmitField('Save Payment Method')
\ No newline at end of file
+    submit = SubmitField('Save Payment Method')
+
+    def validate_configuration(self, field):
+        # Inactive methods may be saved half-configured
+        if not self.is_active.data:
+            return
+        from payment_methods import parse_configuration, InvalidPaymentConfig
+        try:
+            parse_configuration(self.method_type.data, field.data)
+        except InvalidPaymentConfig as exc:
+            raise ValidationError(str(exc))
+
+
+class PromotionForm(FlaskForm):
+    name = StringField('Name', validators=[DataRequired(), Length(max=100)])
+    scope = SelectField('Applies To', choices=[('category', 'A whole category'),
+                                               ('product', 'One product')])
+    category = SelectField('Category', choices=PRODUCT_CATEGORIES)
+    # Choices are filled in by the view
+    product_id = SelectField('Product', coerce=int, validate_choice=False)
+    kind = SelectField('Discount', choices=[('percent', 'Percentage off'),
+                                            ('fixed', 'Fixed amount off (NGN)')])
+    amount = FloatField('Amount', validators=[DataRequired(), NumberRange(min=0)])
+    starts_at = DateTimeLocalField('Starts (UTC)', format='%Y-%m-%dT%H:%M', validators=[DataRequired()])
+    ends_at = DateTimeLocalField('Ends (UTC)', format='%Y-%m-%dT%H:%M', validators=[Optional()])
+    is_active = BooleanField('Active', default=True)
+    submit = SubmitField('Save Promotion')
+
+    def validate_product_id(self, field):
+        if self.scope.data == 'product' and not field.data:
+            raise ValidationError('Choose the product this promotion applies to.')
+
+    def validate_amount(self, field):
+        if self.kind.data == 'percent' and field.data is not None and field.data > 100:
+            raise ValidationError('A percentage discount cannot be more than 100.')
+
+    def validate_ends_at(self, field):
+        if field.data and self.starts_at.data and field.data <= self.starts_at.data:
+            raise ValidationError('The promotion must end after it starts.')
@@ -0,0 +1,241 @@
+"""{% cache %} tag for caching rendered template fragments.
+
+    {% cache 'footer', 3600 %} ... {% endcache %}
+    {% cache 'home-featured', 60, ('products',) %} ... {% endcache %}
+
+The rendered body is stored under the given name plus the current
+customization version and the viewer's role (anon, user or admin), so
+anonymous and signed-in visitors get their own copies and any change to
+the site customization tables invalidates every fragment at once. The TTL
+is optional (FRAGMENT_CACHE_DEFAULT_TTL otherwise). Fragments built from
+data also name the cache.py tags they depend on; the tags' versions join
+the key, so e.g. a product or price change replaces 'home-featured'.
+Load such data inside the block so a hit does not query it. Only cache markup that
+is the same for everyone with that role: per-user parts such as the cart
+badge stay outside the tag.
+
+Fragments live in process memory by default, with the version in the
+cache_version table (cache_versions.py) so an edit made through one
+worker reaches every worker within CACHE_VERSION_REFRESH_INTERVAL. FRAGMENT_CACHE_URL=redis://...
+shares fragments and the version between workers, null:// disables
+caching. Per-fragment hit/miss counts are at /admin/fragment-cache.
+"""
+import time
+import logging
+import threading
+from collections import OrderedDict
+
+from flask import current_app, g, has_app_context, has_request_context
+from flask_login import current_user
+from jinja2 import nodes
+from jinja2.ext import Extension
+from markupsafe import Markup
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+from cache import get_cache
+from cache_versions import DatabaseVersions, get_versions
+from models import Customization, SiteCustomization
+
+logger = logging.getLogger(__name__)
+
+VERSION_KEY = 'fragment:version'
+
+
+class NullBackend:
+
+    def get(self, key):
+        return None
+
+    def set(self, key, value, ttl):
+        pass
+
+    def incr(self, key):
+        pass
+
+
+class MemoryBackend:
+    """LRU dict with per-entry expiry; one copy per process"""
+
+    def __init__(self, max_entries=1000):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires = entry
+            if expires is not None and expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        expires = time.monotonic() + ttl if ttl else None
+        with self._lock:
+            self._entries[key] = (value, expires)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+
+class RedisBackend:
+
+    def __init__(self, url, prefix='fragment:'):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2,
+                                            socket_connect_timeout=0.2)
+        self._prefix = prefix
+
+    def get(self, key):
+        value = self._client.get(self._prefix + key)
+        return value.decode() if value is not None else None
+
+    def set(self, key, value, ttl):
+        self._client.set(self._prefix + key, value, ex=ttl or None)
+
+    def incr(self, key):
+        self._client.incr(self._prefix + key)
+
+
+def create_backend(url):
+    if not url or url.startswith('memory://'):
+        return MemoryBackend()
+    if url.startswith('null://'):
+        return NullBackend()
+    return RedisBackend(url)
+
+
+def viewer_role():
+    if not has_request_context() or not current_user.is_authenticated:
+        return 'anon'
+    return 'admin' if current_user.is_admin else 'user'
+
+
+class FragmentCache:
+
+    def __init__(self, backend, default_ttl=300, versions=None):
+        self.backend = backend
+        if not isinstance(backend, MemoryBackend):
+            versions = backend
+        # An in-process backend cannot share the version between workers
+        self.versions = versions if versions is not None else DatabaseVersions()
+        self.default_ttl = default_ttl
+        self._stats = {}
+        self._stats_lock = threading.Lock()
+
+    def version(self):
+        # Read once per request; every fragment on a page uses the same one
+        if has_request_context() and '_fragment_version' in g:
+            return g._fragment_version
+        version = self.versions.get(VERSION_KEY) or 0
+        if has_request_context():
+            g._fragment_version = version
+        return version
+
+    def bump_version(self):
+        self.versions.incr(VERSION_KEY)
+
+    def _count(self, name, hit):
+        with self._stats_lock:
+            counts = self._stats.setdefault(name, [0, 0])
+            counts[0 if hit else 1] += 1
+
+    def fetch(self, name, ttl, render, tags=()):
+        try:
+            key = f'{name}:v{self.version()}:{viewer_role()}'
+            if tags:
+                data_cache = get_cache()
+                versions = data_cache.tag_versions(tags) if data_cache is not None else None
+                if versions is None:
+                    return render()
+                key += ''.join(f':{tag}.{version}' for tag, version in zip(tags, versions))
+            cached = self.backend.get(key)
+        except Exception:
+            # A broken shared cache must not take pages down with it
+            logger.exception('Fragment cache unavailable; rendering %s', name)
+            return render()
+
+        if cached is not None:
+            self._count(name, True)
+            return Markup(cached)
+
+        self._count(name, False)
+        value = render()
+        try:
+            self.backend.set(key, str(value), ttl or self.default_ttl)
+        except Exception:
+            logger.exception('Could not store fragment %s', name)
+        return value
+
+    def stats(self):
+        with self._stats_lock:
+            fragments = {name: {'hits': hits, 'misses': misses,
+                                'hit_rate': round(hits / (hits + misses), 3)}
+                         for name, (hits, misses) in self._stats.items()}
+        hits = sum(f['hits'] for f in fragments.values())
+        total = hits + sum(f['misses'] for f in fragments.values())
+        return {'backend': type(self.backend).__name__,
+                'hits': hits,
+                'misses': total - hits,
+                'hit_rate': round(hits / total, 3) if total else None,
+                'fragments': fragments}
+
+
+class FragmentCacheExtension(Extension):
+    tags = {'cache'}
+
+    def parse(self, parser):
+        lineno = next(parser.stream).lineno
+        args = [parser.parse_expression()]
+        for default in (None, ()):  # ttl, tags
+            if parser.stream.skip_if('comma'):
+                args.append(parser.parse_expression())
+            else:
+                args.append(nodes.Const(default))
+        body = parser.parse_statements(('name:endcache', ), drop_needle=True)
+        return nodes.CallBlock(self.call_method('_render', args), [], [],
+                               body).set_lineno(lineno)
+
+    def _render(self, name, ttl, tags, caller):
+        cache = current_app.extensions.get('fragment_cache')
+        if cache is None or not current_app.config['FRAGMENT_CACHE_ENABLED']:
+            return caller()
+        return cache.fetch(name, ttl, caller, tuple(tags))
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_customization_changes(session, flush_context):
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, (Customization, SiteCustomization)) for obj in changed):
+        session.info['customization_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _bump_version_on_commit(session):
+    if session.info.pop('customization_changed', False) and has_app_context():
+        cache = current_app.extensions.get('fragment_cache')
+        if cache is not None:
+            try:
+                cache.bump_version()
+            except Exception:
+                logger.exception('Could not bump the fragment cache version')
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_customization_changes(session):
+    session.info.pop('customization_changed', None)
+
+
+def init_fragment_cache(app):
+    app.config.setdefault('FRAGMENT_CACHE_ENABLED', True)
+    app.config.setdefault('FRAGMENT_CACHE_DEFAULT_TTL', 300)
+    app.extensions['fragment_cache'] = FragmentCache(
+        create_backend(app.config.get('FRAGMENT_CACHE_URL')),
+        default_ttl=app.config['FRAGMENT_CACHE_DEFAULT_TTL'],
+        versions=get_versions(app))
+    app.jinja_env.add_extension(FragmentCacheExtension)
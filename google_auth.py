@@ -5,14 +5,15 @@ import os
 
 import requests
 from app import db
-from flask import Blueprint, redirect, request, url_for, flash
+from flask import Blueprint, current_app, redirect, request, url_for, flash
 from flask_login import login_user, logout_user, current_user
 from models import User
 from oauthlib.oauth2 import WebApplicationClient
 
 GOOGLE_CLIENT_ID = os.environ.get("GOOGLE_OAUTH_CLIENT_ID", "your-google-client-id")
 GOOGLE_CLIENT_SECRET = os.environ.get("GOOGLE_OAUTH_CLIENT_SECRET", "your-google-client-secret")
-GOOGLE_DISCOVERY_URL = "https://accounts.google.com/.well-known/openid-configuration"
+GOOGLE_DISCOVERY_URL = os.environ.get(
+    "GOOGLE_DISCOVERY_URL", "https://accounts.google.com/.well-known/openid-configuration")
 
 # Make sure to use this redirect URL. It has to match the one in the whitelist
 DEV_REDIRECT_URL = f'https://{os.environ.get("REPLIT_DEV_DOMAIN", "localhost:5000")}/google_login/callback'
@@ -27,18 +28,29 @@ For detailed instructions, see:
 https://docs.replit.com/additional-resources/google-auth-in-flask#set-up-your-oauth-app--client
 """)
 
-client = WebApplicationClient(GOOGLE_CLIENT_ID)
-
 google_auth_bp = Blueprint("google_auth", __name__)
 
 
+def get_oauth_client():
+    # WebApplicationClient keeps the token it parsed on the instance, so a
+    # module-level client would leak tokens between concurrent requests
+    # under threaded or gevent workers. Build one per request instead.
+    return WebApplicationClient(GOOGLE_CLIENT_ID)
+
+
+def get_google_provider_cfg():
+    return requests.get(GOOGLE_DISCOVERY_URL,
+                        timeout=current_app.config["HTTP_TIMEOUT"]).json()
+
+
 @google_auth_bp.route("/google_login")
 def login():
     if current_user.is_authenticated:
         return redirect(url_for('main.index'))
         
     try:
-        google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
+        client = get_oauth_client()
+        google_provider_cfg = get_google_provider_cfg()
         authorization_endpoint = google_provider_cfg["authorization_endpoint"]
 
         request_uri = client.prepare_request_uri(
@@ -58,7 +70,8 @@ def login():
 def callback():
     try:
         code = request.args.get("code")
-        google_provider_cfg = requests.get(GOOGLE_DISCOVERY_URL).json()
+        client = get_oauth_client()
+        google_provider_cfg = get_google_provider_cfg()
         token_endpoint = google_provider_cfg["token_endpoint"]
 
         token_url, headers, body = client.prepare_token_request(
@@ -74,13 +87,15 @@ def callback():
             headers=headers,
             data=body,
             auth=(GOOGLE_CLIENT_ID, GOOGLE_CLIENT_SECRET),
+            timeout=current_app.config["HTTP_TIMEOUT"],
         )
 
         client.parse_request_body_response(json.dumps(token_response.json()))
 
         userinfo_endpoint = google_provider_cfg["userinfo_endpoint"]
         uri, headers, body = client.add_token(userinfo_endpoint)
-        userinfo_response = requests.get(uri, headers=headers, data=body)
+        userinfo_response = requests.get(uri, headers=headers, data=body,
+                                         timeout=current_app.config["HTTP_TIMEOUT"])
 
         userinfo = userinfo_response.json()
         if userinfo.get("email_verified"):
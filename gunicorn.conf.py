@@ -0,0 +1,70 @@
+import os
+import multiprocessing
+
+# Gunicorn configuration for Doctless Paint.
+#
+# GUNICORN_WORKER_CLASS selects how each worker handles concurrency:
+#   sync    - one request per process (gunicorn default)
+#   gthread - a thread pool per process
+#   gevent  - greenlets; outbound Paystack/Google calls yield instead of
+#             blocking the whole worker (needs `gevent`, and `psycogreen`
+#             when running on PostgreSQL)
+#   asgi    - uvicorn workers serving the WSGI app through asgi.py
+#             (run as `gunicorn asgi:application`)
+
+WORKER_CLASSES = {
+    "sync": "sync",
+    "gthread": "gthread",
+    "gevent": "gevent",
+    "asgi": "uvicorn.workers.UvicornWorker",
+}
+
+worker_mode = os.environ.get("GUNICORN_WORKER_CLASS", "sync").lower()
+if worker_mode not in WORKER_CLASSES:
+    raise RuntimeError(
+        f"Unknown GUNICORN_WORKER_CLASS {worker_mode!r}; "
+        f"expected one of {', '.join(WORKER_CLASSES)}")
+
+bind = os.environ.get("GUNICORN_BIND", f"0.0.0.0:{os.environ.get('PORT', '5000')}")
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count() * 2 + 1))
+worker_class = WORKER_CLASSES[worker_mode]
+threads = int(os.environ.get("GUNICORN_THREADS", 8 if worker_mode == "gthread" else 1))
+worker_connections = int(os.environ.get("GUNICORN_WORKER_CONNECTIONS", 1000))
+timeout = int(os.environ.get("GUNICORN_TIMEOUT", 30))
+graceful_timeout = int(os.environ.get("GUNICORN_GRACEFUL_TIMEOUT", 30))
+keepalive = int(os.environ.get("GUNICORN_KEEPALIVE", 5))
+accesslog = os.environ.get("GUNICORN_ACCESS_LOG", "-") or None
+
+# Every worker owns its own SQLAlchemy engine, so the pool configured in
+# app.py is per worker. Size it to the concurrency a worker can actually
+# reach, capped so that `workers * (pool + overflow)` stays within the
+# database's connection limit. Explicit DB_POOL_SIZE / DB_MAX_OVERFLOW
+# settings always win.
+if worker_mode == "gevent":
+    per_worker_concurrency = worker_connections
+elif worker_mode == "gthread":
+    per_worker_concurrency = threads
+elif worker_mode == "asgi":
+    # asgiref runs WSGI calls on its default thread pool
+    per_worker_concurrency = min(32, (os.cpu_count() or 1) + 4)
+else:
+    per_worker_concurrency = 1
+
+max_db_connections = int(os.environ.get("DB_MAX_CONNECTIONS", 90))
+pool_budget = max(2, max_db_connections // max(workers, 1))
+pool_size = max(1, min(per_worker_concurrency, pool_budget // 2))
+os.environ.setdefault("DB_POOL_SIZE", str(pool_size))
+os.environ.setdefault("DB_MAX_OVERFLOW", str(max(0, min(per_worker_concurrency, pool_budget) - pool_size)))
+
+
+def post_fork(server, worker):
+    # psycopg2 blocks the event loop unless it is told to wait cooperatively
+    if worker_mode != "gevent":
+        return
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        server.log.warning(
+            "psycogreen is not installed; PostgreSQL queries will block gevent workers")
+        return
+    patch_psycopg()
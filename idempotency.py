@@ -0,0 +1,101 @@
+"""Idempotency keys for order placement.
+
+The checkout form carries a random key in a hidden field (API clients
+send an Idempotency-Key header instead). The key row is inserted in the
+same transaction as the order it produced, so of two submissions racing
+with the same key only one can commit: the other hits the primary key
+and is redirected to the first one's order. Replays seen by the same
+worker are answered from a small in-process cache without a query.
+
+Keys expire after IDEMPOTENCY_KEY_TTL seconds; expired rows are removed
+by `python idempotency.py sweep`.
+"""
+import re
+import secrets
+from datetime import datetime, timedelta
+
+from flask import current_app, request
+
+from app import db
+from cache import MISSING, LocalTier
+from models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+KEY_PATTERN = re.compile(r'^[A-Za-z0-9_-]{8,64}$')
+
+
+def new_key():
+    return secrets.token_urlsafe(24)
+
+
+def request_key(form_value=None):
+    """The submission's key from the header or the form, None if absent or malformed"""
+    key = request.headers.get(HEADER) or form_value
+    if key and KEY_PATTERN.match(key):
+        return key
+    return None
+
+
+def _cache():
+    return current_app.extensions['idempotency_cache']
+
+
+def _cache_key(user_id, key):
+    return f'{user_id}:{key}'
+
+
+def find_order_id(user_id, key):
+    """Order id already produced by this key, or None"""
+    order_id = _cache().get(_cache_key(user_id, key))
+    if order_id is not MISSING:
+        return order_id
+    order_id = db.session.scalar(db.select(IdempotencyKey.order_id)
+                                 .where(IdempotencyKey.user_id == user_id,
+                                        IdempotencyKey.key == key))
+    if order_id is not None:
+        remember(user_id, key, order_id)
+    return order_id
+
+
+def remember(user_id, key, order_id):
+    _cache().set(_cache_key(user_id, key), order_id, current_app.config['IDEMPOTENCY_KEY_TTL'])
+
+
+def claim(user_id, key, order_id):
+    """Add the key row to the session; flush it right away so a concurrent
+    duplicate fails here, before any more work is done"""
+    now = datetime.utcnow()
+    db.session.add(IdempotencyKey(
+        user_id=user_id, key=key, order_id=order_id, created_at=now,
+        expires_at=now + timedelta(seconds=current_app.config['IDEMPOTENCY_KEY_TTL'])))
+    db.session.flush()
+
+
+def winner_after_conflict(user_id, key):
+    """After a duplicate-key error: roll back and return the order id of
+    the submission that won"""
+    db.session.rollback()
+    return find_order_id(user_id, key)
+
+
+def sweep_expired():
+    deleted = (IdempotencyKey.query
+               .filter(IdempotencyKey.expires_at < datetime.utcnow())
+               .delete(synchronize_session=False))
+    db.session.commit()
+    return deleted
+
+
+def init_idempotency(app):
+    app.config.setdefault('IDEMPOTENCY_KEY_TTL', 86400)
+    app.extensions['idempotency_cache'] = LocalTier(max_entries=10000)
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if sys.argv[1:] != ['sweep']:
+        sys.exit('usage: python idempotency.py sweep')
+    with app.app_context():
+        print(f'Removed {sweep_expired()} expired idempotency keys')
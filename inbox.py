@@ -0,0 +1,324 @@
+"""Contact message inbox: batched ingest, dedupe, bulk triage and counts.
+
+The contact form does not write to the database itself. Submissions go
+into a per-process buffer that a background thread writes every
+CONTACT_FLUSH_INTERVAL seconds (or as soon as CONTACT_BATCH_SIZE have
+piled up) in one transaction, together with their admin notifications.
+Set CONTACT_FLUSH_INTERVAL to 0 to write each submission in the request
+instead. Buffered submissions are written on normal process exit; a
+crash loses at most one interval's worth. When a batch fails it is
+retried one message at a time, and messages that still fail are logged
+and dropped. Once CONTACT_MAX_PENDING are waiting, new submissions are
+written in the request instead.
+
+Each message carries a hash of its normalized text. Within
+CONTACT_DEDUPE_WINDOW seconds:
+
+    same text from the same email             dropped as a duplicate
+    same text from CONTACT_SPAM_SENDERS or    filed in the spam folder,
+    more emails, or more than                 without a notification
+    CONTACT_MAX_LINKS links
+
+Messages live in one of three folders (inbox, archived, spam). Bulk
+actions update or delete a whole id list in one statement, and the
+per-folder and unread counts in `contact_message_count` are adjusted in
+the same transaction, so the dashboard and folder tabs never COUNT(*)
+the table. Lists are keyset-paginated by (created_at, id).
+
+To rebuild the counts from the message table:
+    python inbox.py recount
+"""
+import re
+import sys
+import atexit
+import hashlib
+import logging
+import threading
+from collections import deque
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import current_app, url_for
+
+from app import db
+from db_utils import add_to_rollup
+from models import ContactMessage, ContactMessageCount
+from news_feed import decode_cursor, encode_cursor
+from notifications import notify_admins
+
+logger = logging.getLogger(__name__)
+
+FOLDERS = ('inbox', 'archived', 'spam')
+UNREAD = 'unread'  # unread messages in the inbox folder
+ACTIONS = ('read', 'unread', 'archive', 'inbox', 'spam', 'delete')
+ACTION_FOLDERS = {'archive': 'archived', 'inbox': 'inbox', 'spam': 'spam'}
+LINK_PATTERN = re.compile(r'https?://|www\.', re.IGNORECASE)
+PAGE_SIZE = 20
+
+
+def content_hash(text):
+    normalized = ' '.join(text.lower().split())
+    return hashlib.sha256(normalized.encode()).hexdigest()
+
+
+# --- Counts ---
+
+def _count_key(folder, is_read):
+    keys = [folder]
+    if folder == 'inbox' and not is_read:
+        keys.append(UNREAD)
+    return keys
+
+
+def adjust_counts(connection, deltas):
+    for name, delta in deltas.items():
+        if delta:
+            add_to_rollup(connection, ContactMessageCount, {'name': name}, {'count': delta})
+
+
+def message_counts():
+    """{folder or 'unread': number of messages}"""
+    counts = dict.fromkeys(FOLDERS + (UNREAD, ), 0)
+    counts.update(db.session.execute(sa.select(ContactMessageCount.name,
+                                               ContactMessageCount.count)).all())
+    return counts
+
+
+def unread_count():
+    return db.session.scalar(sa.select(ContactMessageCount.count)
+                             .where(ContactMessageCount.name == UNREAD)) or 0
+
+
+def recount():
+    connection = db.session.connection()
+    table = ContactMessage.__table__
+    counts = dict.fromkeys(FOLDERS + (UNREAD, ), 0)
+    for folder, is_read, count in connection.execute(
+            sa.select(table.c.folder, table.c.is_read, sa.func.count())
+            .group_by(table.c.folder, table.c.is_read)):
+        for name in _count_key(folder, is_read):
+            counts[name] += count
+    connection.execute(sa.delete(ContactMessageCount.__table__))
+    connection.execute(sa.insert(ContactMessageCount.__table__),
+                       [{'name': name, 'count': count} for name, count in counts.items()])
+    db.session.commit()
+    return counts
+
+
+# --- Ingest ---
+
+def ingest(submissions):
+    """Write a batch of submissions in one transaction; returns
+    (stored, duplicates, spam)"""
+    config = current_app.config
+    since = datetime.utcnow() - timedelta(seconds=config['CONTACT_DEDUPE_WINDOW'])
+    for submission in submissions:
+        submission['content_hash'] = content_hash(submission['message'])
+        submission['email'] = submission['email'].strip()
+
+    # Senders already seen per text in the window, then this batch on top
+    hashes = {submission['content_hash'] for submission in submissions}
+    senders = {}
+    for digest, email in db.session.execute(
+            sa.select(ContactMessage.content_hash, sa.func.lower(ContactMessage.email))
+            .where(ContactMessage.content_hash.in_(hashes), ContactMessage.created_at >= since)
+            .distinct()):
+        senders.setdefault(digest, set()).add(email)
+
+    rows, duplicates, spam, deltas = [], 0, 0, {}
+    for submission in submissions:
+        seen = senders.setdefault(submission['content_hash'], set())
+        email = submission['email'].lower()
+        if email in seen:
+            duplicates += 1
+            continue
+        seen.add(email)
+        is_spam = (len(seen) >= config['CONTACT_SPAM_SENDERS'] or
+                   len(LINK_PATTERN.findall(submission['message'])) > config['CONTACT_MAX_LINKS'])
+        folder = 'spam' if is_spam else 'inbox'
+        rows.append({'name': submission['name'], 'email': submission['email'],
+                     'message': submission['message'], 'created_at': submission['created_at'],
+                     'content_hash': submission['content_hash'], 'folder': folder,
+                     'is_read': False})
+        for name in _count_key(folder, False):
+            deltas[name] = deltas.get(name, 0) + 1
+        if is_spam:
+            spam += 1
+        else:
+            notify_admins('contact_message', message=submission,
+                          inbox_url=submission['inbox_url'])
+
+    if rows:
+        connection = db.session.connection()
+        connection.execute(sa.insert(ContactMessage.__table__), rows)
+        adjust_counts(connection, deltas)
+    db.session.commit()
+    return len(rows) - spam, duplicates, spam
+
+
+class MessageBuffer:
+    """Per-process buffer of contact submissions, written by a background
+    thread started on first use so each forked worker gets its own"""
+
+    def __init__(self, app, batch_size, interval, max_pending=10000):
+        self.app = app
+        self.batch_size = batch_size
+        self.interval = interval
+        self.max_pending = max_pending
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        atexit.register(self.flush)
+
+    def add(self, submission):
+        """Queue a submission; False if the buffer is full and the caller
+        must write it itself"""
+        with self._lock:
+            if len(self._pending) >= self.max_pending:
+                return False
+            self._pending.append(submission)
+            full = len(self._pending) >= self.batch_size
+        if full:
+            self._wake.set()
+        self._ensure_started()
+        return True
+
+    def _ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='contact-ingest',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            self._wake.wait(self.interval)
+            self._wake.clear()
+            self.flush()
+
+    def flush(self):
+        while True:
+            with self._lock:
+                batch = [self._pending.popleft()
+                         for _ in range(min(self.batch_size, len(self._pending)))]
+            if not batch:
+                return
+            try:
+                with self.app.app_context():
+                    stored, duplicates, spam = ingest(batch)
+                logger.info('Stored %d contact messages (%d duplicates, %d spam)',
+                            stored, duplicates, spam)
+            except Exception:
+                logger.exception('Writing %d contact messages failed; retrying one by one',
+                                 len(batch))
+                self._ingest_each(batch)
+
+    def _ingest_each(self, batch):
+        # One bad submission must not hold back the rest of the queue
+        for submission in batch:
+            try:
+                with self.app.app_context():
+                    ingest([submission])
+            except Exception:
+                logger.exception('Dropping contact message from %r that could not be stored',
+                                 submission['email'])
+
+
+def submit_message(name, email, message):
+    """Accept a contact form submission; it is buffered unless
+    CONTACT_FLUSH_INTERVAL is 0"""
+    submission = {'name': name, 'email': email, 'message': message,
+                  'created_at': datetime.utcnow(),
+                  'inbox_url': url_for('admin.messages', _external=True)}
+    buffer = current_app.extensions.get('contact_buffer')
+    if buffer is None or not buffer.add(submission):
+        # No buffer, or it is backed up: write it now rather than lose it
+        ingest([submission])
+
+
+# --- Triage ---
+
+def apply_action(action, ids):
+    """Apply a bulk action to the given message ids in one statement;
+    returns how many messages it changed"""
+    if action not in ACTIONS:
+        raise ValueError(f'Unknown action {action!r}')
+    table = ContactMessage.__table__
+    connection = db.session.connection()
+    # Locked so concurrent triage of the same messages keeps the counts right
+    rows = connection.execute(sa.select(table.c.id, table.c.folder, table.c.is_read)
+                              .where(table.c.id.in_(ids)).with_for_update()).all()
+    if action == 'delete':
+        changes = {}
+    elif action in ('read', 'unread'):
+        changes = {'is_read': action == 'read'}
+    else:
+        changes = {'folder': ACTION_FOLDERS[action]}
+        if action == 'archive':
+            changes['is_read'] = True
+
+    deltas, changed_ids = {}, []
+    for message_id, folder, is_read in rows:
+        before = _count_key(folder, is_read)
+        after = [] if action == 'delete' else _count_key(changes.get('folder', folder),
+                                                         changes.get('is_read', is_read))
+        if action == 'delete' or any(changes.get(key, value) != value for key, value in
+                                     (('folder', folder), ('is_read', is_read))):
+            changed_ids.append(message_id)
+        for name in before:
+            deltas[name] = deltas.get(name, 0) - 1
+        for name in after:
+            deltas[name] = deltas.get(name, 0) + 1
+
+    if changed_ids:
+        if action == 'delete':
+            connection.execute(sa.delete(table).where(table.c.id.in_(changed_ids)))
+        else:
+            connection.execute(sa.update(table).where(table.c.id.in_(changed_ids))
+                               .values(**changes))
+        adjust_counts(connection, deltas)
+    db.session.commit()
+    return len(changed_ids)
+
+
+def message_page(folder='inbox', unread_only=False, cursor=None, limit=PAGE_SIZE):
+    """(messages, next cursor) for a folder, newest first"""
+    query = ContactMessage.query.filter_by(folder=folder)
+    if unread_only:
+        query = query.filter_by(is_read=False)
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, message_id = position
+        query = query.filter(sa.or_(
+            ContactMessage.created_at < created_at,
+            sa.and_(ContactMessage.created_at == created_at, ContactMessage.id < message_id)))
+    messages = query.order_by(ContactMessage.created_at.desc(),
+                              ContactMessage.id.desc()).limit(limit + 1).all()
+    next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+    return messages[:limit], next_cursor
+
+
+def init_inbox(app):
+    app.config.setdefault('CONTACT_BATCH_SIZE', 100)
+    app.config.setdefault('CONTACT_FLUSH_INTERVAL', 2)
+    app.config.setdefault('CONTACT_DEDUPE_WINDOW', 86400)
+    app.config.setdefault('CONTACT_SPAM_SENDERS', 3)
+    app.config.setdefault('CONTACT_MAX_LINKS', 3)
+    app.config.setdefault('CONTACT_MAX_PENDING', 10000)
+    if app.config['CONTACT_FLUSH_INTERVAL'] > 0:
+        app.extensions['contact_buffer'] = MessageBuffer(
+            app, app.config['CONTACT_BATCH_SIZE'], app.config['CONTACT_FLUSH_INTERVAL'],
+            max_pending=app.config['CONTACT_MAX_PENDING'])
+
+
+if __name__ == '__main__':
+    from app import app
+
+    if sys.argv[1:] != ['recount']:
+        sys.exit('usage: python inbox.py recount')
+    with app.app_context():
+        for name, count in recount().items():
+            print(f'{name:<10}{count}')
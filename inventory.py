@@ -0,0 +1,134 @@
+"""Inventory monitoring.
+
+Each product has a reorder_threshold; low_stock_products() lists active
+products at or below it using the expression index on
+stock_quantity - reorder_threshold.
+
+run_inventory_check() is the periodic batch job. It computes every
+product's daily sales velocity over INVENTORY_VELOCITY_DAYS with one
+grouped query over order_item, streams the catalogue in chunks, and
+derives days of cover (stock / velocity). Products that are out of stock,
+at or below their threshold, or with fewer than INVENTORY_COVER_DAYS of
+cover get an InventoryAlert in the admin inbox; alerts whose condition
+has cleared are resolved. The whole pass issues a fixed number of
+queries regardless of catalogue size. Run it from cron:
+    python inventory.py
+"""
+from datetime import datetime, timedelta
+
+import sqlalchemy as sa
+from flask import current_app
+
+from app import db
+from models import Product, Order, OrderItem, InventoryAlert
+
+# Most severe first
+ALERT_KINDS = ('out_of_stock', 'low_stock', 'low_cover')
+CHUNK_SIZE = 5000
+
+
+def low_stock_products():
+    return (Product.query
+            .filter(Product.stock_headroom() <= 0, Product.is_active.is_(True))
+            .order_by(Product.stock_headroom(), Product.id))
+
+
+def sales_velocity(days):
+    """{product_id: units sold per day} over the last `days` days"""
+    since = datetime.utcnow() - timedelta(days=days)
+    rows = db.session.execute(
+        sa.select(OrderItem.product_id, sa.func.sum(OrderItem.quantity))
+        .join(Order, Order.id == OrderItem.order_id)
+        .where(Order.created_at >= since, Order.status != 'cancelled')
+        .group_by(OrderItem.product_id))
+    return {product_id: units / days for product_id, units in rows}
+
+
+def classify(stock, threshold, velocity, cover_days):
+    """Return (alert kind or None, days of cover)"""
+    days_of_cover = stock / velocity if velocity > 0 else None
+    if stock <= 0:
+        return 'out_of_stock', days_of_cover
+    if stock <= threshold:
+        return 'low_stock', days_of_cover
+    if days_of_cover is not None and days_of_cover < cover_days:
+        return 'low_cover', days_of_cover
+    return None, days_of_cover
+
+
+def _chunks(items, size=CHUNK_SIZE):
+    for i in range(0, len(items), size):
+        yield items[i:i + size]
+
+
+def run_inventory_check(velocity_days=None, cover_days=None):
+    config = current_app.config
+    velocity_days = velocity_days or config['INVENTORY_VELOCITY_DAYS']
+    cover_days = cover_days or config['INVENTORY_COVER_DAYS']
+    now = datetime.utcnow()
+
+    velocity = sales_velocity(velocity_days)
+    open_alerts = {product_id: (alert_id, kind) for alert_id, product_id, kind in db.session.execute(
+        sa.select(InventoryAlert.id, InventoryAlert.product_id, InventoryAlert.kind)
+        .where(InventoryAlert.resolved_at.is_(None)))}
+
+    new_alerts, updates, seen = [], [], set()
+    products = db.session.execute(
+        sa.select(Product.id, Product.stock_quantity, Product.reorder_threshold)
+        .where(Product.is_active.is_(True))
+        .execution_options(yield_per=CHUNK_SIZE))
+    for product_id, stock, threshold in products:
+        rate = velocity.get(product_id, 0.0)
+        kind, days_of_cover = classify(stock or 0, threshold, rate, cover_days)
+        if kind is None:
+            continue
+        seen.add(product_id)
+        values = {'kind': kind, 'stock_quantity': stock or 0, 'daily_velocity': rate,
+                  'days_of_cover': days_of_cover, 'updated_at': now}
+        if product_id in open_alerts:
+            alert_id, old_kind = open_alerts[product_id]
+            if ALERT_KINDS.index(kind) < ALERT_KINDS.index(old_kind):
+                # Got worse: put it back at the top of the inbox
+                values['is_read'] = False
+            updates.append({'id': alert_id, **values})
+        else:
+            new_alerts.append({'product_id': product_id, 'created_at': now,
+                               'is_read': False, **values})
+
+    resolved = [alert_id for product_id, (alert_id, _) in open_alerts.items()
+                if product_id not in seen]
+
+    for chunk in _chunks(new_alerts):
+        db.session.execute(sa.insert(InventoryAlert), chunk)
+    for chunk in _chunks(updates):
+        db.session.execute(sa.update(InventoryAlert), chunk)
+    for chunk in _chunks(resolved):
+        db.session.execute(sa.update(InventoryAlert)
+                           .where(InventoryAlert.id.in_(chunk))
+                           .values(resolved_at=now),
+                           execution_options={'synchronize_session': False})
+    db.session.commit()
+    return {'opened': len(new_alerts), 'updated': len(updates), 'resolved': len(resolved)}
+
+
+def open_alerts_query():
+    severity = sa.case({kind: i for i, kind in enumerate(ALERT_KINDS)},
+                       value=InventoryAlert.kind)
+    return (InventoryAlert.query
+            .filter(InventoryAlert.resolved_at.is_(None))
+            .order_by(InventoryAlert.is_read, severity,
+                      InventoryAlert.days_of_cover.is_(None),
+                      InventoryAlert.days_of_cover))
+
+
+def unread_alert_count():
+    return InventoryAlert.query.filter(InventoryAlert.resolved_at.is_(None),
+                                       InventoryAlert.is_read.is_(False)).count()
+
+
+if __name__ == '__main__':
+    from app import app
+
+    with app.app_context():
+        result = run_inventory_check()
+        print('Inventory check: {opened} opened, {updated} updated, {resolved} resolved'.format(**result))
@@ -0,0 +1,113 @@
+"""Compact read model for product cards.
+
+Card grids (home page, catalogue, related products) only need a handful
+of columns, so they select exactly those instead of loading Product
+entities: the description is cut down to a summary in SQL, the discount
+percentage is computed in SQL from the precomputed effective price (see
+promotions.py), and each row becomes a ProductCard
+namedtuple with its prices already formatted. Cards are plain tuples, not
+tracked by the session, so they are cheap to build and to throw away, and
+the fixed grids and the category list are kept in the shared cache until
+a product changes.
+"""
+from collections import namedtuple
+
+import sqlalchemy as sa
+from flask_sqlalchemy.pagination import Pagination
+
+from app import db
+from cache import memoize
+from models import Product
+
+SUMMARY_LENGTH = 100
+
+ProductCard = namedtuple('ProductCard', [
+    'id', 'name', 'category', 'image_url', 'price', 'original_price',
+    'stock_quantity', 'summary', 'discount_percent', 'price_display',
+    'original_price_display'
+])
+
+DISCOUNT_PERCENT = sa.case(
+    (Product.compare_at_price > Product.effective_price,
+     sa.func.round((Product.compare_at_price - Product.effective_price) * 100.0
+                   / Product.compare_at_price)),
+    else_=0)
+
+CARD_COLUMNS = (
+    Product.id, Product.name, Product.category, Product.image_url,
+    Product.effective_price.label('price'), Product.compare_at_price.label('original_price'),
+    Product.stock_quantity,
+    # One character more than the summary so we know whether to add "..."
+    sa.func.substr(Product.description, 1, SUMMARY_LENGTH + 1).label('summary'),
+    DISCOUNT_PERCENT.label('discount_percent'),
+)
+
+
+def _card(row):
+    (id_, name, category, image_url, price, original_price, stock,
+     summary, discount) = row
+    summary = summary or ''
+    if len(summary) > SUMMARY_LENGTH:
+        summary = summary[:SUMMARY_LENGTH] + '...'
+    discount = int(discount or 0)
+    return ProductCard(
+        id_, name, category, image_url, price, original_price, stock or 0,
+        summary, discount, f"₦{price:,.0f}",
+        f"₦{original_price:,.0f}" if discount else None)
+
+
+def card_select():
+    return sa.select(*CARD_COLUMNS).where(Product.is_active.is_(True))
+
+
+def load_cards(stmt):
+    return [_card(row) for row in db.session.execute(stmt)]
+
+
+class CardPagination(Pagination):
+    """Pagination over card_select()-based statements"""
+
+    def _query_items(self):
+        stmt = self._query_args['select']
+        return load_cards(stmt.limit(self.per_page).offset(self._query_offset))
+
+    def _query_count(self):
+        stmt = self._query_args['select'].order_by(None)
+        return db.session.execute(
+            sa.select(sa.func.count()).select_from(stmt.subquery())).scalar()
+
+
+@memoize('featured_cards', tags=('products',))
+def featured_cards(limit=6):
+    return load_cards(card_select().limit(limit))
+
+
+def catalogue_cards(page=1, per_page=12, category=None, search=None):
+    stmt = card_select()
+    if category:
+        stmt = stmt.where(Product.category == category)
+    if search:
+        stmt = stmt.where(Product.name.contains(search))
+    stmt = stmt.order_by(Product.created_at.desc())
+    return CardPagination(page=page, per_page=per_page, error_out=False, select=stmt)
+
+
+def related_cards(product, limit=4):
+    return _related_cards(product.id, product.category, limit)
+
+
+@memoize('related_cards', tags=('products',))
+def _related_cards(product_id, category, limit):
+    return load_cards(card_select()
+                      .where(Product.category == category, Product.id != product_id)
+                      .limit(limit))
+
+
+@memoize('categories', tags=('products',))
+def category_counts():
+    """(category, active product count) pairs, alphabetically"""
+    return [tuple(row) for row in db.session.execute(
+        sa.select(Product.category, sa.func.count())
+        .where(Product.is_active.is_(True), Product.category.isnot(None))
+        .group_by(Product.category)
+        .order_by(Product.category))]
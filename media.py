@@ -0,0 +1,133 @@
+"""Serving of uploaded media (product images and news media).
+
+Files under UPLOAD_FOLDER are served with content-hash ETags, byte-range
+support and long-lived cache headers. In production the actual byte
+pushing can be handed to the front-end server:
+
+* MEDIA_ACCEL_REDIRECT_PREFIX - nginx internal location mapped to
+  UPLOAD_FOLDER; responses carry X-Accel-Redirect and no body.
+* MEDIA_USE_X_SENDFILE - Apache/lighttpd X-Sendfile with the file path.
+
+Nginx and Apache handle Range requests themselves for offloaded files.
+"""
+import os
+import hashlib
+import mimetypes
+import threading
+from collections import OrderedDict
+from urllib.parse import quote
+
+from flask import current_app, request, url_for, abort
+from werkzeug.security import safe_join
+from werkzeug.utils import send_file
+
+from assets import precompressed_variant
+
+MEDIA_MAX_AGE = 30 * 24 * 3600  # uploads get random names, so they rarely change
+HASH_CHUNK_SIZE = 1024 * 1024
+ETAG_CACHE_SIZE = 4096
+
+# Media types worth sending precompressed; images and video already are
+COMPRESSIBLE_TYPES = ('text/', 'image/svg+xml', 'application/json', 'application/xml')
+
+_etag_cache = OrderedDict()
+_etag_lock = threading.Lock()
+
+
+def content_etag(path, stat=None):
+    """Return a strong ETag derived from the file's content.
+
+    Hashes are cached per (path, mtime, size), so each file is read once
+    per process rather than on every request.
+    """
+    stat = stat or os.stat(path)
+    key = (path, stat.st_mtime_ns, stat.st_size)
+
+    with _etag_lock:
+        etag = _etag_cache.get(key)
+        if etag is not None:
+            _etag_cache.move_to_end(key)
+            return etag
+
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+    etag = digest.hexdigest()[:32]
+
+    with _etag_lock:
+        _etag_cache[key] = etag
+        while len(_etag_cache) > ETAG_CACHE_SIZE:
+            _etag_cache.popitem(last=False)
+    return etag
+
+
+def send_media(filename):
+    """Send a file from UPLOAD_FOLDER with caching, range and offload support"""
+    upload_folder = current_app.config['UPLOAD_FOLDER']
+    path = safe_join(upload_folder, filename)
+    if path is None or not os.path.isfile(path):
+        abort(404)
+
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    if mimetype.startswith(COMPRESSIBLE_TYPES):
+        filename, encoding = precompressed_variant(upload_folder, filename)
+        path = safe_join(upload_folder, filename)
+
+    stat = os.stat(path)
+    etag = content_etag(path, stat)
+    max_age = current_app.config.get('MEDIA_MAX_AGE', MEDIA_MAX_AGE)
+    accel_prefix = current_app.config.get('MEDIA_ACCEL_REDIRECT_PREFIX')
+
+    if accel_prefix:
+        # Answer conditional requests here; nginx only sees cache misses
+        response = current_app.response_class(mimetype=mimetype)
+        response.set_etag(etag)
+        response.last_modified = stat.st_mtime
+        response.cache_control.max_age = max_age
+        response = response.make_conditional(request)
+        if response.status_code == 200:
+            response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + quote(filename)
+    else:
+        response = send_file(path, request.environ,
+                             mimetype=mimetype,
+                             conditional=True,
+                             etag=etag,
+                             max_age=max_age,
+                             use_x_sendfile=current_app.config.get('MEDIA_USE_X_SENDFILE', False),
+                             response_class=current_app.response_class)
+
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+        response.vary.add('Accept-Encoding')
+    response.cache_control.public = True
+    response.headers['Accept-Ranges'] = 'bytes'
+    return response
+
+
+def media_url(value):
+    """Template filter: URL for an uploaded file name or stored media URL"""
+    if not value:
+        return ''
+    if '/' in value or ':' in value:
+        return value
+    prefix = current_app.extensions['media']['static_prefix']
+    return url_for('static', filename=prefix + value)
+
+
+def init_media(app):
+    """Route static requests under UPLOAD_FOLDER through send_media"""
+    upload_folder = app.config['UPLOAD_FOLDER']
+    prefix = os.path.relpath(upload_folder, app.static_folder).replace(os.sep, '/') + '/'
+    app.extensions['media'] = {'static_prefix': prefix}
+
+    static_view = app.view_functions['static']
+
+    def static_or_media(filename):
+        if filename.startswith(prefix):
+            return send_media(filename[len(prefix):])
+        return static_view(filename)
+
+    app.view_functions['static'] = static_or_media
+    app.jinja_env.filters['media_url'] = media_url
@@ -0,0 +1,41 @@
+"""add notification outbox table
+
+Revision ID: 0a7d3e95c2b4
+Revises: f3c9a1d57e20
+Create Date: 2026-10-19 19:12:08.415923
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0a7d3e95c2b4'
+down_revision = 'f3c9a1d57e20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('notification',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('event', sa.String(length=50), nullable=False),
+    sa.Column('recipient', sa.String(length=120), nullable=False),
+    sa.Column('subject', sa.String(length=200), nullable=False),
+    sa.Column('body', sa.Text(), nullable=False),
+    sa.Column('digest', sa.Boolean(), nullable=True),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('attempts', sa.Integer(), nullable=True),
+    sa.Column('last_error', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('send_after', sa.DateTime(), nullable=True),
+    sa.Column('sent_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_notification_status_send_after', 'notification',
+                    ['status', 'send_after'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_notification_status_send_after', table_name='notification')
+    op.drop_table('notification')
@@ -1,7 +1,7 @@
 """create news table
 
 Revision ID: 18ba562e8af2
-Revises: 
+Revises: a0c3e1f29b44
 Create Date: 2025-09-10 13:44:22.481779
 
 """
@@ -11,7 +11,7 @@ import sqlalchemy as sa
 
 # revision identifiers, used by Alembic.
 revision = '18ba562e8af2'
-down_revision = None
+down_revision = 'a0c3e1f29b44'
 branch_labels = None
 depends_on = None
 
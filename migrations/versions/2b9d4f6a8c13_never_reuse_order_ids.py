@@ -0,0 +1,46 @@
+"""never reuse order ids once their orders are archived
+
+Revision ID: 2b9d4f6a8c13
+Revises: 5f2d8c3a1e96
+Create Date: 2026-10-20 03:41:16.257804
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2b9d4f6a8c13'
+down_revision = '5f2d8c3a1e96'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # PostgreSQL sequences never hand an id out twice. SQLite picks
+    # max(id) + 1 unless the table is AUTOINCREMENT, so archiving the
+    # newest order let the next checkout take its id.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('order', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}):
+        pass
+    # Copying the rows set the counter to the highest live id, but archived
+    # orders may hold higher ones
+    bind = op.get_bind()
+    last_archived = bind.execute(sa.text('SELECT max(id) FROM archived_order')).scalar()
+    if last_archived is None:
+        return
+    updated = bind.execute(sa.text("UPDATE sqlite_sequence SET seq = max(seq, :id) "
+                                   "WHERE name = 'order'"), {'id': last_archived}).rowcount
+    if not updated:
+        bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('order', :id)"),
+                     {'id': last_archived})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    # Reflection does not carry AUTOINCREMENT over, so a plain rebuild drops it
+    with op.batch_alter_table('order', schema=None, recreate='always'):
+        pass
@@ -0,0 +1,56 @@
+"""add order event log and live order status counts
+
+Revision ID: 3f8a5c1e7d20
+Revises: 9b4e6c2d8f15
+Create Date: 2026-10-19 23:18:05.644912
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '3f8a5c1e7d20'
+down_revision = '9b4e6c2d8f15'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('order_event',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('field', sa.String(length=20), nullable=False),
+    sa.Column('from_value', sa.String(length=20), nullable=True),
+    sa.Column('to_value', sa.String(length=20), nullable=False),
+    sa.Column('actor_id', sa.Integer(), nullable=True),
+    sa.Column('note', sa.String(length=200), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_order_event_order', 'order_event', ['order_id', 'id'], unique=False)
+    op.create_index('ix_order_event_field_to', 'order_event', ['field', 'to_value', 'id'],
+                    unique=False)
+    op.create_table('order_status_count',
+    sa.Column('field', sa.String(length=20), nullable=False),
+    sa.Column('value', sa.String(length=20), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('field', 'value')
+    )
+    create_index('ix_order_status_created', 'order', ['status', 'created_at'], unique=False)
+
+    # Seed the counts from the orders already there
+    for field in ('status', 'payment_status'):
+        op.execute(f'INSERT INTO order_status_count (field, value, count) '
+                   f"SELECT '{field}', {field}, COUNT(*) FROM \"order\" "
+                   f'WHERE {field} IS NOT NULL GROUP BY {field}')
+
+
+def downgrade():
+    drop_index('ix_order_status_created', 'order')
+    op.drop_table('order_status_count')
+    op.drop_index('ix_order_event_field_to', table_name='order_event')
+    op.drop_index('ix_order_event_order', table_name='order_event')
+    op.drop_table('order_event')
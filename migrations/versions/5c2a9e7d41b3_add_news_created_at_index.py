@@ -0,0 +1,26 @@
+"""add index on news.created_at
+
+Revision ID: 5c2a9e7d41b3
+Revises: 18ba562e8af2
+Create Date: 2026-10-19 10:12:31.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5c2a9e7d41b3'
+down_revision = '18ba562e8af2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('news', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_news_created_at'), ['created_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('news', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_news_created_at'))
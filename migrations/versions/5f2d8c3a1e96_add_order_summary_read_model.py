@@ -0,0 +1,88 @@
+"""add order_summary read model for customer order history
+
+Revision ID: 5f2d8c3a1e96
+Revises: e4b7a2c91d53
+Create Date: 2026-10-20 02:18:44.903172
+
+"""
+import json
+
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import backfill, create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '5f2d8c3a1e96'
+down_revision = 'e4b7a2c91d53'
+branch_labels = None
+depends_on = None
+
+# Mirrors order_history.summary_rows
+PREVIEW_ITEMS = 3
+ORDER_COLUMNS = ('id', 'user_id', 'created_at', 'total_amount', 'status', 'payment_status')
+PRODUCT = sa.table('product', sa.column('id', sa.Integer), sa.column('name'),
+                   sa.column('image_url'))
+SUMMARY = sa.table('order_summary', *(sa.column(name) for name in (
+    'order_id', 'user_id', 'created_at', 'total_amount', 'status', 'payment_status',
+    'item_count', 'line_count', 'preview', 'is_archived')))
+
+
+def _summarizer(items, archived):
+    def summarize(connection, orders):
+        rows = {order.id: {'order_id': order.id, 'user_id': order.user_id,
+                           'created_at': order.created_at, 'total_amount': order.total_amount,
+                           'status': order.status, 'payment_status': order.payment_status,
+                           'item_count': 0, 'line_count': 0, 'preview': [],
+                           'is_archived': archived}
+                for order in orders}
+        for item in connection.execute(
+                sa.select(items.c.order_id, items.c.quantity, PRODUCT.c.name, PRODUCT.c.image_url)
+                .outerjoin(PRODUCT, items.c.product_id == PRODUCT.c.id)
+                .where(items.c.order_id.in_(list(rows)))
+                .order_by(items.c.order_id, items.c.id)):
+            row = rows[item.order_id]
+            row['item_count'] += item.quantity
+            row['line_count'] += 1
+            if len(row['preview']) < PREVIEW_ITEMS:
+                row['preview'].append({'name': item.name or 'Removed product',
+                                       'image_url': item.image_url, 'quantity': item.quantity})
+        for row in rows.values():
+            row['preview'] = json.dumps(row['preview'])
+        connection.execute(SUMMARY.insert(), list(rows.values()))
+    return summarize
+
+
+def upgrade():
+    op.create_table('order_summary',
+    sa.Column('order_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('payment_status', sa.String(length=20), nullable=True),
+    sa.Column('item_count', sa.Integer(), nullable=False),
+    sa.Column('line_count', sa.Integer(), nullable=False),
+    sa.Column('preview', sa.Text(), nullable=False),
+    sa.Column('is_archived', sa.Boolean(), nullable=False),
+    sa.PrimaryKeyConstraint('order_id')
+    )
+    # Summaries are built per order, so items need looking up by order
+    create_index('ix_order_item_order_id', 'order_item', ['order_id'], unique=False)
+
+    for orders, items, archived in (('order', 'order_item', False),
+                                    ('archived_order', 'archived_order_item', True)):
+        backfill(sa.table(orders, *(sa.column(name) for name in ORDER_COLUMNS)),
+                 _summarizer(sa.table(items, sa.column('id'), sa.column('order_id'),
+                                      sa.column('product_id'), sa.column('quantity')),
+                             archived))
+
+    create_index('ix_order_summary_user_created', 'order_summary',
+                 ['user_id', 'created_at', 'order_id'], unique=False)
+
+
+def downgrade():
+    drop_index('ix_order_summary_user_created', 'order_summary')
+    drop_index('ix_order_item_order_id', 'order_item')
+    op.drop_table('order_summary')
@@ -0,0 +1,43 @@
+"""never reuse order_item ids once their items are archived
+
+Revision ID: 6a3f0d8b2e71
+Revises: c8e2a5f71d09
+Create Date: 2026-10-20 05:03:52.114690
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '6a3f0d8b2e71'
+down_revision = 'c8e2a5f71d09'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Archived items keep their ids, so as with order (2b9d4f6a8c13) a
+    # reused order_item id made the next archive run fail on
+    # archived_order_item's primary key. PostgreSQL never reuses ids.
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('order_item', schema=None, recreate='always',
+                              table_kwargs={'sqlite_autoincrement': True}):
+        pass
+    bind = op.get_bind()
+    last_archived = bind.execute(sa.text('SELECT max(id) FROM archived_order_item')).scalar()
+    if last_archived is None:
+        return
+    updated = bind.execute(sa.text("UPDATE sqlite_sequence SET seq = max(seq, :id) "
+                                   "WHERE name = 'order_item'"), {'id': last_archived}).rowcount
+    if not updated:
+        bind.execute(sa.text("INSERT INTO sqlite_sequence (name, seq) VALUES ('order_item', :id)"),
+                     {'id': last_archived})
+
+
+def downgrade():
+    if op.get_bind().dialect.name != 'sqlite':
+        return
+    with op.batch_alter_table('order_item', schema=None, recreate='always'):
+        pass
@@ -0,0 +1,27 @@
+"""add product index for newest-first catalogue pages
+
+Revision ID: 6e2f8b1d3a94
+Revises: 0a7d3e95c2b4
+Create Date: 2026-10-19 20:02:37.120845
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '6e2f8b1d3a94'
+down_revision = '0a7d3e95c2b4'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    create_index('ix_product_active_created', 'product',
+                 ['is_active', 'created_at', 'id'], unique=False)
+
+
+def downgrade():
+    drop_index('ix_product_active_created', 'product')
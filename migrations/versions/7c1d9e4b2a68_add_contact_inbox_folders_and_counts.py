@@ -0,0 +1,57 @@
+"""add contact message folders, content hashes and inbox counts
+
+Revision ID: 7c1d9e4b2a68
+Revises: 3f8a5c1e7d20
+Create Date: 2026-10-20 00:07:42.519380
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '7c1d9e4b2a68'
+down_revision = '3f8a5c1e7d20'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('contact_message', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('folder', sa.String(length=10), nullable=False,
+                                      server_default='inbox'))
+        batch_op.add_column(sa.Column('content_hash', sa.String(length=64), nullable=True))
+    create_index('ix_contact_message_folder_created', 'contact_message',
+                 ['folder', 'created_at', 'id'], unique=False)
+    create_index('ix_contact_message_hash_created', 'contact_message',
+                 ['content_hash', 'created_at'], unique=False)
+
+    count_table = op.create_table('contact_message_count',
+    sa.Column('name', sa.String(length=10), nullable=False),
+    sa.Column('count', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+    # Existing messages are all in the inbox; content hashes are only
+    # needed for messages inside the dedupe window, so old rows keep NULL
+    messages = sa.table('contact_message', sa.column('is_read', sa.Boolean))
+    bind = op.get_bind()
+    total = bind.execute(sa.select(sa.func.count()).select_from(messages)).scalar()
+    unread = bind.execute(sa.select(sa.func.count()).select_from(messages)
+                          .where(sa.or_(messages.c.is_read.is_(False),
+                                        messages.c.is_read.is_(None)))).scalar()
+    op.bulk_insert(count_table, [{'name': 'inbox', 'count': total},
+                                 {'name': 'archived', 'count': 0},
+                                 {'name': 'spam', 'count': 0},
+                                 {'name': 'unread', 'count': unread}])
+
+
+def downgrade():
+    op.drop_table('contact_message_count')
+    drop_index('ix_contact_message_hash_created', 'contact_message')
+    drop_index('ix_contact_message_folder_created', 'contact_message')
+    with op.batch_alter_table('contact_message', schema=None) as batch_op:
+        batch_op.drop_column('content_hash')
+        batch_op.drop_column('folder')
@@ -0,0 +1,108 @@
+"""add daily sales rollup tables
+
+Revision ID: 8e41d0c7a2f6
+Revises: 5c2a9e7d41b3
+Create Date: 2026-10-19 14:02:47.518330
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import backfill
+
+
+# revision identifiers, used by Alembic.
+revision = '8e41d0c7a2f6'
+down_revision = '5c2a9e7d41b3'
+branch_labels = None
+depends_on = None
+
+# Mirrors reports.apply_order: paid orders, bucketed by the day placed
+PAID = 'paid'
+NO_PAYMENT_METHOD = 0
+ORDER = sa.table('order', sa.column('id', sa.Integer), sa.column('created_at', sa.DateTime),
+                 sa.column('payment_status', sa.String), sa.column('total_amount', sa.Float),
+                 sa.column('payment_method_id', sa.Integer))
+ORDER_ITEM = sa.table('order_item', sa.column('order_id', sa.Integer),
+                      sa.column('product_id', sa.Integer), sa.column('quantity', sa.Integer),
+                      sa.column('total_price', sa.Float))
+
+
+def _add_to_rollup(connection, table, keys, totals):
+    """Upsert rows of `table`, adding to the counters of rows that exist"""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        from sqlalchemy.dialects.sqlite import insert
+    stmt = insert(table)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=list(keys),
+        set_={name: table.c[name] + stmt.excluded[name]
+              for name in table.c.keys() if name not in keys})
+    connection.execute(stmt, [{**dict(zip(keys, key)), **counters}
+                              for key, counters in totals.items()])
+
+
+def _folder(daily, products, methods):
+    def fold_in(connection, orders):
+        paid = {order.id: order for order in orders
+                if order.payment_status == PAID and order.created_at is not None}
+        if not paid:
+            return
+        days, product_rows, method_rows = {}, {}, {}
+        for order in paid.values():
+            day = days.setdefault((order.created_at.date(), ),
+                                  {'order_count': 0, 'units': 0, 'revenue': 0.0})
+            day['order_count'] += 1
+            day['revenue'] += order.total_amount
+            method = method_rows.setdefault(
+                (order.created_at.date(), order.payment_method_id or NO_PAYMENT_METHOD),
+                {'order_count': 0, 'revenue': 0.0})
+            method['order_count'] += 1
+            method['revenue'] += order.total_amount
+        for item in connection.execute(sa.select(ORDER_ITEM)
+                                       .where(ORDER_ITEM.c.order_id.in_(list(paid)))):
+            day = paid[item.order_id].created_at.date()
+            days[day, ]['units'] += item.quantity
+            product = product_rows.setdefault((day, item.product_id),
+                                              {'units': 0, 'revenue': 0.0})
+            product['units'] += item.quantity
+            product['revenue'] += item.total_price or 0
+        _add_to_rollup(connection, daily, ('day',), days)
+        _add_to_rollup(connection, methods, ('day', 'payment_method_id'), method_rows)
+        if product_rows:
+            _add_to_rollup(connection, products, ('day', 'product_id'), product_rows)
+    return fold_in
+
+
+def upgrade():
+    daily = op.create_table('daily_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day')
+    )
+    products = op.create_table('daily_product_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('product_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('units', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'product_id')
+    )
+    methods = op.create_table('daily_payment_method_sales',
+    sa.Column('day', sa.Date(), nullable=False),
+    sa.Column('payment_method_id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('order_count', sa.Integer(), nullable=False),
+    sa.Column('revenue', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('day', 'payment_method_id')
+    )
+    # Existing paid orders, so reports and the dashboard revenue start
+    # from the real totals rather than from zero
+    backfill(ORDER, _folder(daily, products, methods))
+
+
+def downgrade():
+    op.drop_table('daily_payment_method_sales')
+    op.drop_table('daily_product_sales')
+    op.drop_table('daily_sales')
@@ -0,0 +1,73 @@
+"""add normalized user search columns and indexes
+
+Revision ID: 9b4e6c2d8f15
+Revises: c5d1e8a2f7b3
+Create Date: 2026-10-19 22:41:53.207316
+
+"""
+import re
+
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import backfill, create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = '9b4e6c2d8f15'
+down_revision = 'c5d1e8a2f7b3'
+branch_labels = None
+depends_on = None
+
+# Mirrors user_search.user_search_text / normalize_phone
+USER = sa.table('user', sa.column('id', sa.Integer), sa.column('username'),
+                sa.column('first_name'), sa.column('last_name'), sa.column('email'),
+                sa.column('phone'), sa.column('search_text'), sa.column('phone_digits'))
+
+
+def _search_text(username, first_name, last_name, email):
+    parts = (username, first_name, last_name, email)
+    return ' '.join(' '.join(part for part in parts if part).lower().split())
+
+
+def _phone_digits(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('234'):
+        digits = '0' + digits[3:]
+    return digits or None
+
+
+def _fill_search_columns(connection, rows):
+    connection.execute(
+        USER.update().where(USER.c.id == sa.bindparam('user_id'))
+        .values(search_text=sa.bindparam('text'), phone_digits=sa.bindparam('digits')),
+        [{'user_id': row.id,
+          'text': _search_text(row.username, row.first_name, row.last_name, row.email),
+          'digits': _phone_digits(row.phone)} for row in rows])
+
+
+def upgrade():
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('search_text', sa.String(length=300), nullable=True))
+        batch_op.add_column(sa.Column('phone_digits', sa.String(length=20), nullable=True))
+
+    # Backfill before indexing, so the indexes are built once
+    backfill(USER, _fill_search_columns)
+
+    create_index('ix_user_phone_digits', 'user', ['phone_digits'], unique=False)
+    create_index('ix_user_email_lower', 'user', [sa.text('lower(email)')], unique=False)
+    if op.get_bind().dialect.name == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        create_index('ix_user_search_text_trgm', 'user', ['search_text'], unique=False,
+                     postgresql_using='gin',
+                     postgresql_ops={'search_text': 'gin_trgm_ops'})
+
+
+def downgrade():
+    if op.get_bind().dialect.name == 'postgresql':
+        drop_index('ix_user_search_text_trgm', 'user')
+    drop_index('ix_user_email_lower', 'user')
+    drop_index('ix_user_phone_digits', 'user')
+    with op.batch_alter_table('user', schema=None) as batch_op:
+        batch_op.drop_column('phone_digits')
+        batch_op.drop_column('search_text')
@@ -0,0 +1,63 @@
+"""add order archive tables
+
+Revision ID: b7f3c18e9d25
+Revises: 8e41d0c7a2f6
+Create Date: 2026-10-19 15:21:09.884172
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'b7f3c18e9d25'
+down_revision = '8e41d0c7a2f6'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('archived_order',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('total_amount', sa.Float(), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=True),
+    sa.Column('payment_status', sa.String(length=20), nullable=True),
+    sa.Column('payment_reference', sa.String(length=100), nullable=True),
+    sa.Column('payment_method_id', sa.Integer(), nullable=True),
+    sa.Column('shipping_address', sa.Text(), nullable=True),
+    sa.Column('phone', sa.String(length=20), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('archived_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['payment_method_id'], ['payment_method.id'], ),
+    sa.ForeignKeyConstraint(['user_id'], ['user.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_order', schema=None) as batch_op:
+        batch_op.create_index('ix_archived_order_user_created', ['user_id', 'created_at'], unique=False)
+
+    op.create_table('archived_order_item',
+    sa.Column('id', sa.Integer(), autoincrement=False, nullable=False),
+    sa.Column('order_id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('quantity', sa.Integer(), nullable=False),
+    sa.Column('unit_price', sa.Float(), nullable=False),
+    sa.Column('total_price', sa.Float(), nullable=False),
+    sa.ForeignKeyConstraint(['order_id'], ['archived_order.id'], ),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('archived_order_item', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_archived_order_item_order_id'), ['order_id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('archived_order_item', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_archived_order_item_order_id'))
+
+    op.drop_table('archived_order_item')
+    with op.batch_alter_table('archived_order', schema=None) as batch_op:
+        batch_op.drop_index('ix_archived_order_user_created')
+
+    op.drop_table('archived_order')
@@ -0,0 +1,28 @@
+"""add cache_version counters shared by every worker
+
+Revision ID: c8e2a5f71d09
+Revises: 2b9d4f6a8c13
+Create Date: 2026-10-20 04:12:37.880415
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c8e2a5f71d09'
+down_revision = '2b9d4f6a8c13'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('cache_version',
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('cache_version')
@@ -0,0 +1,52 @@
+"""add product reorder threshold and inventory alerts
+
+Revision ID: d2a6b84f0c17
+Revises: b7f3c18e9d25
+Create Date: 2026-10-19 16:40:12.307514
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'd2a6b84f0c17'
+down_revision = 'b7f3c18e9d25'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('reorder_threshold', sa.Integer(), server_default='5', nullable=False))
+    op.create_index('ix_product_stock_headroom', 'product',
+                    [sa.text('(stock_quantity - reorder_threshold)')], unique=False)
+
+    op.create_table('inventory_alert',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=False),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('stock_quantity', sa.Integer(), nullable=False),
+    sa.Column('daily_velocity', sa.Float(), nullable=False),
+    sa.Column('days_of_cover', sa.Float(), nullable=True),
+    sa.Column('is_read', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('resolved_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('inventory_alert', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_inventory_alert_product_id'), ['product_id'], unique=False)
+        batch_op.create_index(batch_op.f('ix_inventory_alert_resolved_at'), ['resolved_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('inventory_alert', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_inventory_alert_resolved_at'))
+        batch_op.drop_index(batch_op.f('ix_inventory_alert_product_id'))
+
+    op.drop_table('inventory_alert')
+    op.drop_index('ix_product_stock_headroom', table_name='product')
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('reorder_threshold')
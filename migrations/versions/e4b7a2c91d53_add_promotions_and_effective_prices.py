@@ -0,0 +1,89 @@
+"""add promotions and precomputed product effective prices
+
+Revision ID: e4b7a2c91d53
+Revises: 7c1d9e4b2a68
+Create Date: 2026-10-20 01:32:08.641927
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+from online_migrations import backfill, create_index, drop_index
+
+
+# revision identifiers, used by Alembic.
+revision = 'e4b7a2c91d53'
+down_revision = '7c1d9e4b2a68'
+branch_labels = None
+depends_on = None
+
+PRODUCT = sa.table('product', sa.column('id', sa.Integer), sa.column('price', sa.Float),
+                   sa.column('effective_price', sa.Float))
+
+
+def _start_at_list_price(connection, rows):
+    connection.execute(PRODUCT.update()
+                       .where(PRODUCT.c.id.in_([row.id for row in rows]))
+                       .values(effective_price=PRODUCT.c.price))
+
+
+def _drop_stock_headroom_index():
+    if op.get_bind().dialect.name == 'sqlite':
+        op.drop_index('ix_product_stock_headroom', table_name='product')
+
+
+def _create_stock_headroom_index():
+    # As created by d2a6b84f0c17
+    if op.get_bind().dialect.name == 'sqlite':
+        op.create_index('ix_product_stock_headroom', 'product',
+                        [sa.text('(stock_quantity - reorder_threshold)')], unique=False)
+
+
+def upgrade():
+    op.create_table('promotion',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('name', sa.String(length=100), nullable=False),
+    sa.Column('scope', sa.String(length=20), nullable=False),
+    sa.Column('product_id', sa.Integer(), nullable=True),
+    sa.Column('category', sa.String(length=50), nullable=True),
+    sa.Column('kind', sa.String(length=20), nullable=False),
+    sa.Column('amount', sa.Float(), nullable=False),
+    sa.Column('starts_at', sa.DateTime(), nullable=False),
+    sa.Column('ends_at', sa.DateTime(), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['product_id'], ['product.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('promotion', schema=None) as batch_op:
+        batch_op.create_index('ix_promotion_active_window', ['is_active', 'starts_at', 'ends_at'], unique=False)
+        batch_op.create_index(batch_op.f('ix_promotion_product_id'), ['product_id'], unique=False)
+
+    op.add_column('product', sa.Column('effective_price', sa.Float(), nullable=True))
+    op.add_column('product', sa.Column('promotion_id', sa.Integer(), nullable=True))
+
+    # No promotions exist yet, so every product sells at its list price
+    backfill(PRODUCT, _start_at_list_price)
+
+    # On SQLite the batch rebuilds product from reflection, which skips
+    # expression indexes; drop ix_product_stock_headroom and build it again
+    _drop_stock_headroom_index()
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.alter_column('effective_price', existing_type=sa.Float(), nullable=False)
+    _create_stock_headroom_index()
+    create_index('ix_product_effective_price', 'product', ['effective_price'], unique=False)
+
+
+def downgrade():
+    drop_index('ix_product_effective_price', 'product')
+    _drop_stock_headroom_index()
+    with op.batch_alter_table('product', schema=None) as batch_op:
+        batch_op.drop_column('promotion_id')
+        batch_op.drop_column('effective_price')
+    _create_stock_headroom_index()
+
+    with op.batch_alter_table('promotion', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_promotion_product_id'))
+        batch_op.drop_index('ix_promotion_active_window')
+
+    op.drop_table('promotion')
@@ -0,0 +1,34 @@
+"""add server_session table for server-side sessions
+
+Revision ID: f3c9a1d57e20
+Revises: d2a6b84f0c17
+Create Date: 2026-10-19 18:05:41.662190
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'f3c9a1d57e20'
+down_revision = 'd2a6b84f0c17'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('server_session',
+    sa.Column('id', sa.String(length=64), nullable=False),
+    sa.Column('data', sa.Text(), nullable=False),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    with op.batch_alter_table('server_session', schema=None) as batch_op:
+        batch_op.create_index(batch_op.f('ix_server_session_expires_at'), ['expires_at'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('server_session', schema=None) as batch_op:
+        batch_op.drop_index(batch_op.f('ix_server_session_expires_at'))
+
+    op.drop_table('server_session')
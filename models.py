@@ -1,7 +1,10 @@
+import json
+
 from app import db
 from flask_login import UserMixin
 from datetime import datetime
 from sqlalchemy import func
+from sqlalchemy.ext.hybrid import hybrid_property
 
 
 class User(UserMixin, db.Model):
@@ -17,6 +20,11 @@ class User(UserMixin, db.Model):
     google_id = db.Column(db.String(100), unique=True)
     facebook_id = db.Column(db.String(100), unique=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Derived search columns, maintained by user_search.py
+    search_text = db.Column(db.String(300))
+    phone_digits = db.Column(db.String(20), index=True)
+
+    __table_args__ = (db.Index('ix_user_email_lower', db.func.lower(email)), )
 
     # Relationships
     orders = db.relationship('Order', backref='user', lazy=True)
@@ -26,21 +34,57 @@ class User(UserMixin, db.Model):
                                  cascade='all, delete-orphan')
 
 
+def _list_price(context):
+    # Rows inserted without the ORM start at the list price; the next
+    # promotions.reprice() applies any live promotion
+    return context.get_current_parameters()['price']
+
+
 class Product(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
     price = db.Column(db.Float, nullable=False)
     original_price = db.Column(db.Float)  # For showing discounts
+    # What customers pay: price after the best live promotion, kept up to
+    # date by promotions.py so carts and listings never evaluate rules
+    effective_price = db.Column(db.Float, nullable=False, index=True, default=_list_price)
+    promotion_id = db.Column(db.Integer)  # promotion behind effective_price, if any
     image_url = db.Column(db.String(200))
     category = db.Column(db.String(50))
     stock_quantity = db.Column(db.Integer, default=0)
+    # Stock at or below this level counts as low (see inventory.py)
+    reorder_threshold = db.Column(db.Integer, nullable=False, default=5, server_default='5')
     is_active = db.Column(db.Boolean, default=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
 
     # Relationships
     cart_items = db.relationship('CartItem', backref='product', lazy=True)
     order_items = db.relationship('OrderItem', backref='product', lazy=True)
+    inventory_alerts = db.relationship('InventoryAlert',
+                                       backref='product',
+                                       lazy=True,
+                                       cascade='all, delete-orphan')
+
+    @hybrid_property
+    def compare_at_price(self):
+        """Struck-through price shown when effective_price is lower"""
+        return max(self.price, self.original_price or 0)
+
+    @compare_at_price.expression
+    def compare_at_price(cls):
+        return db.case((cls.original_price > cls.price, cls.original_price), else_=cls.price)
+
+    @classmethod
+    def stock_headroom(cls):
+        """Units above the reorder threshold; <= 0 means low stock"""
+        return cls.stock_quantity - cls.reorder_threshold
+
+
+# Expression index so the low-stock query doesn't scan the catalogue
+db.Index('ix_product_stock_headroom', Product.stock_headroom())
+# Newest-first catalogue pages (keyset pagination in api_routes.py)
+db.Index('ix_product_active_created', Product.is_active, Product.created_at, Product.id)
 
 
 class CartItem(db.Model):
@@ -72,6 +116,12 @@ class Order(db.Model):
                            default=datetime.utcnow,
                            onupdate=datetime.utcnow)
 
+    is_archived = False
+
+    # AUTOINCREMENT: on SQLite, ids of archived orders must not be handed out again
+    __table_args__ = (db.Index('ix_order_status_created', 'status', 'created_at'),
+                      {'sqlite_autoincrement': True})
+
     # Relationships
     order_items = db.relationship('OrderItem',
                                   backref='order',
@@ -84,7 +134,7 @@ class Order(db.Model):
 
 class OrderItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
-    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False)
+    order_id = db.Column(db.Integer, db.ForeignKey('order.id'), nullable=False, index=True)
     product_id = db.Column(db.Integer,
                            db.ForeignKey('product.id'),
                            nullable=False)
@@ -92,6 +142,56 @@ class OrderItem(db.Model):
     unit_price = db.Column(db.Float, nullable=False)
     total_price = db.Column(db.Float, nullable=False)
 
+    # Archived items keep their ids too (see Order)
+    __table_args__ = {'sqlite_autoincrement': True}
+
+
+# Delivered and cancelled orders past ORDER_ARCHIVE_AFTER_DAYS are moved
+# here by archive.py, keeping their ids; read both through archive.py.
+class ArchivedOrder(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    payment_reference = db.Column(db.String(100))
+    payment_method_id = db.Column(db.Integer,
+                                  db.ForeignKey('payment_method.id'))
+    shipping_address = db.Column(db.Text)
+    phone = db.Column(db.String(20))
+    created_at = db.Column(db.DateTime)
+    updated_at = db.Column(db.DateTime)
+    archived_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    is_archived = True
+
+    __table_args__ = (db.Index('ix_archived_order_user_created', 'user_id',
+                               'created_at'), )
+
+    # Relationships
+    order_items = db.relationship('ArchivedOrderItem',
+                                  backref='order',
+                                  lazy=True,
+                                  cascade='all, delete-orphan')
+    user = db.relationship('User', backref='archived_orders', lazy=True)
+    payment_method = db.relationship('PaymentMethod', lazy=True)
+
+
+class ArchivedOrderItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_id = db.Column(db.Integer,
+                         db.ForeignKey('archived_order.id'),
+                         nullable=False,
+                         index=True)
+    product_id = db.Column(db.Integer,
+                           db.ForeignKey('product.id'),
+                           nullable=False)
+    quantity = db.Column(db.Integer, nullable=False)
+    unit_price = db.Column(db.Float, nullable=False)
+    total_price = db.Column(db.Float, nullable=False)
+
+    product = db.relationship('Product', lazy=True)
+
 
 class ContactMessage(db.Model):
     id = db.Column(db.Integer, primary_key=True)
@@ -100,6 +200,20 @@ class ContactMessage(db.Model):
     message = db.Column(db.Text, nullable=False)
     is_read = db.Column(db.Boolean, default=False)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    folder = db.Column(db.String(10), nullable=False, default='inbox',
+                       server_default='inbox')  # inbox, archived, spam
+    content_hash = db.Column(db.String(64))  # of the normalized message text
+
+    __table_args__ = (
+        db.Index('ix_contact_message_folder_created', 'folder', 'created_at', 'id'),
+        db.Index('ix_contact_message_hash_created', 'content_hash', 'created_at'),
+    )
+
+
+# Messages per folder plus unread inbox messages, kept by inbox.py
+class ContactMessageCount(db.Model):
+    name = db.Column(db.String(10), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
 
 
 class SiteCustomization(db.Model):
@@ -145,8 +259,171 @@ class News(db.Model):
     title = db.Column(db.String(200), nullable=False)
     content = db.Column(db.Text, nullable=True)
     media_url = db.Column(db.String(300), nullable=True)
-    created_at = db.Column(db.DateTime, default=db.func.current_timestamp())
+    created_at = db.Column(db.DateTime, default=db.func.current_timestamp(), index=True)
 
     
     def __repr__(self):
         return f"<Customization {self.site_name}>"
+
+
+class Promotion(db.Model):
+    """Percentage or fixed discount on one product or a whole category,
+    live between starts_at and ends_at (see promotions.py)"""
+    id = db.Column(db.Integer, primary_key=True)
+    name = db.Column(db.String(100), nullable=False)
+    scope = db.Column(db.String(20), nullable=False)  # product, category
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), index=True)
+    category = db.Column(db.String(50))
+    kind = db.Column(db.String(20), nullable=False)  # percent, fixed
+    amount = db.Column(db.Float, nullable=False)
+    starts_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    ends_at = db.Column(db.DateTime)  # None: runs until switched off
+    is_active = db.Column(db.Boolean, nullable=False, default=True)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    product = db.relationship('Product', backref=db.backref('promotions',
+                                                            cascade='all, delete-orphan'))
+
+    __table_args__ = (
+        db.Index('ix_promotion_active_window', 'is_active', 'starts_at', 'ends_at'),
+    )
+
+
+# Order lifecycle history and live status counts, written by
+# order_lifecycle.py in the transaction that changes an order. order_id has
+# no foreign key so events outlive archival.
+class OrderEvent(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)
+    field = db.Column(db.String(20), nullable=False)  # status, payment_status
+    from_value = db.Column(db.String(20))  # None when the order was created
+    to_value = db.Column(db.String(20), nullable=False)
+    actor_id = db.Column(db.Integer)  # user who made the change, if any
+    note = db.Column(db.String(200))
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+
+    __table_args__ = (
+        db.Index('ix_order_event_order', 'order_id', 'id'),
+        db.Index('ix_order_event_field_to', 'field', 'to_value', 'id'),
+    )
+
+
+# Number of orders in the live `order` table per (field, value)
+class OrderStatusCount(db.Model):
+    field = db.Column(db.String(20), primary_key=True)
+    value = db.Column(db.String(20), primary_key=True)
+    count = db.Column(db.Integer, nullable=False, default=0)
+
+
+# One row per order, live or archived, for the customer order history
+# page; written by order_history.py in the transaction that changes the
+# order. order_id has no foreign key so rows outlive archival.
+class OrderSummary(db.Model):
+    __tablename__ = 'order_summary'
+    order_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    user_id = db.Column(db.Integer, nullable=False)
+    created_at = db.Column(db.DateTime, nullable=False)
+    total_amount = db.Column(db.Float, nullable=False)
+    status = db.Column(db.String(20))
+    payment_status = db.Column(db.String(20))
+    item_count = db.Column(db.Integer, nullable=False, default=0)  # units
+    line_count = db.Column(db.Integer, nullable=False, default=0)
+    # JSON list of the first lines: [{"name", "image_url", "quantity"}, ...]
+    preview = db.Column(db.Text, nullable=False, default='[]')
+    is_archived = db.Column(db.Boolean, nullable=False, default=False)
+
+    __table_args__ = (
+        db.Index('ix_order_summary_user_created', 'user_id', 'created_at', 'order_id'),
+    )
+
+    @property
+    def preview_items(self):
+        return json.loads(self.preview)
+
+
+# Daily sales rollups, maintained incrementally by reports.py as orders
+# are paid; the day is the order's created_at date.
+class DailySales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class DailyProductSales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    product_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    units = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class DailyPaymentMethodSales(db.Model):
+    day = db.Column(db.Date, primary_key=True)
+    # 0 stands for orders without a payment method (NULL can't be in a PK)
+    payment_method_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    order_count = db.Column(db.Integer, nullable=False, default=0)
+    revenue = db.Column(db.Float, nullable=False, default=0)
+
+
+class InventoryAlert(db.Model):
+    """Admin inbox entry written by the inventory job; at most one open
+    alert per product, updated in place while the condition lasts."""
+    id = db.Column(db.Integer, primary_key=True)
+    product_id = db.Column(db.Integer, db.ForeignKey('product.id'), nullable=False, index=True)
+    kind = db.Column(db.String(20), nullable=False)  # out_of_stock, low_stock, low_cover
+    stock_quantity = db.Column(db.Integer, nullable=False)
+    daily_velocity = db.Column(db.Float, nullable=False, default=0)
+    days_of_cover = db.Column(db.Float)  # None when nothing sold recently
+    is_read = db.Column(db.Boolean, default=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow)
+    resolved_at = db.Column(db.DateTime, index=True)
+
+
+class ServerSession(db.Model):
+    """Session payload for the server-side session store (see sessions.py);
+    the cookie only carries the id."""
+    __tablename__ = 'server_session'
+    id = db.Column(db.String(64), primary_key=True)
+    data = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class Notification(db.Model):
+    """Outbound email waiting for (or done with) the notification worker
+    (see notifications.py). Rows are added in the same transaction as the
+    change they announce, so nothing is sent for a rolled-back change."""
+    id = db.Column(db.Integer, primary_key=True)
+    event = db.Column(db.String(50), nullable=False)
+    recipient = db.Column(db.String(120), nullable=False)
+    subject = db.Column(db.String(200), nullable=False)
+    body = db.Column(db.Text, nullable=False)
+    digest = db.Column(db.Boolean, default=False)  # batched into one email per recipient
+    status = db.Column(db.String(20), default='pending')  # pending, sent, failed
+    attempts = db.Column(db.Integer, default=0)
+    last_error = db.Column(db.Text)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    send_after = db.Column(db.DateTime, default=datetime.utcnow)
+    sent_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        db.Index('ix_notification_status_send_after', 'status', 'send_after'),
+    )
+
+
+class IdempotencyKey(db.Model):
+    """Checkout submission already turned into an order (see idempotency.py)"""
+    __tablename__ = 'idempotency_key'
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), primary_key=True)
+    key = db.Column(db.String(64), primary_key=True)
+    order_id = db.Column(db.Integer, nullable=False)  # no FK: orders move to the archive
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+# Version counters that cache keys carry, shared by every worker when the
+# caches keep their values in process (see cache_versions.py)
+class CacheVersion(db.Model):
+    __tablename__ = 'cache_version'
+    name = db.Column(db.String(100), primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
@@ -0,0 +1,96 @@
+"""Keyset-paginated news feed with a cached first page."""
+import time
+import base64
+import threading
+from datetime import datetime
+
+from flask import render_template
+from sqlalchemy import event, and_, or_
+from sqlalchemy.orm import Session
+
+from models import News
+
+NEWS_PAGE_SIZE = 10
+MAX_PAGE_SIZE = 50
+FIRST_PAGE_TTL = 300  # seconds; other workers pick up new posts within this
+
+_first_page = {}
+_first_page_lock = threading.Lock()
+
+
+def encode_cursor(item):
+    raw = f"{item.created_at.isoformat()}|{item.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Return (created_at, id) for a cursor, or None if it is malformed"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        created_at, item_id = base64.urlsafe_b64decode(padded).decode().split('|')
+        return datetime.fromisoformat(created_at), int(item_id)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def get_news_page(cursor=None, limit=NEWS_PAGE_SIZE):
+    """Return (items, next_cursor) for the page after `cursor`.
+
+    Pages are walked by (created_at, id) so each page is an index range
+    scan no matter how deep into the archive it is.
+    """
+    query = News.query.order_by(News.created_at.desc(), News.id.desc())
+
+    position = decode_cursor(cursor) if cursor else None
+    if position:
+        created_at, item_id = position
+        query = query.filter(or_(
+            News.created_at < created_at,
+            and_(News.created_at == created_at, News.id < item_id)))
+
+    items = query.limit(limit + 1).all()
+    next_cursor = encode_cursor(items[limit - 1]) if len(items) > limit else None
+    return items[:limit], next_cursor
+
+
+def render_news_items(items):
+    return render_template('_news_items.html', news=items)
+
+
+def get_first_page():
+    """Rendered first page of the feed and its next cursor, cached per process"""
+    with _first_page_lock:
+        cached = _first_page.get('page')
+        if cached and cached[0] > time.monotonic():
+            return cached[1], cached[2]
+
+    items, next_cursor = get_news_page()
+    html = render_news_items(items)
+
+    with _first_page_lock:
+        _first_page['page'] = (time.monotonic() + FIRST_PAGE_TTL, html, next_cursor)
+    return html, next_cursor
+
+
+def invalidate_first_page():
+    with _first_page_lock:
+        _first_page.clear()
+
+
+@event.listens_for(Session, 'after_flush')
+def _track_news_changes(session, flush_context):
+    changed = session.new | session.dirty | session.deleted
+    if any(isinstance(obj, News) for obj in changed):
+        session.info['news_changed'] = True
+
+
+@event.listens_for(Session, 'after_commit')
+def _invalidate_on_commit(session):
+    # Only after commit, so a concurrent reader can't re-cache the old page
+    if session.info.pop('news_changed', False):
+        invalidate_first_page()
+
+
+@event.listens_for(Session, 'after_rollback')
+def _forget_news_changes(session):
+    session.info.pop('news_changed', None)
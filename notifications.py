@@ -0,0 +1,274 @@
+"""Email notifications for customers and admins.
+
+Request handlers queue notifications with notify_order_status() and
+notify_admins(); each one is a Notification row added to the caller's
+session, so it is committed (or rolled back) together with the change it
+announces and the request never waits for SMTP. Subject and body come
+from templates/email/<event>.txt, whose first line is "Subject: ...".
+
+A worker drains the queue over one SMTP connection that is reused for
+every message until the server drops it or MAIL_MAX_MESSAGES_PER_CONNECTION
+is reached:
+
+    python notifications.py worker    # poll every NOTIFY_POLL_INTERVAL seconds
+    python notifications.py send      # one pass, e.g. from cron
+
+Customer emails go out on the next pass. Admin notifications are digested:
+an admin gets one email listing everything queued for them once the
+oldest item is NOTIFY_DIGEST_WINDOW seconds old (or NOTIFY_DIGEST_MAX_ITEMS
+have piled up), instead of one email per contact message. Failed sends
+are retried with exponential backoff, up to NOTIFY_MAX_ATTEMPTS.
+
+For local testing, point MAIL_SERVER/MAIL_PORT at an SMTP sink such as
+`python -m aiosmtpd -n -l localhost:1025`.
+"""
+import time
+import smtplib
+import logging
+from datetime import datetime, timedelta
+from email.message import EmailMessage
+
+import sqlalchemy as sa
+from flask import current_app, render_template
+
+from app import db
+from models import Notification, User
+
+logger = logging.getLogger(__name__)
+
+CUSTOMER_ORDER_EVENTS = {'shipped': 'order_shipped', 'delivered': 'order_delivered'}
+# Errors about one message; anything else means the server is unusable
+MESSAGE_ERRORS = (smtplib.SMTPRecipientsRefused, smtplib.SMTPSenderRefused,
+                  smtplib.SMTPDataError)
+
+
+def _render(event, **context):
+    text = render_template(f'email/{event}.txt', **context)
+    first_line, _, body = text.lstrip().partition('\n')
+    return first_line.removeprefix('Subject:').strip(), body.strip() + '\n'
+
+
+def admin_recipients():
+    configured = current_app.config.get('ADMIN_NOTIFICATION_EMAILS')
+    if configured:
+        return [email.strip() for email in configured.split(',') if email.strip()]
+    return db.session.scalars(sa.select(User.email).where(User.is_admin.is_(True))).all()
+
+
+def notify(event, recipient, digest=False, **context):
+    """Queue one email; the caller commits"""
+    subject, body = _render(event, **context)
+    notification = Notification(event=event, recipient=recipient, subject=subject,
+                                body=body, digest=digest)
+    db.session.add(notification)
+    return notification
+
+
+def notify_admins(event, **context):
+    subject, body = _render(event, **context)
+    db.session.add_all([Notification(event=event, recipient=recipient, subject=subject,
+                                     body=body, digest=True)
+                        for recipient in admin_recipients()])
+
+
+def notify_order_status(order):
+    event = CUSTOMER_ORDER_EVENTS.get(order.status)
+    if event is not None and order.user is not None:
+        notify(event, order.user.email, order=order, user=order.user)
+
+
+class Mailer:
+    """Sends messages over one SMTP connection, reconnecting when the server
+    drops it or after max_messages messages"""
+
+    def __init__(self, host, port, sender, username=None, password=None,
+                 use_tls=False, timeout=10, max_messages=100):
+        self.host = host
+        self.port = port
+        self.sender = sender
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.timeout = timeout
+        self.max_messages = max_messages
+        self._connection = None
+        self._sent = 0
+
+    @classmethod
+    def from_config(cls, config):
+        return cls(config['MAIL_SERVER'], config['MAIL_PORT'], config['MAIL_DEFAULT_SENDER'],
+                   username=config.get('MAIL_USERNAME'), password=config.get('MAIL_PASSWORD'),
+                   use_tls=config.get('MAIL_USE_TLS', False),
+                   timeout=config.get('MAIL_TIMEOUT', 10),
+                   max_messages=config.get('MAIL_MAX_MESSAGES_PER_CONNECTION', 100))
+
+    def _connect(self):
+        connection = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            connection.starttls()
+        if self.username:
+            connection.login(self.username, self.password)
+        self._connection = connection
+        self._sent = 0
+
+    def send(self, recipient, subject, body):
+        message = EmailMessage()
+        message['From'] = self.sender
+        message['To'] = recipient
+        message['Subject'] = subject
+        message.set_content(body)
+
+        if self._connection is not None and self._sent >= self.max_messages:
+            self.close()
+        for attempt in range(2):
+            if self._connection is None:
+                self._connect()
+            try:
+                self._connection.send_message(message)
+                self._sent += 1
+                return
+            except smtplib.SMTPServerDisconnected:
+                # Servers drop idle connections; retry once on a fresh one
+                self._connection = None
+                if attempt:
+                    raise
+
+    def close(self):
+        if self._connection is not None:
+            try:
+                self._connection.quit()
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._connection = None
+
+
+def _failed(notifications, error, now):
+    max_attempts = current_app.config['NOTIFY_MAX_ATTEMPTS']
+    for notification in notifications:
+        notification.attempts = (notification.attempts or 0) + 1
+        notification.last_error = str(error)[:500]
+        if notification.attempts >= max_attempts:
+            notification.status = 'failed'
+        else:
+            notification.send_after = now + timedelta(minutes=2 ** notification.attempts)
+
+
+def _sent(notifications, now):
+    for notification in notifications:
+        notification.status = 'sent'
+        notification.sent_at = now
+        notification.attempts = (notification.attempts or 0) + 1
+
+
+def _due(now, digest):
+    return (sa.select(Notification)
+            .where(Notification.status == 'pending',
+                   Notification.digest.is_(digest),
+                   Notification.send_after <= now)
+            .order_by(Notification.id)
+            .with_for_update(skip_locked=True))
+
+
+def send_immediate(mailer, now):
+    batch = db.session.scalars(_due(now, False)
+                               .limit(current_app.config['NOTIFY_BATCH_SIZE'])).all()
+    sent = 0
+    for notification in batch:
+        try:
+            mailer.send(notification.recipient, notification.subject, notification.body)
+        except MESSAGE_ERRORS as exc:
+            logger.warning('Could not send notification %s: %s', notification.id, exc)
+            _failed([notification], exc, now)
+        except OSError as exc:
+            logger.warning('SMTP server unavailable: %s', exc)
+            _failed([notification], exc, now)
+            break
+        else:
+            _sent([notification], now)
+            sent += 1
+    db.session.commit()
+    return sent
+
+
+def send_digests(mailer, now):
+    window = timedelta(seconds=current_app.config['NOTIFY_DIGEST_WINDOW'])
+    max_items = current_app.config['NOTIFY_DIGEST_MAX_ITEMS']
+    recipients = db.session.scalars(
+        sa.select(Notification.recipient)
+        .where(Notification.status == 'pending', Notification.digest.is_(True),
+               Notification.send_after <= now)
+        .group_by(Notification.recipient)
+        .having(sa.or_(sa.func.min(Notification.created_at) <= now - window,
+                       sa.func.count() >= max_items))).all()
+
+    sent = 0
+    for recipient in recipients:
+        items = db.session.scalars(_due(now, True)
+                                   .where(Notification.recipient == recipient)
+                                   .limit(max_items)).all()
+        if not items:
+            continue  # another worker took them
+        subject, body = _render('admin_digest', items=items)
+        try:
+            mailer.send(recipient, subject, body)
+        except OSError as exc:
+            logger.warning('Could not send digest to %s: %s', recipient, exc)
+            _failed(items, exc, now)
+            db.session.commit()
+            if not isinstance(exc, MESSAGE_ERRORS):
+                break
+        else:
+            _sent(items, now)
+            sent += 1
+            db.session.commit()
+    return sent
+
+
+def send_due(mailer):
+    """One pass over the queue; returns the number of emails sent"""
+    now = datetime.utcnow()
+    return send_immediate(mailer, now) + send_digests(mailer, now)
+
+
+def run_worker():
+    mailer = Mailer.from_config(current_app.config)
+    poll_interval = current_app.config['NOTIFY_POLL_INTERVAL']
+    try:
+        while True:
+            if not send_due(mailer):
+                # Idle (or the server is down): let the server have its connection back
+                mailer.close()
+                time.sleep(poll_interval)
+    finally:
+        mailer.close()
+
+
+def init_notifications(app):
+    app.config.setdefault('MAIL_SERVER', 'localhost')
+    app.config.setdefault('MAIL_PORT', 25)
+    app.config.setdefault('MAIL_DEFAULT_SENDER', 'no-reply@localhost')
+    app.config.setdefault('MAIL_TIMEOUT', 10)
+    app.config.setdefault('MAIL_MAX_MESSAGES_PER_CONNECTION', 100)
+    app.config.setdefault('NOTIFY_POLL_INTERVAL', 10)
+    app.config.setdefault('NOTIFY_BATCH_SIZE', 100)
+    app.config.setdefault('NOTIFY_DIGEST_WINDOW', 600)
+    app.config.setdefault('NOTIFY_DIGEST_MAX_ITEMS', 200)
+    app.config.setdefault('NOTIFY_MAX_ATTEMPTS', 5)
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    command = sys.argv[1] if len(sys.argv) > 1 else None
+    if command not in ('worker', 'send'):
+        sys.exit('usage: python notifications.py worker|send')
+    with app.app_context():
+        if command == 'worker':
+            run_worker()
+        else:
+            mailer = Mailer.from_config(app.config)
+            try:
+                print(f'Sent {send_due(mailer)} notifications')
+            finally:
+                mailer.close()
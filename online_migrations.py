@@ -0,0 +1,104 @@
+"""Helpers for schema migrations that run against a live database.
+
+`flask db upgrade` is the only thing that changes the schema: the app no
+longer calls create_all() or ALTERs tables when it starts. migrations/env.py
+holds migration_lock() for the whole run, so when several instances run
+the upgrade at once (every deploy starts it), one applies the pending
+revisions and the others wait, outside any transaction, then find
+nothing left to do.
+
+Revisions that touch large tables use these instead of the plain
+operations:
+
+    create_index(...)  CREATE INDEX CONCURRENTLY on PostgreSQL, outside
+                       the migration transaction, so writes are not blocked
+    drop_index(...)    the same for DROP INDEX
+    backfill(...)      walks a table in primary-key batches; on PostgreSQL
+                       each batch commits on its own, so no lock or
+                       transaction is held for the whole table
+
+On other databases they fall back to the ordinary operations.
+"""
+import time
+import logging
+from contextlib import contextmanager, nullcontext
+
+import sqlalchemy as sa
+from alembic import op
+
+# Arbitrary, but fixed: every process must ask for the same key
+MIGRATION_LOCK_ID = 0x646f6374  # "doct"
+MIGRATION_LOCK_POLL_INTERVAL = 1.0
+BACKFILL_BATCH_SIZE = 1000
+
+logger = logging.getLogger(__name__)
+
+
+@contextmanager
+def migration_lock(connection):
+    """Hold a session-level advisory lock on `connection` (PostgreSQL only)"""
+    if connection.dialect.name != 'postgresql':
+        yield
+        return
+    # Poll instead of blocking in pg_advisory_lock(): a waiting session
+    # would sit in an open transaction, and CREATE INDEX CONCURRENTLY on
+    # the holder waits for every such transaction to finish, so the two
+    # would wait on each other. Each attempt is committed, so nothing is
+    # held while sleeping. Session-level locks outlive the transaction.
+    waiting = False
+    while True:
+        locked = connection.execute(sa.text('SELECT pg_try_advisory_lock(:id)'),
+                                    {'id': MIGRATION_LOCK_ID}).scalar()
+        connection.commit()
+        if locked:
+            break
+        if not waiting:
+            logger.info('Another instance is migrating; waiting for it to finish')
+            waiting = True
+        time.sleep(MIGRATION_LOCK_POLL_INTERVAL)
+    try:
+        yield
+    finally:
+        connection.rollback()
+        connection.execute(sa.text('SELECT pg_advisory_unlock(:id)'), {'id': MIGRATION_LOCK_ID})
+        connection.commit()
+
+
+def _is_postgresql():
+    return op.get_bind().dialect.name == 'postgresql'
+
+
+def create_index(index_name, table_name, columns, **kw):
+    if not _is_postgresql():
+        op.create_index(index_name, table_name, columns, **kw)
+        return
+    with op.get_context().autocommit_block():
+        # A failed concurrent build leaves an invalid index behind
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True,
+                      if_exists=True)
+        op.create_index(index_name, table_name, columns, postgresql_concurrently=True, **kw)
+
+
+def drop_index(index_name, table_name):
+    if not _is_postgresql():
+        op.drop_index(index_name, table_name=table_name)
+        return
+    with op.get_context().autocommit_block():
+        op.drop_index(index_name, table_name=table_name, postgresql_concurrently=True,
+                      if_exists=True)
+
+
+def backfill(table, update, batch_size=BACKFILL_BATCH_SIZE):
+    """Call update(connection, rows) for every row of `table` (a sa.table()
+    with an integer `id` column), batch_size rows at a time in id order"""
+    in_batches = op.get_context().autocommit_block() if _is_postgresql() else nullcontext()
+    last_id = 0
+    with in_batches:
+        bind = op.get_bind()  # the autocommit connection inside the block
+        while True:
+            rows = bind.execute(sa.select(table).where(table.c.id > last_id)
+                                .order_by(table.c.id).limit(batch_size)).all()
+            if not rows:
+                return
+            update(bind, rows)
+            last_id = rows[-1].id
@@ -0,0 +1,158 @@
+"""Read model for the customer order history page.
+
+`order_summary` holds one row per order, live or archived: totals and
+states plus the item count and the first PREVIEW_ITEMS lines (product
+name, image and quantity). Order items do not record the product's name
+or image, so these are copied from the product when the summary is
+built: at checkout, or whenever the order's items change. A rebuild
+takes the products' current names and images, and lines whose product
+has been deleted show as "Removed product". The orders page pages
+through it with one query on (user_id, created_at) instead of loading
+orders, their items and each item's product.
+
+Rows are kept current in the transaction that changes the order: an
+after_flush listener rebuilds the summary of any order whose items were
+added, changed or removed (checkout), copies status, payment status and
+total changes across (transition() and admin edits), and archive.py
+marks orders it moves as archived.
+
+To rebuild every summary from the order tables (previews then show the
+products as they are now):
+    python order_history.py rebuild
+"""
+import json
+
+import sqlalchemy as sa
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from models import ArchivedOrder, ArchivedOrderItem, Order, OrderItem, OrderSummary, Product
+
+PREVIEW_ITEMS = 3
+REBUILD_BATCH_SIZE = 500
+SUMMARY_FIELDS = ('total_amount', 'status', 'payment_status')
+
+
+def summary_rows(connection, order_ids, archived=False):
+    """Fresh order_summary rows for `order_ids` from the live (or archive) tables"""
+    orders = (ArchivedOrder if archived else Order).__table__
+    items = (ArchivedOrderItem if archived else OrderItem).__table__
+    products = Product.__table__
+    rows = {}
+    for order in connection.execute(
+            sa.select(orders.c.id, orders.c.user_id, orders.c.created_at,
+                      *(orders.c[field] for field in SUMMARY_FIELDS))
+            .where(orders.c.id.in_(order_ids))):
+        rows[order.id] = {'order_id': order.id, 'user_id': order.user_id,
+                          'created_at': order.created_at, 'item_count': 0, 'line_count': 0,
+                          'preview': [], 'is_archived': archived,
+                          **{field: order._mapping[field] for field in SUMMARY_FIELDS}}
+    if not rows:
+        return []
+
+    for item in connection.execute(
+            sa.select(items.c.order_id, items.c.quantity, products.c.name, products.c.image_url)
+            .outerjoin(products, items.c.product_id == products.c.id)
+            .where(items.c.order_id.in_(list(rows)))
+            .order_by(items.c.order_id, items.c.id)):
+        row = rows[item.order_id]
+        row['item_count'] += item.quantity
+        row['line_count'] += 1
+        if len(row['preview']) < PREVIEW_ITEMS:
+            row['preview'].append({'name': item.name or 'Removed product',
+                                   'image_url': item.image_url, 'quantity': item.quantity})
+    for row in rows.values():
+        row['preview'] = json.dumps(row['preview'])
+    return list(rows.values())
+
+
+def rebuild_summaries(connection, order_ids, archived=False):
+    order_ids = list(order_ids)
+    summaries = OrderSummary.__table__
+    # Only replace summaries of the same kind: an archived order's summary
+    # is all the history page has left of it, so a live order claiming its
+    # id fails on the primary key instead of silently taking its place
+    connection.execute(sa.delete(summaries).where(summaries.c.order_id.in_(order_ids),
+                                                  summaries.c.is_archived.is_(archived)))
+    rows = summary_rows(connection, order_ids, archived)
+    if rows:
+        connection.execute(sa.insert(summaries), rows)
+
+
+def mark_archived(connection, order_ids):
+    """Flag summaries of orders archive.py is moving with Core statements"""
+    summaries = OrderSummary.__table__
+    connection.execute(sa.update(summaries).where(summaries.c.order_id.in_(order_ids))
+                       .values(is_archived=True))
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_summaries(session, flush_context):
+    rebuild, deleted, changed = set(), set(), []
+    for obj in session.new:
+        if isinstance(obj, Order):
+            rebuild.add(obj.id)
+        elif isinstance(obj, OrderItem):
+            rebuild.add(obj.order_id)
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            if any(inspect(obj).attrs[field].history.has_changes() for field in SUMMARY_FIELDS):
+                changed.append(obj)
+        elif isinstance(obj, OrderItem) and session.is_modified(obj):
+            rebuild.add(obj.order_id)
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            deleted.add(obj.id)
+        elif isinstance(obj, OrderItem):
+            rebuild.add(obj.order_id)
+    if not (rebuild or deleted or changed):
+        return
+
+    connection = session.connection()
+    summaries = OrderSummary.__table__
+    if deleted:
+        connection.execute(sa.delete(summaries).where(summaries.c.order_id.in_(deleted),
+                                                      summaries.c.is_archived.is_(False)))
+    rebuild -= deleted
+    if rebuild:
+        rebuild_summaries(connection, rebuild)
+    for order in changed:
+        if order.id not in rebuild:
+            connection.execute(sa.update(summaries).where(summaries.c.order_id == order.id)
+                               .values({field: getattr(order, field) for field in SUMMARY_FIELDS}))
+
+
+def user_order_page(user_id, page=1, per_page=10):
+    """A page of a user's order summaries, newest first"""
+    return db.paginate(sa.select(OrderSummary)
+                       .where(OrderSummary.user_id == user_id)
+                       .order_by(OrderSummary.created_at.desc(), OrderSummary.order_id.desc()),
+                       page=page, per_page=per_page, error_out=False)
+
+
+def rebuild_all(batch_size=REBUILD_BATCH_SIZE):
+    """Rebuild every summary from the live and archive tables; returns the count"""
+    rebuilt = 0
+    for model, archived in ((Order, False), (ArchivedOrder, True)):
+        last_id = 0
+        while True:
+            ids = db.session.scalars(sa.select(model.id).where(model.id > last_id)
+                                     .order_by(model.id).limit(batch_size)).all()
+            if not ids:
+                break
+            rebuild_summaries(db.session.connection(), ids, archived)
+            db.session.commit()
+            rebuilt += len(ids)
+            last_id = ids[-1]
+    return rebuilt
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if sys.argv[1:] != ['rebuild']:
+        sys.exit('usage: python order_history.py rebuild')
+    with app.app_context():
+        print(f'Rebuilt {rebuild_all()} order summaries')
@@ -0,0 +1,202 @@
+"""Order lifecycle: allowed status changes, event log and status counts.
+
+An order has two state fields, `status` and `payment_status`. Changes go
+through transition(), which checks them against the tables below; a
+before_flush listener applies the same check to any other assignment, so
+an invalid move fails before it reaches the database.
+
+Every flush that creates an order or changes one of its fields appends a
+row per change to `order_event` and adjusts `order_status_count` in the
+same transaction, so admin counts read one small table instead of running
+COUNT(*) over `order`. The counts cover the live `order` table;
+archive.py takes archived orders out of them as it moves them.
+
+To rebuild the counts from the order table:
+    python order_lifecycle.py recount
+"""
+import sys
+
+import sqlalchemy as sa
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from db_utils import add_to_rollup
+from models import Order, OrderEvent, OrderStatusCount
+
+STATUS_TRANSITIONS = {
+    'pending': ('pending_verification', 'confirmed', 'cancelled'),
+    'pending_verification': ('pending', 'confirmed', 'cancelled'),
+    'confirmed': ('shipped', 'cancelled'),
+    'shipped': ('delivered', ),
+    'delivered': (),
+    'cancelled': (),
+}
+PAYMENT_TRANSITIONS = {
+    'pending': ('pending_verification', 'paid', 'failed'),
+    'pending_verification': ('pending', 'paid', 'failed'),
+    'failed': ('pending', 'pending_verification', 'paid'),
+    'paid': ('refunded', ),
+    'refunded': (),
+}
+TRANSITIONS = {'status': STATUS_TRANSITIONS, 'payment_status': PAYMENT_TRANSITIONS}
+FIELD_LABELS = {'status': 'order status', 'payment_status': 'payment status'}
+
+
+class InvalidTransition(ValueError):
+    pass
+
+
+def allowed_next(field, current):
+    return TRANSITIONS[field].get(current, ())
+
+
+def can_transition(field, current, new):
+    return new in TRANSITIONS[field] and (new == current or new in allowed_next(field, current))
+
+
+def check_transition(field, current, new):
+    if not can_transition(field, current, new):
+        raise InvalidTransition(f'Cannot change {FIELD_LABELS[field]} from '
+                                f'"{current}" to "{new}".')
+
+
+def transition(order, status=None, payment_status=None, actor_id=None, note=None):
+    """Validate and apply status changes; returns the fields that changed.
+    Raises InvalidTransition without touching the order if any is invalid."""
+    changes = {field: value for field, value in (('status', status),
+                                                 ('payment_status', payment_status))
+               if value is not None and value != getattr(order, field)}
+    for field, value in changes.items():
+        check_transition(field, getattr(order, field), value)
+    for field, value in changes.items():
+        setattr(order, field, value)
+    if changes:
+        # Picked up by the after_flush listener for the event rows
+        order._event_context = (actor_id, note)
+    return list(changes)
+
+
+def _changed(obj, field):
+    """(old, new) if `field` changed in the pending flush, else None"""
+    history = inspect(obj).attrs[field].history
+    if history.added and history.deleted and history.added[0] != history.deleted[0]:
+        return history.deleted[0], history.added[0]
+    return None
+
+
+@event.listens_for(Session, 'before_flush')
+def _validate_transitions(session, flush_context, instances):
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            for field in TRANSITIONS:
+                change = _changed(obj, field)
+                if change:
+                    check_transition(field, *change)
+
+
+def adjust_counts(connection, deltas):
+    """Add {(field, value): delta} to the status counts"""
+    for (field, value), delta in deltas.items():
+        if delta and value is not None:
+            add_to_rollup(connection, OrderStatusCount, {'field': field, 'value': value},
+                          {'count': delta})
+
+
+def remove_from_counts(connection, order_ids):
+    """Take orders about to be deleted with Core statements out of the counts"""
+    deltas = {}
+    for field in TRANSITIONS:
+        column = Order.__table__.c[field]
+        for value, count in connection.execute(
+                sa.select(column, sa.func.count()).where(Order.__table__.c.id.in_(order_ids))
+                .group_by(column)):
+            deltas[(field, value)] = -count
+    adjust_counts(connection, deltas)
+
+
+@event.listens_for(Session, 'after_flush')
+def _record_changes(session, flush_context):
+    events, deltas = [], {}
+
+    def record(order, field, old, new):
+        actor_id, note = vars(order).get('_event_context', (None, None))
+        events.append({'order_id': order.id, 'field': field, 'from_value': old,
+                       'to_value': new, 'actor_id': actor_id, 'note': note})
+        deltas[(field, old)] = deltas.get((field, old), 0) - 1
+        deltas[(field, new)] = deltas.get((field, new), 0) + 1
+
+    for obj in session.new:
+        if isinstance(obj, Order):
+            for field in TRANSITIONS:
+                record(obj, field, None, getattr(obj, field))
+            vars(obj).pop('_event_context', None)
+
+    for obj in session.dirty:
+        if isinstance(obj, Order):
+            for field in TRANSITIONS:
+                change = _changed(obj, field)
+                if change:
+                    record(obj, field, *change)
+            vars(obj).pop('_event_context', None)
+
+    for obj in session.deleted:
+        if isinstance(obj, Order):
+            for field in TRANSITIONS:
+                history = inspect(obj).attrs[field].history
+                value = history.deleted[0] if history.deleted else getattr(obj, field)
+                deltas[(field, value)] = deltas.get((field, value), 0) - 1
+
+    if events or deltas:
+        connection = session.connection()
+        if events:
+            connection.execute(sa.insert(OrderEvent.__table__), events)
+        adjust_counts(connection, deltas)
+
+
+# --- Reads ---
+
+def status_counts(field='status'):
+    """{value: number of live orders} for `status` or `payment_status`"""
+    return dict(db.session.execute(
+        sa.select(OrderStatusCount.value, OrderStatusCount.count)
+        .where(OrderStatusCount.field == field, OrderStatusCount.count > 0)).all())
+
+
+def order_events(order_id):
+    return db.session.scalars(sa.select(OrderEvent).where(OrderEvent.order_id == order_id)
+                              .order_by(OrderEvent.id)).all()
+
+
+def recent_events(field, to_value, limit=20):
+    """Latest changes of `field` to `to_value`, newest first"""
+    return db.session.scalars(sa.select(OrderEvent)
+                              .where(OrderEvent.field == field, OrderEvent.to_value == to_value)
+                              .order_by(OrderEvent.id.desc())
+                              .limit(limit)).all()
+
+
+def recount():
+    """Rebuild the status counts from the order table"""
+    connection = db.session.connection()
+    connection.execute(sa.delete(OrderStatusCount.__table__))
+    rows = []
+    for field in TRANSITIONS:
+        column = Order.__table__.c[field]
+        for value, count in connection.execute(
+                sa.select(column, sa.func.count()).where(column.isnot(None)).group_by(column)):
+            rows.append({'field': field, 'value': value, 'count': count})
+    if rows:
+        connection.execute(sa.insert(OrderStatusCount.__table__), rows)
+    db.session.commit()
+    return rows
+
+
+if __name__ == '__main__':
+    from app import app
+
+    if sys.argv[1:] != ['recount']:
+        sys.exit('usage: python order_lifecycle.py recount')
+    with app.app_context():
+        for row in recount():
+            print(f"{row['field']:<16}{row['value']:<22}{row['count']}")
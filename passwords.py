@@ -0,0 +1,97 @@
+"""Password hashing with a configurable policy and a bounded worker pool.
+
+PASSWORD_HASH_METHOD takes any werkzeug method string, e.g.
+"scrypt:32768:8:1" (the werkzeug default) or "pbkdf2:sha256:600000".
+Hashes stored under an older policy are upgraded on the next successful
+login. Hashing runs on a small dedicated pool so a burst of logins queues
+there instead of occupying every request thread; callers that cannot get
+a slot within PASSWORD_HASH_QUEUE_TIMEOUT get PasswordHasherBusy.
+"""
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from flask import current_app
+from werkzeug.security import check_password_hash, generate_password_hash
+
+DEFAULT_METHOD = 'scrypt:32768:8:1'
+
+
+class PasswordHasherBusy(Exception):
+    """Raised when the hashing pool stays saturated past the queue timeout"""
+
+
+def _gevent_threadpool():
+    # Under gevent, ThreadPoolExecutor threads are greenlets and the hash
+    # would block the hub; use gevent's real OS thread pool instead
+    try:
+        from gevent import monkey, get_hub
+    except ImportError:
+        return None
+    if monkey.is_module_patched('threading'):
+        return get_hub().threadpool
+    return None
+
+
+class PasswordHasher:
+
+    def __init__(self, method=DEFAULT_METHOD, workers=2, max_queue=32, queue_timeout=5.0):
+        self.method = method
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(workers + max_queue)
+        self._executor = ThreadPoolExecutor(max_workers=workers,
+                                            thread_name_prefix='password-hash')
+        # werkzeug fills in default parameters, so learn the full prefix
+        # ("scrypt" -> "scrypt:32768:8:1") from one throwaway hash
+        self.method_prefix = generate_password_hash('', method).split('$', 1)[0]
+
+    def _run(self, fn, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy()
+        try:
+            threadpool = _gevent_threadpool()
+            if threadpool is not None:
+                return threadpool.apply(fn, args)
+            return self._executor.submit(fn, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        return self._run(generate_password_hash, password, self.method)
+
+    def verify(self, stored_hash, password):
+        if not stored_hash or password is None:
+            return False
+        return self._run(check_password_hash, stored_hash, password)
+
+    def needs_rehash(self, stored_hash):
+        return stored_hash.split('$', 1)[0] != self.method_prefix
+
+    def verify_and_update(self, user, password):
+        """Check a user's password, upgrading the stored hash to the current
+        policy on success. The caller commits the session."""
+        if not self.verify(user.password_hash, password):
+            return False
+        if self.needs_rehash(user.password_hash):
+            user.password_hash = self.hash(password)
+        return True
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
+
+
+def hash_password(password):
+    return get_password_hasher().hash(password)
+
+
+def verify_password(user, password):
+    return get_password_hasher().verify_and_update(user, password)
+
+
+def init_passwords(app):
+    app.extensions['password_hasher'] = PasswordHasher(
+        method=app.config.get('PASSWORD_HASH_METHOD', DEFAULT_METHOD),
+        workers=app.config.get('PASSWORD_HASH_WORKERS', 2),
+        max_queue=app.config.get('PASSWORD_HASH_MAX_QUEUE', 32),
+        queue_timeout=app.config.get('PASSWORD_HASH_QUEUE_TIMEOUT', 5.0))
+
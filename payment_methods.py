@@ -0,0 +1,130 @@
+"""Cached registry of payment methods with parsed configurations.
+
+Checkout and the payment page read payment methods on every request, but
+they change only when an admin edits them. All methods are loaded at
+once, parsing each `configuration` JSON column into a typed, validated
+config object, and kept in the shared cache (cache.py) as immutable
+PaymentOption snapshots; committing a PaymentMethod change invalidates
+them in every worker.
+
+A method whose stored configuration does not validate stays visible to
+existing orders but is left out of active(), so checkout never offers a
+method that cannot be paid with.
+"""
+import json
+import logging
+from dataclasses import dataclass
+
+from app import db
+from cache import memoize
+from models import PaymentMethod
+
+logger = logging.getLogger(__name__)
+
+CRYPTO_ADDRESS_KEYS = (('btc_address', 'Bitcoin'), ('eth_address', 'Ethereum'),
+                       ('usdt_address', 'USDT'))
+
+
+class InvalidPaymentConfig(ValueError):
+    pass
+
+
+@dataclass(frozen=True)
+class GatewayConfig:
+    public_key: str = ''
+    secret_key: str = ''
+
+
+@dataclass(frozen=True)
+class BankTransferConfig:
+    account_name: str
+    account_number: str
+    bank_name: str
+
+
+@dataclass(frozen=True)
+class CryptoConfig:
+    wallets: tuple  # ((currency label, address), ...)
+
+
+@dataclass(frozen=True)
+class PaymentOption:
+    id: int
+    name: str
+    method_type: str
+    is_active: bool
+    instructions: str
+    config: object  # one of the *Config classes, None if invalid
+
+    @property
+    def usable(self):
+        return self.is_active and self.config is not None
+
+
+def _string(data, key, required=False):
+    value = data.get(key, '')
+    if value is None:
+        value = ''
+    if not isinstance(value, (str, int)):
+        raise InvalidPaymentConfig(f'"{key}" must be text.')
+    value = str(value).strip()
+    if required and not value:
+        raise InvalidPaymentConfig(f'"{key}" is required.')
+    return value
+
+
+def parse_configuration(method_type, text):
+    """Typed config for a method's JSON configuration; raises
+    InvalidPaymentConfig with a message fit for the admin form"""
+    try:
+        data = json.loads(text) if text and text.strip() else {}
+    except json.JSONDecodeError as exc:
+        raise InvalidPaymentConfig(f'Configuration is not valid JSON: {exc.msg}.')
+    if not isinstance(data, dict):
+        raise InvalidPaymentConfig('Configuration must be a JSON object.')
+
+    if method_type == 'gateway':
+        return GatewayConfig(public_key=_string(data, 'public_key'),
+                             secret_key=_string(data, 'secret_key'))
+    if method_type == 'manual':
+        return BankTransferConfig(account_name=_string(data, 'account_name', required=True),
+                                  account_number=_string(data, 'account_number', required=True),
+                                  bank_name=_string(data, 'bank_name', required=True))
+    if method_type == 'crypto':
+        wallets = [(label, _string(data, key)) for key, label in CRYPTO_ADDRESS_KEYS]
+        # The admin form's documented shape: {"wallet_address": ..., "currency": "BTC"}
+        if data.get('wallet_address'):
+            wallets.append((_string(data, 'currency') or 'Wallet', _string(data, 'wallet_address')))
+        wallets = tuple((label, address) for label, address in wallets if address)
+        if not wallets:
+            raise InvalidPaymentConfig('Crypto payment needs at least one wallet address.')
+        return CryptoConfig(wallets=wallets)
+    raise InvalidPaymentConfig(f'Unknown payment method type "{method_type}".')
+
+
+def _option(method):
+    try:
+        config = parse_configuration(method.method_type, method.configuration)
+    except InvalidPaymentConfig as exc:
+        if method.is_active:
+            logger.warning('Payment method %s (%s) is unusable: %s', method.id, method.name, exc)
+        config = None
+    return PaymentOption(id=method.id, name=method.name, method_type=method.method_type,
+                         is_active=bool(method.is_active), instructions=method.instructions or '',
+                         config=config)
+
+
+@memoize('payment_methods', tags=('payment_methods',))
+def _payment_options():
+    methods = db.session.scalars(db.select(PaymentMethod).order_by(PaymentMethod.id)).all()
+    options = [_option(method) for method in methods]
+    return ({option.id: option for option in options},
+            tuple(option for option in options if option.usable))
+
+
+def active_payment_methods():
+    return _payment_options()[1]
+
+
+def get_payment_method(method_id):
+    return _payment_options()[0].get(method_id)
@@ -0,0 +1,220 @@
+"""Opt-in sampling profiler for production requests.
+
+With PROFILER_SAMPLE_RATE > 0 (e.g. 0.01 for 1% of requests), the WSGI
+middleware picks requests at random and, while each one runs, a single
+background thread snapshots its Python stack every PROFILER_INTERVAL_MS.
+Unsampled requests only pay for one random() call, and the sampler thread
+sleeps whenever no sampled request is in flight.
+
+Samples are aggregated per endpoint and written to PROFILER_DIR as
+collapsed stacks ("frame;frame;frame count" lines, one file per endpoint
+and worker process), ready for flamegraph.pl or speedscope. The admin page
+/admin/profiling merges the files from all workers and lists the top
+functions by inclusive samples per blueprint.
+
+Stacks are attributed by OS thread, so this is meant for the sync and
+gthread workers; under gevent, greenlets share a thread and the profiler
+stays off.
+"""
+import os
+import sys
+import time
+import random
+import logging
+import threading
+from collections import Counter, defaultdict
+
+from werkzeug.exceptions import HTTPException
+
+logger = logging.getLogger(__name__)
+
+FILE_SUFFIX = '.collapsed'
+DISPATCH_FRAMES = ('profiling.', 'werkzeug.middleware.', 'flask.app.', 'flask_login.utils.')
+
+
+def _frame_label(frame):
+    code = frame.f_code
+    module = frame.f_globals.get('__name__', '?')
+    return f"{module}.{getattr(code, 'co_qualname', code.co_name)}"
+
+
+class Sampler:
+    """Background thread that snapshots the stacks of registered threads"""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}  # thread id -> (root code object, Counter of stacks)
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def _ensure_started(self):
+        if self._thread is None or not self._thread.is_alive():
+            # Started lazily so each forked worker gets its own thread
+            self._thread = threading.Thread(target=self._run, name='profiler-sampler',
+                                            daemon=True)
+            self._thread.start()
+
+    def start(self, root_code):
+        stacks = Counter()
+        with self._lock:
+            self._ensure_started()
+            self._active[threading.get_ident()] = (root_code, stacks)
+        self._wakeup.set()
+        return stacks
+
+    def stop(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    def _run(self):
+        while True:
+            self._wakeup.wait()
+            # Sample under the lock so stop() never returns mid-sample
+            with self._lock:
+                if not self._active:
+                    self._wakeup.clear()
+                    continue
+                frames = sys._current_frames()
+                for thread_id, (root_code, stacks) in self._active.items():
+                    frame = frames.get(thread_id)
+                    labels = []
+                    while frame is not None:
+                        labels.append(_frame_label(frame))
+                        if frame.f_code is root_code:
+                            break
+                        frame = frame.f_back
+                    if labels:
+                        stacks[';'.join(reversed(labels))] += 1
+                del frames
+            time.sleep(self.interval)
+
+
+class ProfilerMiddleware:
+
+    def __init__(self, wsgi_app, flask_app, sample_rate, interval_ms=5, output_dir='profiles'):
+        self.wsgi_app = wsgi_app
+        self.flask_app = flask_app
+        self.sample_rate = sample_rate
+        self.output_dir = output_dir
+        self.sampler = Sampler(interval_ms / 1000.0)
+        self._stacks = defaultdict(Counter)
+        self._lock = threading.Lock()
+        os.makedirs(output_dir, exist_ok=True)
+
+    def __call__(self, environ, start_response):
+        if random.random() >= self.sample_rate:
+            return self.wsgi_app(environ, start_response)
+
+        stacks = self.sampler.start(self._profiled_call.__code__)
+        try:
+            return self._profiled_call(environ, start_response)
+        finally:
+            self.sampler.stop()
+            if stacks:
+                self._record(self._endpoint(environ), stacks)
+
+    def _profiled_call(self, environ, start_response):
+        # Sampled stacks are cut at this frame so server internals stay out
+        return self.wsgi_app(environ, start_response)
+
+    def _endpoint(self, environ):
+        try:
+            endpoint, _ = self.flask_app.url_map.bind_to_environ(environ).match()
+            return endpoint
+        except HTTPException:
+            return 'unmatched'
+
+    def _record(self, endpoint, stacks):
+        with self._lock:
+            totals = self._stacks[endpoint]
+            totals.update(stacks)
+            lines = [f'{stack} {count}\n' for stack, count in totals.items()]
+        path = os.path.join(self.output_dir, f'{endpoint}.{os.getpid()}{FILE_SUFFIX}')
+        try:
+            tmp = f'{path}.tmp'
+            with open(tmp, 'w') as f:
+                f.writelines(lines)
+            os.replace(tmp, path)
+        except OSError:
+            logger.exception('Could not write profile for %s', endpoint)
+
+
+# --- Reading profiles back (admin page) ---
+
+def load_profiles(output_dir):
+    """{endpoint: Counter(stack -> samples)} merged across worker files"""
+    profiles = defaultdict(Counter)
+    if not os.path.isdir(output_dir):
+        return profiles
+    for name in os.listdir(output_dir):
+        if not name.endswith(FILE_SUFFIX):
+            continue
+        endpoint = name[:-len(FILE_SUFFIX)].rsplit('.', 1)[0]
+        with open(os.path.join(output_dir, name)) as f:
+            for line in f:
+                stack, _, count = line.rstrip('\n').rpartition(' ')
+                if stack and count.isdigit():
+                    profiles[endpoint][stack] += int(count)
+    return profiles
+
+
+def top_functions(stacks, limit=15):
+    """[(function, inclusive samples, self samples)] by inclusive samples,
+    leaving out the dispatch frames present in every request"""
+    inclusive, own = Counter(), Counter()
+    for stack, count in stacks.items():
+        frames = stack.split(';')
+        for frame in set(frames):
+            if not frame.startswith(DISPATCH_FRAMES):
+                inclusive[frame] += count
+        own[frames[-1]] += count
+    return [(frame, count, own[frame]) for frame, count in inclusive.most_common(limit)]
+
+
+def blueprint_summaries(output_dir, limit=15):
+    by_blueprint = defaultdict(Counter)
+    endpoints = defaultdict(dict)
+    for endpoint, stacks in load_profiles(output_dir).items():
+        blueprint = endpoint.split('.', 1)[0] if '.' in endpoint else 'app'
+        by_blueprint[blueprint].update(stacks)
+        endpoints[blueprint][endpoint] = sum(stacks.values())
+
+    summaries = []
+    for blueprint, stacks in sorted(by_blueprint.items()):
+        total = sum(stacks.values())
+        summaries.append({
+            'blueprint': blueprint,
+            'samples': total,
+            'endpoints': sorted(endpoints[blueprint].items(), key=lambda e: -e[1]),
+            'functions': [(frame, inclusive, own, inclusive / total)
+                          for frame, inclusive, own in top_functions(stacks, limit)],
+        })
+    return summaries
+
+
+def collapsed_profile(output_dir, endpoint):
+    stacks = load_profiles(output_dir).get(endpoint)
+    if not stacks:
+        return None
+    return ''.join(f'{stack} {count}\n' for stack, count in stacks.items())
+
+
+def init_profiling(app):
+    app.config.setdefault('PROFILER_SAMPLE_RATE', 0.0)
+    app.config.setdefault('PROFILER_INTERVAL_MS', 5)
+    app.config.setdefault('PROFILER_DIR', os.path.join(app.root_path, 'profiles'))
+
+    rate = app.config['PROFILER_SAMPLE_RATE']
+    if rate <= 0:
+        return
+    try:
+        from gevent import monkey
+        if monkey.is_module_patched('threading'):
+            logger.warning('Profiler disabled: stacks cannot be attributed under gevent')
+            return
+    except ImportError:
+        pass
+    app.wsgi_app = ProfilerMiddleware(app.wsgi_app, app, rate,
+                                      interval_ms=app.config['PROFILER_INTERVAL_MS'],
+                                      output_dir=app.config['PROFILER_DIR'])
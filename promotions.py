@@ -0,0 +1,203 @@
+"""Scheduled promotions, applied ahead of time to Product.effective_price.
+
+A promotion takes a percentage or a fixed amount off one product (scope
+'product') or every product in a category (scope 'category') from
+starts_at until ends_at. When several are live for a product the one
+giving the lowest price wins; they do not stack, and no price goes below
+zero. Product.price stays the list price the admin sets.
+
+Rules are evaluated only when something changes, never per request, so
+the cart, checkout and listings just read effective_price:
+  - inserting a product or changing its price or category sets its
+    effective_price in the same flush (mapper events below)
+  - the admin promotion handlers call reprice() after committing
+  - PromotionScheduler, a per-process thread started on the first
+    request, calls reprice() when a promotion starts or ends; it looks
+    for new start and end times every PROMOTION_CHECK_INTERVAL seconds
+
+reprice() only rewrites products whose price changes, so several
+workers running it for the same boundary repeat a little reading and
+no writing. `python promotions.py reprice` runs it once.
+"""
+import time
+import random
+import logging
+import threading
+from collections import defaultdict
+from datetime import datetime
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from app import db
+from cache import invalidate_on_commit
+from models import Product, Promotion
+
+logger = logging.getLogger(__name__)
+
+SCOPES = ('product', 'category')
+KINDS = ('percent', 'fixed')
+REPRICE_BATCH_SIZE = 1000
+
+RULE_COLUMNS = (Promotion.id, Promotion.scope, Promotion.product_id, Promotion.category,
+                Promotion.kind, Promotion.amount)
+
+
+def live(now):
+    return sa.and_(Promotion.is_active.is_(True), Promotion.starts_at <= now,
+                   sa.or_(Promotion.ends_at.is_(None), Promotion.ends_at > now))
+
+
+def discounted_price(price, kind, amount):
+    if kind == 'percent':
+        price = price * (100 - amount) / 100
+    else:
+        price = price - amount
+    return round(max(price, 0), 2)
+
+
+def best_price(price, rules):
+    """(effective price, promotion id or None) for a list price"""
+    best, promotion_id = price, None
+    for rule in rules:
+        candidate = discounted_price(price, rule.kind, rule.amount)
+        if candidate < best:
+            best, promotion_id = candidate, rule.id
+    return best, promotion_id
+
+
+class LiveRules:
+    """Promotions live at one moment, looked up by product and category"""
+
+    def __init__(self, rows):
+        self.by_product = defaultdict(list)
+        self.by_category = defaultdict(list)
+        for row in rows:
+            if row.scope == 'product':
+                self.by_product[row.product_id].append(row)
+            else:
+                self.by_category[row.category].append(row)
+
+    def for_product(self, product_id, category):
+        return self.by_product.get(product_id, []) + self.by_category.get(category, [])
+
+
+def live_rules(now=None):
+    now = now or datetime.utcnow()
+    return LiveRules(db.session.execute(sa.select(*RULE_COLUMNS).where(live(now))).all())
+
+
+def reprice(now=None, batch_size=REPRICE_BATCH_SIZE):
+    """Bring effective_price in line with the promotions live at `now`;
+    returns the number of products changed"""
+    now = now or datetime.utcnow()
+    rules = live_rules(now)
+    # Products a live promotion covers, plus those still carrying one that
+    # may have ended; everything else is already at its list price
+    candidates = sa.or_(Product.promotion_id.isnot(None),
+                        Product.effective_price != Product.price,
+                        Product.id.in_(list(rules.by_product)),
+                        Product.category.in_(list(rules.by_category)))
+    changed = 0
+    last_id = 0
+    while True:
+        rows = db.session.execute(
+            sa.select(Product.id, Product.price, Product.category, Product.effective_price,
+                      Product.promotion_id)
+            .where(candidates, Product.id > last_id)
+            .order_by(Product.id).limit(batch_size)).all()
+        if not rows:
+            return changed
+        updates = []
+        for product_id, price, category, effective_price, promotion_id in rows:
+            new_price, new_promotion_id = best_price(price, rules.for_product(product_id, category))
+            if (new_price, new_promotion_id) != (effective_price, promotion_id):
+                updates.append({'id': product_id, 'effective_price': new_price,
+                                'promotion_id': new_promotion_id})
+        if updates:
+            db.session.execute(sa.update(Product), updates)
+            invalidate_on_commit(db.session, 'products')
+            db.session.commit()
+            changed += len(updates)
+        last_id = rows[-1].id
+
+
+def next_boundary(now):
+    """Earliest start or end time after `now` of an active promotion"""
+    times = [db.session.scalar(sa.select(sa.func.min(column))
+                               .where(Promotion.is_active.is_(True), column > now))
+             for column in (Promotion.starts_at, Promotion.ends_at)]
+    times = [moment for moment in times if moment is not None]
+    return min(times) if times else None
+
+
+@event.listens_for(Product, 'before_insert')
+@event.listens_for(Product, 'before_update')
+def _apply_promotions(mapper, connection, product):
+    state = sa.inspect(product)
+    if (state.persistent and not state.attrs.price.history.has_changes()
+            and not state.attrs.category.history.has_changes()):
+        return
+    covers = sa.or_(sa.and_(Promotion.scope == 'product', Promotion.product_id == product.id),
+                    sa.and_(Promotion.scope == 'category', Promotion.category == product.category))
+    rules = connection.execute(sa.select(*RULE_COLUMNS)
+                               .where(live(datetime.utcnow()), covers)).all()
+    product.effective_price, product.promotion_id = best_price(product.price, rules)
+
+
+class PromotionScheduler:
+    """Per-process thread repricing products as promotions start and end;
+    started on the first request so each forked worker gets its own"""
+
+    def __init__(self, app, interval):
+        self.app = app
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='promotion-scheduler',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        # Catch up on boundaries passed while no worker was running
+        due = datetime.utcnow()
+        while True:
+            wait = self.interval
+            try:
+                with self.app.app_context():
+                    now = datetime.utcnow()
+                    if due is not None and due <= now:
+                        changed = reprice(now)
+                        if changed:
+                            logger.info('Repriced %d products', changed)
+                    due = next_boundary(now)
+                if due is not None:
+                    wait = min(wait, (due - datetime.utcnow()).total_seconds())
+            except Exception:
+                logger.exception('Promotion repricing failed; retrying in %ss', self.interval)
+                due = datetime.utcnow()
+            # A little jitter so workers do not all reprice at the same instant
+            time.sleep(max(wait, 0) + random.uniform(0, 1))
+
+
+def init_promotions(app):
+    app.config.setdefault('PROMOTION_CHECK_INTERVAL', 60)
+    if app.config['PROMOTION_CHECK_INTERVAL'] > 0:
+        scheduler = PromotionScheduler(app, app.config['PROMOTION_CHECK_INTERVAL'])
+        app.before_request(scheduler.ensure_started)
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if sys.argv[1:] != ['reprice']:
+        sys.exit('usage: python promotions.py reprice')
+    with app.app_context():
+        print(f'Repriced {reprice()} products')
@@ -0,0 +1,169 @@
+"""Token-bucket rate limiting for abuse-prone endpoints.
+
+Limits are written as "<count>/<second|minute|hour|day>": the bucket holds
+`count` tokens and refills at count/period, so short bursts are allowed
+while the sustained rate is capped. Buckets live in process memory by
+default; set RATELIMIT_STORAGE_URL=redis://... to share them between
+workers. Exceeding a limit returns 429 with a Retry-After header.
+"""
+import math
+import time
+import logging
+import threading
+from functools import wraps
+
+from flask import current_app, request
+from flask_login import current_user
+from werkzeug.exceptions import TooManyRequests
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(limit):
+    """'5/minute' -> (capacity, refill tokens per second)"""
+    count, _, period = limit.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip().rstrip('s')]
+
+
+class MemoryStore:
+    """Buckets in a dict; correct for a single process only"""
+
+    PRUNE_EVERY = 1000
+
+    def __init__(self):
+        self._buckets = {}
+        self._lock = threading.Lock()
+        self._calls = 0
+
+    def consume(self, key, capacity, rate, cost=1):
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated = self._buckets.get(key, (capacity, now))
+            tokens = min(capacity, tokens + (now - updated) * rate)
+            if tokens >= cost:
+                tokens -= cost
+                retry_after = 0.0
+            else:
+                retry_after = (cost - tokens) / rate
+            self._buckets[key] = (tokens, now)
+
+            self._calls += 1
+            if self._calls % self.PRUNE_EVERY == 0:
+                self._prune(now)
+        return retry_after == 0.0, retry_after
+
+    def _prune(self, now):
+        # A bucket idle for a full hour is back at capacity in any sane
+        # configuration, so forgetting it changes nothing
+        stale = [k for k, (_, updated) in self._buckets.items() if now - updated > 3600]
+        for key in stale:
+            del self._buckets[key]
+
+
+class RedisStore:
+    """Buckets in Redis (or a compatible server), updated atomically by a
+    Lua script so every worker sees the same counts"""
+
+    SCRIPT = """
+    local capacity = tonumber(ARGV[1])
+    local rate = tonumber(ARGV[2])
+    local now = tonumber(ARGV[3])
+    local cost = tonumber(ARGV[4])
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or capacity
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+    local retry_after = 0
+    if tokens >= cost then
+        tokens = tokens - cost
+    else
+        retry_after = (cost - tokens) / rate
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return tostring(retry_after)
+    """
+
+    def __init__(self, url, prefix='ratelimit:'):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.2,
+                                            socket_connect_timeout=0.2)
+        self._script = self._client.register_script(self.SCRIPT)
+        self._prefix = prefix
+
+    def consume(self, key, capacity, rate, cost=1):
+        retry_after = float(self._script(keys=[self._prefix + key],
+                                         args=[capacity, rate, time.time(), cost]))
+        return retry_after == 0.0, retry_after
+
+
+def create_store(url):
+    if not url or url.startswith('memory://'):
+        return MemoryStore()
+    return RedisStore(url)
+
+
+# --- Key functions: return None to skip the limit for this request ---
+
+def client_ip():
+    # The client's address once ProxyFix has applied X-Forwarded-For (see
+    # TRUSTED_PROXY_COUNT in app.py); without it every client behind the
+    # proxy would share one bucket
+    return request.remote_addr or 'unknown'
+
+
+def form_field(name):
+    def key():
+        value = request.form.get(name, '').strip().lower()
+        return value or None
+    return key
+
+
+def current_user_id():
+    return str(current_user.id) if current_user.is_authenticated else None
+
+
+def check_limit(name, limit, identity):
+    """Consume one token from `name`'s bucket for `identity`; raise 429 when empty"""
+    limit = current_app.config['RATELIMITS'].get(name, limit)
+    capacity, rate = parse_limit(limit)
+    store = current_app.extensions['ratelimit']
+    try:
+        allowed, retry_after = store.consume(f'{name}:{identity}', capacity, rate)
+    except Exception:
+        # A broken shared store must not take logins and checkout down with it
+        logger.exception('Rate limit store unavailable; allowing request')
+        return
+    if not allowed:
+        raise TooManyRequests(retry_after=max(1, math.ceil(retry_after)))
+
+
+def rate_limit(name, limit, key=client_ip, methods=('POST',)):
+    """Limit a view to `limit` per identity returned by `key`.
+
+    `name` identifies the bucket and can be overridden in the RATELIMITS
+    config dict, e.g. {'login:ip': '50/minute'}.
+    """
+
+    def decorator(f):
+
+        @wraps(f)
+        def decorated_function(*args, **kwargs):
+            if current_app.config['RATELIMIT_ENABLED'] and request.method in methods:
+                identity = key()
+                if identity is not None:
+                    check_limit(name, limit, identity)
+            return f(*args, **kwargs)
+
+        return decorated_function
+
+    return decorator
+
+
+def init_rate_limiting(app):
+    app.config.setdefault('RATELIMIT_ENABLED', True)
+    app.config.setdefault('RATELIMITS', {})
+    app.extensions['ratelimit'] = create_store(app.config.get('RATELIMIT_STORAGE_URL'))
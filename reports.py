@@ -0,0 +1,240 @@
+"""Sales reporting backed by daily rollup tables.
+
+Paid orders are folded into DailySales / DailyProductSales /
+DailyPaymentMethodSales in the same transaction that marks them paid (or
+takes them out again if they stop being paid), so reports read at most
+one row per day, product or payment method instead of scanning `order`.
+Orders are bucketed by the day they were placed.
+
+To backfill or repair the rollups from the (live and archived) order tables:
+    python reports.py rebuild [START] [END]     (dates as YYYY-MM-DD)
+"""
+import sys
+from datetime import date, datetime, timedelta
+
+import sqlalchemy as sa
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session
+
+from app import db
+from db_utils import add_to_rollup
+from models import (Order, OrderItem, ArchivedOrder, ArchivedOrderItem, Product,
+                    PaymentMethod, DailySales, DailyProductSales, DailyPaymentMethodSales)
+
+PAID = 'paid'
+GRANULARITIES = ('day', 'week', 'month')
+NO_PAYMENT_METHOD = 0
+
+
+def apply_order(connection, order, sign):
+    """Add (sign=1) or remove (sign=-1) one order's contribution to the rollups"""
+    day = order.created_at.date()
+    items = connection.execute(
+        sa.select(OrderItem.product_id,
+                  sa.func.sum(OrderItem.quantity),
+                  sa.func.sum(OrderItem.total_price))
+        .where(OrderItem.order_id == order.id)
+        .group_by(OrderItem.product_id)).all()
+
+    units = 0
+    for product_id, quantity, revenue in items:
+        units += quantity
+        add_to_rollup(connection, DailyProductSales,
+                       {'day': day, 'product_id': product_id},
+                       {'units': sign * quantity, 'revenue': sign * revenue})
+
+    add_to_rollup(connection, DailySales, {'day': day},
+                   {'order_count': sign, 'units': sign * units,
+                    'revenue': sign * order.total_amount})
+    add_to_rollup(connection, DailyPaymentMethodSales,
+                   {'day': day, 'payment_method_id': order.payment_method_id or NO_PAYMENT_METHOD},
+                   {'order_count': sign, 'revenue': sign * order.total_amount})
+
+
+@event.listens_for(Session, 'after_flush')
+def _maintain_rollups(session, flush_context):
+    # new/dirty and attribute history still describe the flush that just ran
+    changes = []
+    for obj in session.new:
+        if isinstance(obj, Order) and obj.payment_status == PAID:
+            changes.append((obj, 1))
+
+    for obj in session.dirty:
+        if not isinstance(obj, Order):
+            continue
+        history = inspect(obj).attrs.payment_status.history
+        if not history.has_changes():
+            continue
+        was_paid = PAID in (history.deleted or ())
+        is_paid = obj.payment_status == PAID
+        if was_paid != is_paid:
+            changes.append((obj, 1 if is_paid else -1))
+
+    if changes:
+        connection = session.connection()
+        for order, sign in changes:
+            apply_order(connection, order, sign)
+
+
+def _day(column):
+    if db.engine.dialect.name == 'sqlite':
+        return sa.func.date(column, type_=sa.Date)
+    return sa.cast(column, sa.Date)
+
+
+def _add(totals, key, values):
+    row = totals.setdefault(key, [0] * len(values))
+    for i, value in enumerate(values):
+        row[i] += value or 0
+
+
+def rebuild_rollups(start, end):
+    """Recompute rollups for [start, end] with grouped SQL over the live
+    and archived order tables"""
+    lower = datetime.combine(start, datetime.min.time())
+    upper = datetime.combine(end + timedelta(days=1), datetime.min.time())
+
+    for model in (DailySales, DailyProductSales, DailyPaymentMethodSales):
+        db.session.execute(sa.delete(model).where(model.day.between(start, end)))
+
+    daily, products, methods = {}, {}, {}
+    for order_model, item_model in ((Order, OrderItem), (ArchivedOrder, ArchivedOrderItem)):
+        day = _day(order_model.created_at).label('day')
+        paid_in_range = sa.and_(order_model.payment_status == PAID,
+                                order_model.created_at >= lower,
+                                order_model.created_at < upper)
+        with_items = sa.select(day).join(item_model, item_model.order_id == order_model.id).where(paid_in_range)
+        method = sa.func.coalesce(order_model.payment_method_id, NO_PAYMENT_METHOD)
+
+        for d, count, revenue in db.session.execute(
+                sa.select(day, sa.func.count(order_model.id), sa.func.sum(order_model.total_amount))
+                .where(paid_in_range).group_by(day)):
+            _add(daily, d, (count, 0, revenue))
+        for d, units in db.session.execute(
+                with_items.add_columns(sa.func.sum(item_model.quantity)).group_by(day)):
+            _add(daily, d, (0, units, 0))
+        for d, product_id, units, revenue in db.session.execute(
+                with_items.add_columns(item_model.product_id, sa.func.sum(item_model.quantity),
+                                       sa.func.sum(item_model.total_price))
+                .group_by(day, item_model.product_id)):
+            _add(products, (d, product_id), (units, revenue))
+        for d, method_id, count, revenue in db.session.execute(
+                sa.select(day, method, sa.func.count(order_model.id), sa.func.sum(order_model.total_amount))
+                .where(paid_in_range).group_by(day, method)):
+            _add(methods, (d, method_id), (count, revenue))
+
+    rows = {
+        DailySales: [{'day': d, 'order_count': c, 'units': u, 'revenue': r}
+                     for d, (c, u, r) in daily.items()],
+        DailyProductSales: [{'day': d, 'product_id': p, 'units': u, 'revenue': r}
+                            for (d, p), (u, r) in products.items()],
+        DailyPaymentMethodSales: [{'day': d, 'payment_method_id': m, 'order_count': c, 'revenue': r}
+                                  for (d, m), (c, r) in methods.items()],
+    }
+    for model, values in rows.items():
+        if values:
+            db.session.execute(sa.insert(model), values)
+    db.session.commit()
+    return len(daily)
+
+
+# --- Reports (date ranges are inclusive) ---
+
+def period_start(day, granularity):
+    if granularity == 'week':
+        return day - timedelta(days=day.weekday())
+    if granularity == 'month':
+        return day.replace(day=1)
+    return day
+
+
+def revenue_by_period(start, end, granularity='day'):
+    rows = db.session.execute(
+        sa.select(DailySales.day, DailySales.order_count, DailySales.units, DailySales.revenue)
+        .where(DailySales.day.between(start, end), DailySales.order_count != 0)
+        .order_by(DailySales.day)).all()
+
+    periods = {}
+    for day, orders, units, revenue in rows:
+        bucket = periods.setdefault(period_start(day, granularity),
+                                    {'orders': 0, 'units': 0, 'revenue': 0.0})
+        bucket['orders'] += orders
+        bucket['units'] += units
+        bucket['revenue'] += revenue
+
+    return [{'period': period, **totals,
+             'average_order_value': totals['revenue'] / totals['orders'] if totals['orders'] else 0.0}
+            for period, totals in periods.items()]
+
+
+def sales_summary(start, end):
+    orders, units, revenue = db.session.execute(
+        sa.select(sa.func.coalesce(sa.func.sum(DailySales.order_count), 0),
+                  sa.func.coalesce(sa.func.sum(DailySales.units), 0),
+                  sa.func.coalesce(sa.func.sum(DailySales.revenue), 0))
+        .where(DailySales.day.between(start, end))).one()
+    return {'orders': orders, 'units': units, 'revenue': revenue,
+            'average_order_value': revenue / orders if orders else 0.0}
+
+
+def top_products(start, end, by='revenue', limit=10):
+    units = sa.func.sum(DailyProductSales.units).label('units')
+    revenue = sa.func.sum(DailyProductSales.revenue).label('revenue')
+    rows = db.session.execute(
+        sa.select(DailyProductSales.product_id, Product.name, units, revenue)
+        .outerjoin(Product, Product.id == DailyProductSales.product_id)
+        .where(DailyProductSales.day.between(start, end))
+        .group_by(DailyProductSales.product_id, Product.name)
+        .having(units != 0)
+        .order_by((units if by == 'units' else revenue).desc())
+        .limit(limit)).all()
+    return [{'product_id': product_id, 'name': name or f'Product #{product_id}',
+             'units': u, 'revenue': r} for product_id, name, u, r in rows]
+
+
+def category_mix(start, end):
+    category = sa.func.coalesce(Product.category, 'uncategorized').label('category')
+    revenue = sa.func.sum(DailyProductSales.revenue).label('revenue')
+    rows = db.session.execute(
+        sa.select(category, sa.func.sum(DailyProductSales.units), revenue)
+        .outerjoin(Product, Product.id == DailyProductSales.product_id)
+        .where(DailyProductSales.day.between(start, end))
+        .group_by(category)
+        .having(sa.func.sum(DailyProductSales.units) != 0)
+        .order_by(revenue.desc())).all()
+    total = sum(r for _, _, r in rows) or 1
+    return [{'category': c, 'units': u, 'revenue': r, 'share': r / total} for c, u, r in rows]
+
+
+def payment_method_split(start, end):
+    revenue = sa.func.sum(DailyPaymentMethodSales.revenue).label('revenue')
+    rows = db.session.execute(
+        sa.select(DailyPaymentMethodSales.payment_method_id, PaymentMethod.name,
+                  sa.func.sum(DailyPaymentMethodSales.order_count), revenue)
+        .outerjoin(PaymentMethod, PaymentMethod.id == DailyPaymentMethodSales.payment_method_id)
+        .where(DailyPaymentMethodSales.day.between(start, end))
+        .group_by(DailyPaymentMethodSales.payment_method_id, PaymentMethod.name)
+        .having(sa.func.sum(DailyPaymentMethodSales.order_count) != 0)
+        .order_by(revenue.desc())).all()
+    total = sum(r for _, _, _, r in rows) or 1
+    return [{'payment_method_id': method_id or None,
+             'name': name or ('Unspecified' if not method_id else f'Method #{method_id}'),
+             'orders': count, 'revenue': r, 'share': r / total}
+            for method_id, name, count, r in rows]
+
+
+if __name__ == '__main__':
+    from app import app
+
+    if len(sys.argv) < 2 or sys.argv[1] != 'rebuild':
+        print(__doc__)
+        sys.exit(1)
+
+    with app.app_context():
+        first = min([d for d in (db.session.query(sa.func.min(Order.created_at)).scalar(),
+                                 db.session.query(sa.func.min(ArchivedOrder.created_at)).scalar())
+                     if d is not None], default=datetime.utcnow())
+        start = date.fromisoformat(sys.argv[2]) if len(sys.argv) > 2 else first.date()
+        end = date.fromisoformat(sys.argv[3]) if len(sys.argv) > 3 else datetime.utcnow().date()
+        days = rebuild_rollups(start, end)
+        print(f'Rebuilt sales rollups for {start} .. {end} ({days} days with sales)')
@@ -1,60 +1,61 @@
-from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify
+from flask import Blueprint, render_template, request, redirect, url_for, flash, session, jsonify, current_app
 from flask_login import login_required, current_user
 from app import db
-from models import Product, CartItem, Order, OrderItem, ContactMessage, PaymentMethod
+from models import Product, CartItem, Order, OrderItem
 from forms import ContactForm, CheckoutForm
-from utils import get_site_customization, get_site_styles, get_active_payment_methods, format_payment_config
+from db_routing import use_read_replica
+from archive import get_user_order
+from order_history import user_order_page
+from listing import featured_cards, catalogue_cards, related_cards, category_counts
+from notifications import notify_admins
+from inbox import submit_message
+from ratelimit import rate_limit, current_user_id
+from utils import get_site_customization, get_site_styles
+from payment_methods import active_payment_methods, get_payment_method
+from idempotency import request_key, find_order_id, claim, remember, winner_after_conflict, new_key
+from order_lifecycle import transition, can_transition, InvalidTransition
+from sqlalchemy.exc import IntegrityError
 import requests
 import os
 import json
 from models import News
+from news_feed import get_news_page, get_first_page, render_news_items, NEWS_PAGE_SIZE, MAX_PAGE_SIZE
 
 main_bp = Blueprint('main', __name__)
 
 
 @main_bp.route('/')
 def index():
-    featured_products = Product.query.filter_by(is_active=True).limit(6).all()
-    
     # Get site customizations
     customizations = {
         'hero': get_site_customization('hero'),
         'general': get_site_customization('general')
     }
     
-    return render_template('index.html', products=featured_products, customizations=customizations)
+    # Cards are loaded inside the cached fragment, only when it is rendered
+    return render_template('index.html', featured_cards=featured_cards,
+                           customizations=customizations)
 
 
 @main_bp.route('/products')
+@use_read_replica
 def products():
     page = request.args.get('page', 1, type=int)
     category = request.args.get('category')
     search = request.args.get('search')
     
-    query = Product.query.filter_by(is_active=True)
-    
-    if category:
-        query = query.filter_by(category=category)
-    
-    if search:
-        query = query.filter(Product.name.contains(search))
-    
-    products = query.order_by(Product.created_at.desc()).paginate(page=page, per_page=12, error_out=False)
-    categories = db.session.query(Product.category).filter(Product.is_active == True).distinct().all()
-    categories = [cat[0] for cat in categories if cat[0]]
+    products = catalogue_cards(page=page, per_page=12, category=category, search=search)
+    categories = [name for name, _ in category_counts()]
     
     return render_template('products.html', products=products, categories=categories, 
                          current_category=category, search=search)
 
 
 @main_bp.route('/product/<int:product_id>')
+@use_read_replica
 def product_detail(product_id):
     product = Product.query.get_or_404(product_id)
-    related_products = Product.query.filter(
-        Product.category == product.category,
-        Product.id != product.id,
-        Product.is_active == True
-    ).limit(4).all()
+    related_products = related_cards(product, limit=4)
     
     return render_template('product_detail.html', product=product, related_products=related_products)
 
@@ -99,7 +100,7 @@ def cart():
         CartItem.user_id == current_user.id
     ).all()
     
-    total = sum(item.quantity * product.price for item, product in cart_items)
+    total = sum(item.quantity * product.effective_price for item, product in cart_items)
     
     return render_template('cart.html', cart_items=cart_items, total=total)
 
@@ -136,7 +137,23 @@ def remove_from_cart(item_id):
 
 @main_bp.route('/checkout', methods=['GET', 'POST'])
 @login_required
+@rate_limit('checkout:ip', '30/minute')
+@rate_limit('checkout:user', '10/minute', key=current_user_id)
 def checkout():
+    form = CheckoutForm()
+    user_id = current_user.id
+    key = None
+    if request.method == 'POST':
+        # A replayed submission goes to the order it already produced
+        key = request_key(form.idempotency_key.data)
+        if key:
+            order_id = find_order_id(user_id, key)
+            if order_id is not None:
+                flash('This order has already been placed.', 'info')
+                return redirect(url_for('main.payment', order_id=order_id))
+    elif not form.idempotency_key.data:
+        form.idempotency_key.data = new_key()
+
     cart_items = db.session.query(CartItem, Product).join(Product).filter(
         CartItem.user_id == current_user.id
     ).all()
@@ -145,18 +162,17 @@ def checkout():
         flash('Your cart is empty.', 'info')
         return redirect(url_for('main.products'))
     
-    total = sum(item.quantity * product.price for item, product in cart_items)
-    form = CheckoutForm()
+    total = sum(item.quantity * product.effective_price for item, product in cart_items)
     
     # Get available payment methods
-    payment_methods = get_active_payment_methods()
+    payment_methods = active_payment_methods()
     form.payment_method.choices = [(str(pm.id), pm.name) for pm in payment_methods]
     
     if form.validate_on_submit():
         # Get selected payment method
-        payment_method = PaymentMethod.query.get(int(form.payment_method.data))
+        payment_method = get_payment_method(int(form.payment_method.data))
         
-        if not payment_method:
+        if not payment_method or not payment_method.usable:
             flash('Invalid payment method selected.', 'error')
             return render_template('checkout.html', cart_items=cart_items, total=total, form=form, payment_methods=payment_methods)
         
@@ -171,6 +187,17 @@ def checkout():
         
         db.session.add(order)
         db.session.flush()  # Get the order ID
+
+        if key:
+            try:
+                claim(user_id, key, order.id)
+            except IntegrityError:
+                # A concurrent duplicate committed first; ours is rolled back
+                order_id = winner_after_conflict(user_id, key)
+                flash('This order has already been placed.', 'info')
+                if order_id is None:
+                    return redirect(url_for('main.orders'))
+                return redirect(url_for('main.payment', order_id=order_id))
         
         # Create order items
         for cart_item, product in cart_items:
@@ -178,8 +205,8 @@ def checkout():
                 order_id=order.id,
                 product_id=product.id,
                 quantity=cart_item.quantity,
-                unit_price=product.price,
-                total_price=cart_item.quantity * product.price
+                unit_price=product.effective_price,
+                total_price=cart_item.quantity * product.effective_price
             )
             db.session.add(order_item)
             
@@ -189,6 +216,8 @@ def checkout():
         # Clear cart
         CartItem.query.filter_by(user_id=current_user.id).delete()
         db.session.commit()
+        if key:
+            remember(user_id, key, order.id)
         
         # Redirect to payment based on payment method type
         return redirect(url_for('main.payment', order_id=order.id))
@@ -208,7 +237,8 @@ def payment(order_id):
     # Paystack configuration
     paystack_public_key = os.environ.get("PAYSTACK_PUBLIC_KEY", "pk_test_default")
     
-    return render_template('payment.html', order=order, paystack_public_key=paystack_public_key)
+    return render_template('payment.html', order=order, payment_method=get_payment_method(order.payment_method_id),
+                           paystack_public_key=paystack_public_key)
 
 
 @main_bp.route('/verify_payment/<int:order_id>')
@@ -230,17 +260,20 @@ def verify_payment(order_id):
     
     try:
         response = requests.get(
-            f'https://api.paystack.co/transaction/verify/{reference}',
-            headers=headers
+            f"{current_app.config['PAYSTACK_API_BASE']}/transaction/verify/{reference}",
+            headers=headers,
+            timeout=current_app.config['HTTP_TIMEOUT']
         )
         
         if response.status_code == 200:
             data = response.json()
             if data['status'] and data['data']['status'] == 'success':
-                # Payment successful
-                order.payment_status = 'paid'
+                # Payment successful; an order the admin already moved on
+                # (e.g. shipped) keeps its status
                 order.payment_reference = reference
-                order.status = 'confirmed'
+                transition(order, payment_status='paid',
+                           status='confirmed' if can_transition('status', order.status, 'confirmed') else None,
+                           actor_id=current_user.id, note=f'Paystack {reference}')
                 db.session.commit()
                 
                 flash('Payment successful! Your order has been confirmed.', 'success')
@@ -260,9 +293,7 @@ def verify_payment(order_id):
 @login_required
 def orders():
     page = request.args.get('page', 1, type=int)
-    orders = Order.query.filter_by(user_id=current_user.id).order_by(
-        Order.created_at.desc()
-    ).paginate(page=page, per_page=10, error_out=False)
+    orders = user_order_page(current_user.id, page=page, per_page=10)
     
     return render_template('orders.html', orders=orders)
 
@@ -270,21 +301,16 @@ def orders():
 @main_bp.route('/order/<int:order_id>')
 @login_required
 def order_detail(order_id):
-    order = Order.query.filter_by(id=order_id, user_id=current_user.id).first_or_404()
+    order = get_user_order(current_user.id, order_id)
     return render_template('order_detail.html', order=order)
 
 
 @main_bp.route('/contact', methods=['GET', 'POST'])
+@rate_limit('contact:ip', '5/hour')
 def contact():
     form = ContactForm()
     if form.validate_on_submit():
-        message = ContactMessage(
-            name=form.name.data,
-            email=form.email.data,
-            message=form.message.data
-        )
-        db.session.add(message)
-        db.session.commit()
+        submit_message(form.name.data, form.email.data, form.message.data)
         flash('Your message has been sent! We will get back to you soon.', 'success')
         return redirect(url_for('main.contact'))
     
@@ -299,8 +325,15 @@ def confirm_manual_payment(order_id):
     if order.payment_status == 'paid':
         return jsonify({'success': False, 'message': 'Order already paid'})
     
-    order.payment_status = 'pending_verification'
-    order.status = 'pending_verification'
+    try:
+        changed = transition(order, payment_status='pending_verification',
+                             status='pending_verification'
+                             if can_transition('status', order.status, 'pending_verification') else None,
+                             actor_id=current_user.id, note='Bank transfer confirmed by customer')
+    except InvalidTransition as e:
+        return jsonify({'success': False, 'message': str(e)})
+    if 'payment_status' in changed:
+        notify_admins('payment_verification', order=order)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'Payment confirmation received'})
@@ -314,8 +347,15 @@ def confirm_crypto_payment(order_id):
     if order.payment_status == 'paid':
         return jsonify({'success': False, 'message': 'Order already paid'})
     
-    order.payment_status = 'pending_verification'
-    order.status = 'pending_verification'
+    try:
+        changed = transition(order, payment_status='pending_verification',
+                             status='pending_verification'
+                             if can_transition('status', order.status, 'pending_verification') else None,
+                             actor_id=current_user.id, note='Crypto payment confirmed by customer')
+    except InvalidTransition as e:
+        return jsonify({'success': False, 'message': str(e)})
+    if 'payment_status' in changed:
+        notify_admins('payment_verification', order=order)
     db.session.commit()
     
     return jsonify({'success': True, 'message': 'Crypto payment confirmation received'})
@@ -329,5 +369,28 @@ def about():
 @main_bp.route('/news')
 @login_required
 def user_news():
-    news = News.query.order_by(News.created_at.desc()).all()
-    return render_template('news.html', news=news)
\ No newline at end of file
+    cursor = request.args.get('cursor')
+    if cursor:
+        items, next_cursor = get_news_page(cursor)
+        items_html = render_news_items(items)
+    else:
+        items_html, next_cursor = get_first_page()
+    return render_template('news.html', items_html=items_html, next_cursor=next_cursor)
+
+
+@main_bp.route('/news/feed')
+@login_required
+def news_feed():
+    limit = min(request.args.get('limit', NEWS_PAGE_SIZE, type=int), MAX_PAGE_SIZE)
+    items, next_cursor = get_news_page(request.args.get('cursor'), max(limit, 1))
+    return jsonify({
+        'items': [{
+            'id': item.id,
+            'title': item.title,
+            'content': item.content,
+            'media_url': item.media_url,
+            'created_at': item.created_at.isoformat()
+        } for item in items],
+        'html': render_news_items(items),
+        'next_cursor': next_cursor
+    })
\ No newline at end of file
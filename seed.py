@@ -0,0 +1,48 @@
+"""Default rows a fresh database needs: the admin account and payment methods.
+
+Run after migrations on every deploy; rows that already exist are left
+alone, and the migration lock keeps instances deploying together from
+seeding twice:
+    flask --app app db upgrade && python seed.py
+"""
+from app import app, db
+from models import PaymentMethod, User
+from online_migrations import migration_lock
+from passwords import hash_password
+
+DEFAULT_ADMIN_EMAIL = 'admin@doctlesspaint.com'
+
+DEFAULT_PAYMENT_METHODS = [
+    {'name': 'Paystack (Card Payment)', 'method_type': 'gateway',
+     'configuration': '{"public_key": "", "secret_key": ""}',
+     'instructions': 'Pay securely with your debit/credit card', 'is_active': True},
+    {'name': 'Bank Transfer', 'method_type': 'manual',
+     'configuration': '{"account_name": "Your Business Name", "account_number": "1234567890", '
+                      '"bank_name": "Your Bank"}',
+     'instructions': 'Transfer to the account details provided and confirm payment',
+     'is_active': True},
+    {'name': 'Cryptocurrency', 'method_type': 'crypto',
+     'configuration': '{"btc_address": "", "eth_address": "", "usdt_address": ""}',
+     'instructions': 'Send cryptocurrency to the provided wallet address', 'is_active': False},
+]
+
+
+def seed_defaults():
+    """Create whatever default rows are missing; returns their descriptions"""
+    created = []
+    with db.engine.connect() as connection, migration_lock(connection):
+        if not User.query.filter_by(email=DEFAULT_ADMIN_EMAIL).first():
+            db.session.add(User(username='admin', email=DEFAULT_ADMIN_EMAIL,
+                                password_hash=hash_password('admin123'), is_admin=True))
+            created.append(f'admin user {DEFAULT_ADMIN_EMAIL} / admin123')
+        if not PaymentMethod.query.first():
+            db.session.add_all([PaymentMethod(**method) for method in DEFAULT_PAYMENT_METHODS])
+            created.extend(f"payment method {method['name']}" for method in DEFAULT_PAYMENT_METHODS)
+        db.session.commit()
+    return created
+
+
+if __name__ == '__main__':
+    with app.app_context():
+        for description in seed_defaults():
+            print(f'Created {description}')
@@ -0,0 +1,358 @@
+"""Server-side sessions: the cookie carries a random id, the payload lives
+in a store.
+
+SESSION_STORE_URL picks the store:
+
+    cookie://             Flask's signed cookie session (the default)
+    sql://                the server_session table in the main database
+    file:///var/sessions  one file per session in that directory
+    redis://host:6379/2   Redis or a compatible server
+
+With a store, the payload is written back only when the request changed
+the session. Unchanged sessions are not written, except for an expiry
+refresh once less than half of PERMANENT_SESSION_LIFETIME is left. The
+session id is replaced whenever the logged-in user (Flask-Login or the
+admin login) changes, so a session id handed out before login is useless
+afterwards. Each worker sweeps expired sessions from the SQL and file
+stores every SESSION_SWEEP_INTERVAL seconds (Redis expires keys itself);
+`python sessions.py sweep` does the same once.
+"""
+import os
+import re
+import time
+import random
+import secrets
+import logging
+import threading
+from datetime import datetime, timezone
+
+import sqlalchemy as sa
+from flask.json.tag import TaggedJSONSerializer
+from flask.sessions import SessionInterface, SessionMixin
+from werkzeug.datastructures import CallbackDict
+
+logger = logging.getLogger(__name__)
+
+SID_PATTERN = re.compile(r'^[A-Za-z0-9_-]{43}$')
+# A change to any of these replaces the session id
+AUTH_KEYS = ('_user_id', 'admin_user_id')
+
+serializer = TaggedJSONSerializer()
+
+
+def _to_datetime(timestamp):
+    return datetime.fromtimestamp(timestamp, timezone.utc).replace(tzinfo=None)
+
+
+def _to_timestamp(value):
+    return value.replace(tzinfo=timezone.utc).timestamp()
+
+
+class SqlStore:
+    """Sessions in the server_session table, written on their own short
+    transactions so they never mix with the request's db.session"""
+
+    def __init__(self, db):
+        self.db = db
+
+    @property
+    def table(self):
+        from models import ServerSession
+        return ServerSession.__table__
+
+    def load(self, sid):
+        with self.db.engine.connect() as connection:
+            row = connection.execute(
+                sa.select(self.table.c.data, self.table.c.expires_at)
+                .where(self.table.c.id == sid)).first()
+        if row is None:
+            return None
+        return row.data, _to_timestamp(row.expires_at)
+
+    def save(self, sid, data, expires):
+        values = {'data': data, 'expires_at': _to_datetime(expires)}
+        with self.db.engine.begin() as connection:
+            updated = connection.execute(
+                self.table.update().where(self.table.c.id == sid).values(**values))
+            if updated.rowcount == 0:
+                connection.execute(self.table.insert().values(id=sid, **values))
+
+    def touch(self, sid, expires):
+        with self.db.engine.begin() as connection:
+            connection.execute(self.table.update().where(self.table.c.id == sid)
+                               .values(expires_at=_to_datetime(expires)))
+
+    def delete(self, sid):
+        with self.db.engine.begin() as connection:
+            connection.execute(self.table.delete().where(self.table.c.id == sid))
+
+    def sweep(self):
+        with self.db.engine.begin() as connection:
+            return connection.execute(
+                self.table.delete().where(self.table.c.expires_at < _to_datetime(time.time()))
+            ).rowcount
+
+
+class FileStore:
+    """One file per session; the file's mtime is the session's expiry"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, sid):
+        return os.path.join(self.directory, sid)
+
+    def load(self, sid):
+        path = self._path(sid)
+        try:
+            expires = os.stat(path).st_mtime
+            with open(path, encoding='utf-8') as f:
+                return f.read(), expires
+        except FileNotFoundError:
+            return None
+
+    def save(self, sid, data, expires):
+        path = self._path(sid)
+        tmp = f'{path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w', encoding='utf-8') as f:
+            f.write(data)
+        os.utime(tmp, (expires, expires))
+        os.replace(tmp, path)
+
+    def touch(self, sid, expires):
+        try:
+            os.utime(self._path(sid), (expires, expires))
+        except FileNotFoundError:
+            pass
+
+    def delete(self, sid):
+        try:
+            os.remove(self._path(sid))
+        except FileNotFoundError:
+            pass
+
+    def sweep(self):
+        now = time.time()
+        removed = 0
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                try:
+                    if entry.stat().st_mtime < now:
+                        os.remove(entry.path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+class RedisStore:
+
+    def __init__(self, url, prefix='session:'):
+        import redis
+        self._client = redis.Redis.from_url(url, socket_timeout=0.5,
+                                            socket_connect_timeout=0.5)
+        self._prefix = prefix
+
+    def load(self, sid):
+        pipe = self._client.pipeline()
+        pipe.get(self._prefix + sid)
+        pipe.pttl(self._prefix + sid)
+        data, ttl_ms = pipe.execute()
+        if data is None:
+            return None
+        return data.decode('utf-8'), time.time() + max(ttl_ms, 0) / 1000
+
+    def save(self, sid, data, expires):
+        self._client.set(self._prefix + sid, data, exat=int(expires))
+
+    def touch(self, sid, expires):
+        self._client.expireat(self._prefix + sid, int(expires))
+
+    def delete(self, sid):
+        self._client.delete(self._prefix + sid)
+
+    def sweep(self):
+        return 0
+
+
+def create_store(url, db=None):
+    """None for cookie://, which keeps Flask's own cookie sessions"""
+    if not url or url.startswith('cookie://'):
+        return None
+    if url.startswith('sql://'):
+        return SqlStore(db)
+    if url.startswith('file://'):
+        return FileStore(url[len('file://'):])
+    return RedisStore(url)
+
+
+class StoredSession(CallbackDict, SessionMixin):
+
+    def __init__(self, initial=None, sid=None, expires=None):
+        def on_update(self):
+            self.modified = True
+            self.accessed = True
+
+        super().__init__(initial, on_update)
+        self.sid = sid
+        self.expires = expires
+        self.new = sid is None
+        self.auth = tuple(dict.get(self, key) for key in AUTH_KEYS)
+        self.modified = False
+        self.accessed = False
+
+    def __getitem__(self, key):
+        self.accessed = True
+        return super().__getitem__(key)
+
+    def get(self, key, default=None):
+        self.accessed = True
+        return super().get(key, default)
+
+    def setdefault(self, key, default=None):
+        self.accessed = True
+        return super().setdefault(key, default)
+
+
+class ServerSideSessionInterface(SessionInterface):
+
+    def __init__(self, store):
+        self.store = store
+
+    def open_session(self, app, request):
+        sid = request.cookies.get(self.get_cookie_name(app))
+        if not sid or not SID_PATTERN.match(sid):
+            return StoredSession()
+        try:
+            loaded = self.store.load(sid)
+        except Exception:
+            # Losing the session (a logout) beats failing the request
+            logger.exception('Session store unavailable; starting a new session')
+            return StoredSession()
+        if loaded is None or loaded[1] < time.time():
+            return StoredSession()
+        data, expires = loaded
+        try:
+            return StoredSession(serializer.loads(data), sid=sid, expires=expires)
+        except ValueError:
+            return StoredSession()
+
+    def save_session(self, app, session, response):
+        name = self.get_cookie_name(app)
+        domain = self.get_cookie_domain(app)
+        path = self.get_cookie_path(app)
+
+        if session.accessed:
+            response.vary.add('Cookie')
+
+        if not session:
+            if session.modified and not session.new:
+                self._call(self.store.delete, session.sid)
+                response.delete_cookie(name, domain=domain, path=path,
+                                       secure=self.get_cookie_secure(app),
+                                       samesite=self.get_cookie_samesite(app),
+                                       httponly=self.get_cookie_httponly(app))
+            return
+
+        lifetime = app.permanent_session_lifetime.total_seconds()
+        now = time.time()
+        rotate = not session.new and tuple(session.get(key) for key in AUTH_KEYS) != session.auth
+        if session.new or rotate:
+            if rotate:
+                self._call(self.store.delete, session.sid)
+            session.sid = secrets.token_urlsafe(32)
+        elif not session.modified:
+            if session.expires - now > lifetime / 2:
+                return
+            # Slide the expiry without rewriting the payload
+            session.expires = now + lifetime
+            self._call(self.store.touch, session.sid, session.expires)
+            if session.permanent:
+                self._set_cookie(app, session, response)
+            return
+
+        session.expires = now + lifetime
+        self._call(self.store.save, session.sid, serializer.dumps(dict(session)),
+                   session.expires)
+        if session.new or rotate or session.permanent:
+            self._set_cookie(app, session, response)
+
+    def _set_cookie(self, app, session, response):
+        response.set_cookie(
+            self.get_cookie_name(app), session.sid,
+            expires=self.get_expiration_time(app, session),
+            httponly=self.get_cookie_httponly(app),
+            domain=self.get_cookie_domain(app),
+            path=self.get_cookie_path(app),
+            secure=self.get_cookie_secure(app),
+            samesite=self.get_cookie_samesite(app),
+            partitioned=self.get_cookie_partitioned(app))
+
+    @staticmethod
+    def _call(method, *args):
+        try:
+            method(*args)
+        except Exception:
+            logger.exception('Session store %s failed', method.__name__)
+
+
+class Sweeper:
+    """Per-process thread deleting expired sessions; started on the first
+    request so each forked worker gets its own"""
+
+    def __init__(self, app, store, interval):
+        self.app = app
+        self.store = store
+        self.interval = interval
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def ensure_started(self):
+        if self._thread is not None and self._thread.is_alive():
+            return
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name='session-sweeper',
+                                                daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        while True:
+            # Jitter keeps workers started together from sweeping in lockstep
+            time.sleep(self.interval * random.uniform(0.5, 1.5))
+            try:
+                with self.app.app_context():
+                    removed = self.store.sweep()
+                if removed:
+                    logger.info('Swept %d expired sessions', removed)
+            except Exception:
+                logger.exception('Session sweep failed')
+
+
+def init_sessions(app, db):
+    app.config.setdefault('SESSION_STORE_URL', 'cookie://')
+    app.config.setdefault('SESSION_SWEEP_INTERVAL', 900)
+
+    store = create_store(app.config['SESSION_STORE_URL'], db)
+    if store is None:
+        return
+    app.session_interface = ServerSideSessionInterface(store)
+    app.extensions['session_store'] = store
+
+    if app.config['SESSION_SWEEP_INTERVAL'] > 0 and not isinstance(store, RedisStore):
+        sweeper = Sweeper(app, store, app.config['SESSION_SWEEP_INTERVAL'])
+        app.before_request(sweeper.ensure_started)
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if sys.argv[1:] != ['sweep']:
+        sys.exit('usage: python sessions.py sweep')
+    with app.app_context():
+        store = app.extensions.get('session_store')
+        if store is None:
+            sys.exit('SESSION_STORE_URL is cookie://; nothing to sweep')
+        print(f'Swept {store.sweep()} expired sessions')
@@ -0,0 +1,135 @@
+"""Admin user search.
+
+Each user row carries two derived, indexed columns kept up to date on
+every insert and update:
+
+    search_text    lower-cased "username first_name last_name email"
+    phone_digits   the phone number as national digits (+234 80.. -> 080..)
+
+A search box value is resolved in this order, stopping at the first that
+finds anyone:
+
+    1. a whole email address   -> lower(email) equality (expression index)
+    2. four or more digits     -> phone_digits prefix (range on its index)
+    3. anything else           -> every word must occur in search_text
+
+On PostgreSQL the migration puts a pg_trgm GIN index on search_text, so
+the substring match in step 3 is an index lookup instead of a scan; words
+shorter than MIN_TERM_LENGTH cannot use a trigram index and are ignored
+by the typeahead.
+
+To fill the columns for rows written before they existed:
+    python user_search.py reindex
+"""
+import re
+
+import sqlalchemy as sa
+from sqlalchemy import event
+
+from app import db
+from models import User
+
+EMAIL_PATTERN = re.compile(r'^[^@\s]+@[^@\s]+\.[^@\s]+$')
+PHONE_PATTERN = re.compile(r'^[\d\s()+-]+$')
+MIN_PHONE_DIGITS = 4
+MIN_TERM_LENGTH = 3
+TYPEAHEAD_LIMIT = 10
+
+
+def normalize_text(value):
+    return ' '.join((value or '').lower().split())
+
+
+def normalize_phone(value):
+    digits = re.sub(r'\D', '', value or '')
+    if digits.startswith('234'):
+        digits = '0' + digits[3:]
+    return digits or None
+
+
+def user_search_text(user):
+    return normalize_text(' '.join(part for part in (user.username, user.first_name,
+                                                     user.last_name, user.email) if part))
+
+
+@event.listens_for(User, 'before_insert')
+@event.listens_for(User, 'before_update')
+def _index_user(mapper, connection, user):
+    user.search_text = user_search_text(user)
+    user.phone_digits = normalize_phone(user.phone)
+
+
+def _candidates(query):
+    """(kind, WHERE clause) pairs to try in order for a search box value"""
+    text = normalize_text(query)
+    if EMAIL_PATTERN.match(text):
+        yield 'email', sa.func.lower(User.email) == text
+    if PHONE_PATTERN.match(query):
+        digits = normalize_phone(query)
+        if digits and len(digits) >= MIN_PHONE_DIGITS:
+            # ':' sorts right after '9', so this is "starts with digits"
+            yield 'phone', sa.and_(User.phone_digits >= digits, User.phone_digits < digits + ':')
+    terms = text.split()
+    if terms:
+        yield 'text', sa.and_(*[User.search_text.contains(term, autoescape=True)
+                                for term in terms])
+
+
+def _exists(clause):
+    return db.session.scalar(sa.select(User.id).where(clause).limit(1)) is not None
+
+
+def search_clause(query):
+    """(kind, WHERE clause) for the admin users page; the last candidate is
+    used even when it finds nobody"""
+    candidates = list(_candidates(query.strip()))
+    if not candidates:
+        return None, None
+    for kind, clause in candidates[:-1]:
+        if _exists(clause):
+            return kind, clause
+    return candidates[-1]
+
+
+def typeahead(query, limit=TYPEAHEAD_LIMIT):
+    """(kind, rows) of the first candidate that finds anyone, newest first"""
+    query = query.strip()
+    for kind, clause in _candidates(query):
+        if kind == 'text' and not any(len(term) >= MIN_TERM_LENGTH
+                                      for term in normalize_text(query).split()):
+            continue
+        rows = db.session.execute(
+            sa.select(User.id, User.username, User.first_name, User.last_name,
+                      User.email, User.phone)
+            .where(clause)
+            .order_by(User.id.desc())
+            .limit(limit)).all()
+        if rows:
+            return kind, rows
+    return None, []
+
+
+def reindex(batch_size=1000):
+    """Recompute the search columns of every user; returns the number updated"""
+    updated, last_id = 0, 0
+    while True:
+        users = db.session.scalars(sa.select(User).where(User.id > last_id)
+                                   .order_by(User.id).limit(batch_size)).all()
+        if not users:
+            return updated
+        db.session.execute(sa.update(User), [
+            {'id': user.id, 'search_text': user_search_text(user),
+             'phone_digits': normalize_phone(user.phone)} for user in users])
+        db.session.commit()
+        updated += len(users)
+        last_id = users[-1].id
+
+
+if __name__ == '__main__':
+    import sys
+    from app import app
+
+    if sys.argv[1:] != ['reindex']:
+        sys.exit('usage: python user_search.py reindex')
+    with app.app_context():
+        print(f'Reindexed {reindex()} users')
@@ -2,8 +2,9 @@ import os
 import json
 import secrets
 from PIL import Image
-from models import SiteCustomization, PaymentMethod
+from models import SiteCustomization
 from flask import current_app
+from cache import memoize
 
 
 def allowed_file(filename):
@@ -43,6 +44,7 @@ def calculate_discount_percentage(original_price, current_price):
     return 0
 
 
+@memoize('site_customization', tags=('customizations',))
 def get_site_customization(section=None, element_key=None):
     """Get site customizations, optionally filtered by section or element_key"""
     query = SiteCustomization.query.filter_by(is_active=True)
@@ -59,6 +61,7 @@ def get_site_customization(section=None, element_key=None):
     return {c.element_key: c.content for c in customizations}
 
 
+@memoize('site_styles', tags=('customizations',))
 def get_site_styles(section=None):
     """Get CSS styles for site customizations"""
     query = SiteCustomization.query.filter_by(is_active=True, element_type='style')
@@ -80,8 +83,9 @@ def get_site_styles(section=None):
 
 
 def get_active_payment_methods():
-    """Get all active payment methods"""
-    return PaymentMethod.query.filter_by(is_active=True).all()
+    """Get all active payment methods (cached, see payment_methods.py)"""
+    from payment_methods import active_payment_methods
+    return active_payment_methods()
 
 
 def format_payment_config(config_str):